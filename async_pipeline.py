@@ -0,0 +1,323 @@
+import asyncio
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, List, Tuple, Union, Optional
+from concurrent.futures import ThreadPoolExecutor
+from utils import aget_examples, amake_context, aget_response, astream_response
+from utils.Seeds import SeedSource
+from pipeline import Pipeline
+from tools.metrics import get_metrics
+from tqdm import tqdm
+
+class AsyncPipeline(Pipeline):
+    """
+    asyncio-based engine with the same inputs and output records as Pipeline.
+
+    Sampling and response generation are coroutines on the LLM's shared async client.
+    The search tools are blocking, so search and page fetching run on a bounded thread
+    pool that is driven from the event loop. Every stage is guarded by its own global
+    semaphore, and the number of questions holding a context at once is capped, so
+    memory stays bounded however many questions are queued.
+    """
+
+    def __call__(
+        self,
+        seed_questions: Union[str, List[str], SeedSource],
+        verbose: bool = False,
+        seed_as_instructions: bool = False,
+        sample_size: int = None,
+        iterations: int = 1,
+        max_workers_iterations: int = 2,
+        max_workers_questions: int = 4,
+        max_workers_retrieve: Optional[int] = None,
+        max_workers_respond: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        skip_instructions: Optional[Iterable[str]] = None
+    ):
+        """
+        Executes the pipeline with the provided seed questions on a fresh event loop.
+
+        Parameters:
+            seed_questions (str, List[str] or SeedSource): The seed question(s) to start with.
+            verbose (bool): If True, prints additional information during execution.
+            seed_as_instructions (bool): If True, use seed questions as instructions.
+            sample_size (int, optional): Number of seed questions to randomly select.
+            iterations (int): Number of times to run the pipeline. Defaults to 1.
+            max_workers_iterations (int): Maximum number of concurrent sampling calls.
+            max_workers_questions (int): Default limit for concurrent searches and responses.
+            max_workers_retrieve (int, optional): Maximum number of concurrent search + fetch jobs.
+            max_workers_respond (int, optional): Maximum number of concurrent responder calls.
+            queue_size (int, optional): Maximum number of questions holding a context between search and
+                response. Defaults to twice the larger of the retrieve and respond limits.
+            skip_instructions (Iterable[str], optional): Questions that are already answered and should not be processed again.
+
+        Returns:
+            List[dict]: A list of instructions generated by the pipeline.
+        """
+        return list(self.iter_instructions(
+            seed_questions=seed_questions,
+            verbose=verbose,
+            seed_as_instructions=seed_as_instructions,
+            sample_size=sample_size,
+            iterations=iterations,
+            max_workers_iterations=max_workers_iterations,
+            max_workers_questions=max_workers_questions,
+            max_workers_retrieve=max_workers_retrieve,
+            max_workers_respond=max_workers_respond,
+            queue_size=queue_size,
+            skip_instructions=skip_instructions
+        ))
+
+    def iter_instructions(self, **kwargs) -> Iterator[dict]:
+        """
+        Runs the event loop on a background thread and yields each instruction as soon as it is answered.
+        Takes the same keyword arguments as __call__.
+
+        Yields:
+            dict: Instructions in completion order.
+        """
+        results = queue.Queue()
+        done = object()
+
+        def run_loop():
+            try:
+                asyncio.run(self.run(on_instruction=results.put, **kwargs))
+            except BaseException as err:
+                results.put(err)
+            finally:
+                results.put(done)
+
+        thread = threading.Thread(target=run_loop, name="async-pipeline", daemon=True)
+        thread.start()
+        while True:
+            item = results.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+        thread.join()
+
+    async def run(
+        self,
+        seed_questions: Union[str, List[str], SeedSource],
+        verbose: bool = False,
+        seed_as_instructions: bool = False,
+        sample_size: int = None,
+        iterations: int = 1,
+        max_workers_iterations: int = 2,
+        max_workers_questions: int = 4,
+        max_workers_retrieve: Optional[int] = None,
+        max_workers_respond: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        skip_instructions: Optional[Iterable[str]] = None,
+        on_instruction: Optional[Callable[[dict], None]] = None
+    ):
+        """
+        Coroutine version of __call__ for callers that already run an event loop.
+        Takes the same parameters and returns the same list of instructions. If on_instruction
+        is given, it is called with each instruction as soon as it is answered instead, and
+        nothing is accumulated.
+        """
+        skip_instructions = set(skip_instructions or ())
+        max_workers_retrieve = max_workers_retrieve or max_workers_questions
+        max_workers_respond = max_workers_respond or max_workers_questions
+        queue_size = queue_size or 2 * max(max_workers_retrieve, max_workers_respond)
+
+        self._sample_semaphore = asyncio.Semaphore(max_workers_iterations)
+        self._search_semaphore = asyncio.Semaphore(max_workers_retrieve)
+        self._respond_semaphore = asyncio.Semaphore(max_workers_respond)
+        self._in_flight_semaphore = asyncio.Semaphore(queue_size)
+        self._search_executor = ThreadPoolExecutor(max_workers=max_workers_retrieve)
+
+        all_instructions = []
+        iteration_progress = tqdm(total=iterations, desc="Iterations", unit="iteration")
+        question_progress = tqdm(total=0, desc="Questions", unit="question", leave=False)
+
+        async def run_question(question, retrieved=None):
+            try:
+                instruction = self.compact(await self.aprocess_question(question, verbose, retrieved))
+                if instruction:
+                    if on_instruction is not None:
+                        on_instruction(instruction)
+                    else:
+                        all_instructions.append(instruction)
+            finally:
+                question_progress.update(1)
+
+        async def run_iteration(iteration_index):
+            try:
+                sampled = await self.asample_questions(
+                    iteration_index, iterations, seed_questions, verbose, seed_as_instructions, sample_size
+                )
+                questions = await asyncio.get_running_loop().run_in_executor(
+                    None, self.filter_questions, sampled, skip_instructions, verbose
+                )
+                questions = self.track_sampled(iteration_index, sampled, questions)
+            except Exception as err:
+                print(f"\033[31mError in iteration {iteration_index + 1}: {err}\033[0m")
+                self.track_failed("sample", iteration_index, err)
+                return
+            finally:
+                iteration_progress.update(1)
+            question_progress.total += len(questions)
+            question_progress.refresh()
+
+            await asyncio.gather(*(run_question(question) for question in questions))
+
+        # Questions left unfinished by an earlier run are resumed at the stage they reached
+        done_iterations, resumed = set(), []
+        if self.ledger is not None:
+            skip_instructions |= self.ledger.answered_questions()
+            done_iterations = self.ledger.done_iterations()
+            resumed = list(self.ledger.pending())
+            iteration_progress.update(len(done_iterations & set(range(iterations))))
+            question_progress.total += len(resumed)
+            if resumed:
+                print(f"\033[33mResuming {len(resumed)} unfinished questions from the ledger.\033[0m")
+
+        try:
+            await asyncio.gather(
+                *(run_question(question, retrieved) for question, retrieved in resumed),
+                *(run_iteration(iteration_index) for iteration_index in range(iterations) if iteration_index not in done_iterations)
+            )
+        finally:
+            iteration_progress.close()
+            question_progress.close()
+            self._search_executor.shutdown(wait=False)
+            await self.llm.aclose()
+
+        return all_instructions
+
+    async def asample_questions(
+        self,
+        iteration_index: int,
+        iterations: int,
+        seed_questions: Union[str, List[str], SeedSource],
+        verbose: bool,
+        seed_as_instructions: bool,
+        sample_size: Optional[int]
+    ) -> List[str]:
+        """
+        Async counterpart of Pipeline.sample_questions(), run under the sampling semaphore.
+        """
+        async with self._sample_semaphore:
+            if verbose:
+                print(f"\033[34m\nStarting iteration {iteration_index + 1} of {iterations}\033[0m")
+                print("\033[36mGenerating sample questions...\033[0m")
+            samples = await aget_examples(
+                seed=seed_questions,
+                agent=self.llm,
+                model=self.model_sampler_name,
+                prompt=self.sample_prompt,
+                verbose=verbose,
+                seed_as_instructs=seed_as_instructions,
+                sample_size=sample_size
+            )
+
+        if verbose:
+            print("\033[32mGenerated Samples:\033[0m")
+            for idx, question in enumerate(samples['questions'], start=1):
+                print(f"  {idx}. {question}")
+
+        return samples['questions']
+
+    async def aprocess_question(
+        self,
+        question: str,
+        verbose: bool = False,
+        retrieved: Optional[Tuple[str, List[str]]] = None
+    ):
+        """
+        Async counterpart of Pipeline.process_question().
+
+        Parameters:
+            question (str): The question to process.
+            verbose (bool): If True, prints additional information.
+            retrieved (Tuple[str, List[str]], optional): Context and links retrieved by an earlier run;
+                retrieval is skipped if given.
+
+        Returns:
+            dict: The instruction generated for the question.
+        """
+        stage = "retrieve"
+        try:
+            async with self._in_flight_semaphore:
+                if retrieved is not None:
+                    context, links = retrieved
+                else:
+                    if verbose:
+                        print(f"\033[35m\nProcessing question:\033[0m {question}")
+                        print("\033[36mRetrieving context...\033[0m")
+
+                    async with self._search_semaphore:
+                        with get_metrics().timer("retrieve"):
+                            context, links = await amake_context(
+                                query=question,
+                                tool=self.search_tool,
+                                num_pages=self.number_retrieved_pages,
+                                verbose=verbose,
+                                skip_websites=self.skip_websites,
+                                used_number_of_links=self.used_number_of_links,
+                                max_tokens=self.max_context_tokens,
+                                top_k=self.retrieval_top_k,
+                                chunk_size=self.chunk_size,
+                                embedder=self.embedder,
+                                model=self.model_responder_name,
+                                executor=self._search_executor
+                            )
+                    if self.ledger is not None:
+                        self.ledger.record_retrieved(question, context, links)
+
+                stage = "respond"
+                return self.track_answer(question, await self.arespond(question, context, links, verbose))
+        except Exception as err:
+            print(f"\033[31mUnexpected error processing question '{question}': {err}\033[0m")
+            self.track_failed(stage, question, err)
+            return None
+
+    async def arespond(self, question: str, context: str, links: List[str], verbose: bool = False) -> dict:
+        """
+        Async counterpart of Pipeline.respond(), run under the responder semaphore.
+
+        Returns:
+            dict: The instruction record.
+        """
+        instruction = self.lookup_answer(question, context, links)
+        if instruction is not None:
+            if verbose:
+                print(f"\033[33mUsing memoized answer for:\033[0m {question}")
+            return instruction
+
+        if verbose:
+            print("\033[36mGenerating response...\033[0m")
+        async with self._respond_semaphore:
+            if self.stream_responses:
+                finished = []
+                instruction = await astream_response(
+                    query=question,
+                    context=context,
+                    links=links,
+                    agent=self.llm,
+                    model=self.model_responder_name,
+                    prompt=self.respond_prompt,
+                    verbose=verbose,
+                    on_finish=finished.append,
+                    **self.stream_options(question)
+                )
+                self.finish_stream(question, instruction)
+                if finished and finished[0].aborted:
+                    # Not memoized, see Pipeline.respond()
+                    return instruction
+            else:
+                instruction = await aget_response(
+                    query=question,
+                    context=context,
+                    links=links,
+                    agent=self.llm,
+                    model=self.model_responder_name,
+                    prompt=self.respond_prompt,
+                    verbose=verbose
+                )
+        self.store_answer(question, context, instruction)
+        return instruction
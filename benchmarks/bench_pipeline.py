@@ -0,0 +1,294 @@
+"""
+Offline throughput benchmark of the pipeline against the local mock servers.
+
+The mock servers run in this process. Each configuration runs in a fresh worker
+process, so peak RSS and thread counts are not shared between configurations. The
+report lists questions/sec, p50/p99 per-question latency (first search to answered
+record), peak RSS and peak thread count.
+
+Examples (from the repository root):
+    python -m benchmarks.bench_pipeline --configs threads,async
+    python -m benchmarks.bench_pipeline --configs threads,threads+cache --pages_latency 0.5
+    python -m benchmarks.bench_pipeline --configs threads --output bench.json
+    python -m benchmarks.bench_pipeline --configs threads --baseline bench.json --tolerance 0.15
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from typing import Dict, List
+
+from benchmarks.mock_servers import add_mock_arguments, mock_config_from_args, start_mock_server
+
+SAMPLE_PROMPT = (
+    "You are an expert in question generation. Create new questions inspired by the sample questions "
+    'and answer with JSON: {"questions": ["..."]}.'
+)
+RESPOND_PROMPT = "Answer the user's question using only the provided context."
+
+# name -> options of one benchmarked configuration
+CONFIGS: Dict[str, dict] = {
+    "threads": {"engine": "threads"},
+    "async": {"engine": "async"},
+    "threads+cache": {"engine": "threads", "cache": True},
+    "async+cache": {"engine": "async", "cache": True},
+    "batch": {"engine": "threads", "llm_mode": "batch"},
+    "main": {"main": True},
+}
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(who).ru_maxrss / 1024
+
+class ThreadSampler:
+    def __init__(self, interval: float = 0.05):
+        """
+        Samples the number of live threads in the background and keeps the peak.
+        """
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._interval = interval
+        self._thread = threading.Thread(target=self._run, name="thread-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+def seed_questions(count: int) -> List[str]:
+    return [f"seed question {idx} about travel in Iran?" for idx in range(count)]
+
+def build_pipeline(args: argparse.Namespace, options: dict, cache_dir: str):
+    from pipeline import Pipeline
+    from async_pipeline import AsyncPipeline
+    from tools import LLM, RateLimiterRegistry, BatchClient, PageFetcher, PageCache, SerperTool, open_search_cache
+
+    rate_limiters = RateLimiterRegistry(max_retries=args.max_retries, base_delay=0.1)
+    llm = LLM(args.base_url + "/v1", "mock-key", rate_limiters=rate_limiters)
+    page_cache = PageCache(os.path.join(cache_dir, "pages")) if options.get("cache") else None
+    search_cache = open_search_cache(os.path.join(cache_dir, "search.sqlite")) if options.get("cache") else None
+    fetcher = PageFetcher(max_workers=args.fetch_workers, pool_maxsize=args.fetch_workers, cache=page_cache)
+    search_tool = SerperTool(
+        'serper', "mock-key", fetcher=fetcher, search_cache=search_cache,
+        rate_limiters=rate_limiters, endpoint=args.base_url + "/search"
+    )
+    batch_client = None
+    if options.get("llm_mode") == "batch":
+        batch_client = BatchClient(llm, flush_interval=0.5, poll_interval=0.5)
+
+    pipeline_class = AsyncPipeline if options.get("engine") == "async" else Pipeline
+    pipeline = pipeline_class(
+        llm_agent=llm,
+        model_sampler_name="mock-sampler",
+        model_responder_name="mock-responder",
+        sample_prompt=SAMPLE_PROMPT,
+        respond_prompt=RESPOND_PROMPT,
+        search_tool=search_tool,
+        number_retrieved_pages=1,
+        skip_websites=[],
+        used_number_of_links=args.used_number_of_links,
+        batch_client=batch_client
+    )
+    return pipeline, [obj for obj in (search_cache, batch_client, fetcher) if obj is not None]
+
+def run_pipeline_once(args: argparse.Namespace, options: dict, cache_dir: str) -> dict:
+    pipeline, closeables = build_pipeline(args, options, cache_dir)
+
+    # Per-question latency runs from the question's first search to its answered record
+    started: Dict[str, float] = {}
+    get_pages = pipeline.search_tool.get_pages
+
+    def timed_get_pages(query, *a, **kw):
+        started.setdefault(query, time.perf_counter())
+        return get_pages(query, *a, **kw)
+
+    pipeline.search_tool.get_pages = timed_get_pages
+
+    random.seed(args.seed)  # Same seed sampling in every run, so cached runs ask the same questions
+    latencies = []
+    start = time.perf_counter()
+    with ThreadSampler() as threads:
+        for record in pipeline.iter_instructions(
+            seed_questions=seed_questions(args.seed_count),
+            sample_size=args.sample_size,
+            iterations=args.iterations,
+            max_workers_iterations=args.max_workers_iterations,
+            max_workers_retrieve=args.max_workers_retrieve,
+            max_workers_respond=args.max_workers_respond,
+            max_workers_questions=args.max_workers_retrieve,
+            queue_size=args.queue_size
+        ):
+            if record is not None and record["instruction"] in started:
+                latencies.append(time.perf_counter() - started[record["instruction"]])
+    seconds = time.perf_counter() - start
+    for closeable in closeables:
+        closeable.close()
+    return {
+        "questions": len(latencies),
+        "seconds": seconds,
+        "questions_per_second": len(latencies) / seconds if seconds else 0.0,
+        "p50_latency": percentile(latencies, 0.5),
+        "p99_latency": percentile(latencies, 0.99),
+        "peak_threads": threads.peak
+    }
+
+def run_main(args: argparse.Namespace, cache_dir: str) -> dict:
+    # Runs main.py end to end as a subprocess; per-question latency is not observable from outside
+    seed_file = os.path.join(cache_dir, "seeds.txt")
+    output_path = os.path.join(cache_dir, "output.jsonl")
+    with open(seed_file, "w", encoding="utf-8") as file:
+        file.write("\n".join(seed_questions(args.seed_count)) + "\n")
+    command = [
+        sys.executable, "main.py",
+        "--llm_base_url", args.base_url + "/v1",
+        "--llm_api_key", "mock-key",
+        "--model_sampler", "mock-sampler",
+        "--model_responder", "mock-responder",
+        "--seed_file", seed_file,
+        "--output_path", output_path,
+        "--tool_name", "serper_tool",
+        "--search_api_key", "mock-key",
+        "--search_endpoint", args.base_url + "/search",
+        "--number_created_questions", str(args.questions_per_sample),
+        "--number_retrieved_pages", "1",
+        "--used_number_of_links", str(args.used_number_of_links),
+        "--sample_size", str(args.sample_size),
+        "--iterations", str(args.iterations),
+        "--max_workers_iterations", str(args.max_workers_iterations),
+        "--max_workers_retrieve", str(args.max_workers_retrieve),
+        "--max_workers_respond", str(args.max_workers_respond),
+        "--max_retries", str(args.max_retries),
+    ]
+    start = time.perf_counter()
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    seconds = time.perf_counter() - start
+    with open(output_path, encoding="utf-8") as file:
+        questions = sum(1 for line in file if line.strip())
+    return {
+        "questions": questions,
+        "seconds": seconds,
+        "questions_per_second": questions / seconds if seconds else 0.0,
+        "p50_latency": None,
+        "p99_latency": None,
+        "peak_threads": None,
+        "peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN)
+    }
+
+def run_worker(args: argparse.Namespace) -> dict:
+    options = CONFIGS[args.worker]
+    with tempfile.TemporaryDirectory(prefix="searchinstruct-bench-") as cache_dir:
+        if options.get("main"):
+            return run_main(args, cache_dir)
+        if options.get("cache"):
+            run_pipeline_once(args, options, cache_dir)  # Warm-up pass that fills the caches
+        result = run_pipeline_once(args, options, cache_dir)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+def format_report(results: Dict[str, dict]) -> str:
+    def cell(value, width: int, spec: str = "") -> str:
+        return format(value, f">{width}{spec}") if value is not None else "-".rjust(width)
+
+    lines = [f"{'config':<16} {'questions':>9} {'seconds':>8} {'q/s':>7} {'p50 s':>7} {'p99 s':>7} {'rss MB':>8} {'threads':>7}"]
+    for name, result in results.items():
+        lines.append(
+            f"{name:<16} {result['questions']:>9} {result['seconds']:>8.1f} {result['questions_per_second']:>7.2f} "
+            f"{cell(result['p50_latency'], 7, '.2f')} {cell(result['p99_latency'], 7, '.2f')} "
+            f"{result['peak_rss_mb']:>8.1f} {cell(result['peak_threads'], 7)}"
+        )
+    return "\n".join(lines)
+
+def check_baseline(results: Dict[str, dict], baseline_path: str, tolerance: float) -> List[str]:
+    """
+    Returns the configurations whose throughput dropped more than tolerance below the baseline.
+    """
+    with open(baseline_path, encoding="utf-8") as file:
+        baseline = json.load(file)["results"]
+    regressions = []
+    for name, result in results.items():
+        if name in baseline:
+            expected = baseline[name]["questions_per_second"]
+            if result["questions_per_second"] < expected * (1 - tolerance):
+                regressions.append(f"{name}: {result['questions_per_second']:.2f} q/s vs baseline {expected:.2f} q/s")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against local mock LLM, search and web servers.")
+    parser.add_argument("--configs", type=str, default="threads,async",
+                        help=f"Comma-separated configurations to compare: {', '.join(CONFIGS)}.")
+    parser.add_argument("--seed_count", type=int, default=50, help="Number of seed questions.")
+    parser.add_argument("--sample_size", type=int, default=5, help="Seed questions per sampling request.")
+    parser.add_argument("--iterations", type=int, default=20, help="Sampling iterations (questions = iterations x questions_per_sample).")
+    parser.add_argument("--max_workers_iterations", type=int, default=4)
+    parser.add_argument("--max_workers_retrieve", type=int, default=16)
+    parser.add_argument("--max_workers_respond", type=int, default=16)
+    parser.add_argument("--queue_size", type=int, default=None)
+    parser.add_argument("--fetch_workers", type=int, default=32)
+    parser.add_argument("--used_number_of_links", type=int, default=3)
+    parser.add_argument("--max_retries", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for seed-question sampling.")
+    parser.add_argument("--output", type=str, default=None, help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", type=str, default=None, help="Results JSON of an earlier run; exit with 1 on throughput regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative throughput drop against the baseline.")
+    parser.add_argument("--worker", type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--base_url", type=str, default=None, help=argparse.SUPPRESS)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args)))
+        return
+
+    names = [name.strip() for name in args.configs.split(",") if name.strip()]
+    unknown = [name for name in names if name not in CONFIGS]
+    if unknown:
+        parser.error(f"Unknown configurations: {', '.join(unknown)}")
+
+    server = start_mock_server(mock_config_from_args(args))
+    base_url = "http://{}:{}".format(*server.server_address[:2])
+    results = {}
+    for name in names:
+        print(f"\033[36mRunning {name}...\033[0m")
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_pipeline", *sys.argv[1:], "--worker", name, "--base_url", base_url],
+            check=True, stdout=subprocess.PIPE, text=True
+        ).stdout
+        results[name] = json.loads(output.strip().splitlines()[-1])
+    with urllib.request.urlopen(base_url + "/stats") as response:
+        server_stats = json.load(response)
+    server.shutdown()
+
+    print(format_report(results))
+    print(f"\033[36mMock server requests:\033[0m {server_stats['requests']}  \033[31merrors:\033[0m {server_stats['errors']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k not in ("worker", "base_url")}, "results": results}, file, indent=2)
+    if args.baseline:
+        regressions = check_baseline(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"\033[31mRegression: {regression}\033[0m")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Startup-time benchmark of the CLI and the package imports.
+
+Each target runs in a fresh interpreter several times and the report lists the minimum
+and median wall time. Every target also lists heavy dependencies it must not import;
+loading one of them fails the run, which catches an eager import regardless of how fast
+the machine is.
+
+Examples (from the repository root):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 10 --output startup.json
+    python -m benchmarks.bench_startup --baseline startup.json --tolerance 0.25
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that take hundreds of milliseconds to import
+HEAVY_MODULES = ["openai", "httpx", "pandas", "numpy", "pyarrow", "bs4", "serpapi", "googlesearch", "sentence_transformers"]
+
+# name -> (code run in a fresh interpreter, heavy modules it must not import)
+TARGETS: Dict[str, tuple] = {
+    "main --help": (
+        "import runpy, sys; sys.argv = ['main.py', '--help']; runpy.run_path('main.py', run_name='__main__')",
+        HEAVY_MODULES
+    ),
+    "import tools": ("import tools", HEAVY_MODULES),
+    "import pipeline": ("import pipeline", ["openai", "pandas", "numpy", "pyarrow", "bs4", "serpapi", "googlesearch"]),
+    "tool serper_tool": (
+        "from tools import get_tool; get_tool('serper_tool')",
+        ["openai", "pandas", "numpy", "bs4", "serpapi", "googlesearch"]
+    ),
+    "tool serp_tool": ("from tools import get_tool; get_tool('serp_tool')", ["openai", "pandas", "numpy", "bs4", "googlesearch"]),
+    "tool google_search": ("from tools import get_tool; get_tool('google_search')", ["openai", "pandas", "numpy", "bs4", "serpapi"]),
+}
+
+# Appended to every target: reports the heavy modules that ended up imported, even after SystemExit
+REPORT_MODULES = (
+    "import atexit, json, sys\n"
+    "atexit.register(lambda: sys.stderr.write('\\nLOADED ' + json.dumps([m for m in {heavy!r} if m in sys.modules]) + '\\n'))\n"
+)
+
+def run_target(code: str, repeat: int) -> dict:
+    """
+    Runs a target in repeat fresh interpreters and returns its timings and the heavy modules it imported.
+    """
+    script = REPORT_MODULES.format(heavy=HEAVY_MODULES) + code
+    timings = []
+    loaded = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-c", script], cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+        )
+        timings.append(time.perf_counter() - start)
+        reports = [line for line in process.stderr.splitlines() if line.startswith("LOADED ")]
+        if not reports:
+            raise RuntimeError(f"Target failed:\n{process.stderr}")
+        loaded = json.loads(reports[-1][len("LOADED "):])
+    return {"min_seconds": min(timings), "median_seconds": statistics.median(timings), "loaded": loaded}
+
+def format_report(results: Dict[str, dict]) -> str:
+    lines = [f"{'target':<20} {'min s':>7} {'median s':>9}  heavy modules loaded"]
+    for name, result in results.items():
+        lines.append(
+            f"{name:<20} {result['min_seconds']:>7.3f} {result['median_seconds']:>9.3f}  {', '.join(result['loaded']) or '-'}"
+        )
+    return "\n".join(lines)
+
+def check_forbidden(results: Dict[str, dict]) -> List[str]:
+    """
+    Returns the targets that imported a heavy module they must not import.
+    """
+    violations = []
+    for name, result in results.items():
+        forbidden = [module for module in result["loaded"] if module in TARGETS[name][1]]
+        if forbidden:
+            violations.append(f"{name} imports {', '.join(forbidden)}")
+    return violations
+
+def check_baseline(results: Dict[str, dict], baseline_path: str, tolerance: float, slack: float) -> List[str]:
+    """
+    Returns the targets whose median startup time grew more than tolerance (plus an absolute
+    slack that absorbs timer noise on fast targets) over the baseline.
+    """
+    with open(baseline_path, encoding="utf-8") as file:
+        baseline = json.load(file)["results"]
+    regressions = []
+    for name, result in results.items():
+        if name in baseline:
+            expected = baseline[name]["median_seconds"]
+            if result["median_seconds"] > expected * (1 + tolerance) + slack:
+                regressions.append(f"{name}: {result['median_seconds']:.3f} s vs baseline {expected:.3f} s")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the startup time of the CLI and package imports.")
+    parser.add_argument("--targets", type=str, default=",".join(TARGETS),
+                        help=f"Comma-separated targets: {', '.join(TARGETS)}.")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per target.")
+    parser.add_argument("--output", type=str, default=None, help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", type=str, default=None, help="Results JSON of an earlier run; exit with 1 on startup regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative startup time growth against the baseline.")
+    parser.add_argument("--slack", type=float, default=0.05, help="Allowed absolute startup time growth in seconds, on top of --tolerance.")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.targets.split(",") if name.strip()]
+    unknown = [name for name in names if name not in TARGETS]
+    if unknown:
+        parser.error(f"Unknown targets: {', '.join(unknown)}")
+
+    results = {}
+    for name in names:
+        results[name] = run_target(TARGETS[name][0], args.repeat)
+    print(format_report(results))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"args": vars(args), "results": results}, file, indent=2)
+
+    failures = check_forbidden(results)
+    if args.baseline:
+        failures += check_baseline(results, args.baseline, args.tolerance, args.slack)
+    for failure in failures:
+        print(f"\033[31mRegression: {failure}\033[0m")
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
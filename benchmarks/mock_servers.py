@@ -0,0 +1,384 @@
+"""
+Local mock backends for offline benchmarks: an OpenAI-compatible API (chat completions,
+files and Batch API), a Serper-compatible search endpoint and a static web server for
+result pages, all served by one threaded HTTP server.
+
+Every route has its own latency and error rate. Failed requests answer 429 (with
+Retry-After) or 500, so the retry and rate-limiting paths are exercised too.
+
+Run standalone with:
+    python -m benchmarks.mock_servers --port 8765 --llm_latency 0.5 --llm_error_rate 0.02
+"""
+import argparse
+import email
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+WORDS = (
+    "ایران سفر تاریخ شهر فرهنگ موزه کوه دریا غذا بازار معماری باغ مسجد کاخ جاده "
+    "travel history city culture museum mountain sea food market garden palace road"
+).split()
+
+@dataclass
+class RouteConfig:
+    latency: float = 0.0  # Mean latency in seconds; each request waits uniformly in [0.5, 1.5] x latency
+    error_rate: float = 0.0  # Probability that a request fails with 429 or 500
+
+@dataclass
+class MockConfig:
+    llm: RouteConfig = field(default_factory=RouteConfig)
+    search: RouteConfig = field(default_factory=RouteConfig)
+    pages: RouteConfig = field(default_factory=RouteConfig)
+    questions_per_sample: int = 5  # Questions returned for question-generation prompts
+    answer_words: int = 200  # Words per generated answer
+    results_per_search: int = 10  # Organic results per search page
+    page_words: int = 3000  # Words of body text per result page
+    batch_latency: float = 2.0  # Seconds before a submitted batch is reported as completed
+    token_delay: float = 0.0  # Seconds between two chunks of a streamed answer
+    seed: int = 0
+
+def _words(key: str, count: int) -> str:
+    rng = random.Random(hashlib.sha256(key.encode("utf-8")).digest())
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+class MockState:
+    def __init__(self, config: MockConfig):
+        """
+        Shared state of the mock server: the config, uploaded files, batches and request counters.
+        """
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.ids = itertools.count()
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, dict] = {}
+        self.requests: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+
+    def next_id(self, prefix: str) -> str:
+        return f"{prefix}-{next(self.ids)}"
+
+    def delay_and_fail(self, route: str, config: RouteConfig) -> Optional[int]:
+        """
+        Sleeps for the route's latency and returns an error status for failed requests, or None.
+        """
+        with self.lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+            jitter = self.rng.uniform(0.5, 1.5)
+            failed = self.rng.random() < config.error_rate
+            status = self.rng.choice((429, 500)) if failed else None
+            if failed:
+                self.errors[route] = self.errors.get(route, 0) + 1
+        if config.latency:
+            time.sleep(config.latency * jitter)
+        return status
+
+    def chat_completion(self, body: dict) -> dict:
+        """
+        Builds a chat completion: a questions JSON for question-generation prompts, a queries JSON for
+        search-planning prompts, a filler answer otherwise.
+        """
+        messages = body.get("messages", [])
+        system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+        prompt = "\n".join(m.get("content") or "" for m in messages)
+        if "question generation" in system:
+            # Deterministic per prompt, so repeated runs ask the same questions (for cache comparisons)
+            base = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+            content = json.dumps({"questions": [
+                f"{_words(f'{base}-{idx}', 6)} {base}-{idx}؟" for idx in range(self.config.questions_per_sample)
+            ]}, ensure_ascii=False)
+        elif "search engine queries" in system:
+            base = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+            content = json.dumps({"queries": [_words(f'{base}-q{idx}', 4) for idx in range(3)]}, ensure_ascii=False)
+        else:
+            content = _words(prompt[-200:], self.config.answer_words)
+        prompt_tokens = len(prompt) // 3
+        completion_tokens = len(content) // 3
+        return {
+            "id": self.next_id("chatcmpl"),
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    def search_results(self, host: str, body: dict) -> dict:
+        query = str(body.get("q", ""))
+        start = int(body.get("start", 0) or 0)
+        num = int(body.get("num", self.config.results_per_search) or self.config.results_per_search)
+        key = hashlib.sha256(query.encode("utf-8")).hexdigest()[:16]
+        return {
+            "searchParameters": {"q": query, "start": start, "num": num},
+            "organic": [
+                {"title": f"Result {idx}", "link": f"http://{host}/pages/{key}/{idx}.html", "position": idx + 1}
+                for idx in range(start, start + min(num, self.config.results_per_search))
+            ]
+        }
+
+    def page(self, path: str) -> bytes:
+        text = _words(path, self.config.page_words)
+        paragraphs = "".join(f"<p>{text[idx:idx + 400]}</p>" for idx in range(0, len(text), 400))
+        return (
+            "<html><head><meta charset='utf-8'><title>mock</title></head><body>"
+            "<nav>menu</nav><article>" + paragraphs + "</article><footer>footer</footer></body></html>"
+        ).encode("utf-8")
+
+    def create_batch(self, body: dict) -> dict:
+        batch = {
+            "id": self.next_id("batch"),
+            "object": "batch",
+            "endpoint": body.get("endpoint", "/v1/chat/completions"),
+            "input_file_id": body["input_file_id"],
+            "completion_window": body.get("completion_window", "24h"),
+            "status": "in_progress",
+            "created_at": int(time.time()),
+            "output_file_id": None,
+            "error_file_id": None
+        }
+        with self.lock:
+            self.batches[batch["id"]] = dict(batch, _submitted=time.monotonic())
+        return batch
+
+    def retrieve_batch(self, batch_id: str) -> Optional[dict]:
+        with self.lock:
+            batch = self.batches.get(batch_id)
+        if batch is None:
+            return None
+        if batch["status"] == "in_progress" and time.monotonic() - batch["_submitted"] >= self.config.batch_latency:
+            lines = []
+            for line in self.files[batch["input_file_id"]].decode("utf-8").splitlines():
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                lines.append(json.dumps({
+                    "id": self.next_id("batch_req"),
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 200, "body": self.chat_completion(request["body"])},
+                    "error": None
+                }, ensure_ascii=False))
+            output_file_id = self.next_id("file")
+            with self.lock:
+                self.files[output_file_id] = ("\n".join(lines) + "\n").encode("utf-8")
+                batch.update(status="completed", output_file_id=output_file_id)
+        return {key: value for key, value in batch.items() if not key.startswith("_")}
+
+    def chat_chunks(self, completion: dict, include_usage: bool) -> List[dict]:
+        """
+        Splits a chat completion into the chunks of a streamed response, a few words each.
+        """
+        words = completion["choices"][0]["message"]["content"].split(" ")
+        pieces = [" ".join(words[idx:idx + 4]) + (" " if idx + 4 < len(words) else "") for idx in range(0, len(words), 4)]
+        base = {key: completion[key] for key in ("id", "created", "model")}
+        chunks = [dict(base, object="chat.completion.chunk", choices=[
+            {"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}
+        ])]
+        chunks += [
+            dict(base, object="chat.completion.chunk", choices=[{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+            for piece in pieces
+        ]
+        chunks.append(dict(base, object="chat.completion.chunk", choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if include_usage:
+            chunks.append(dict(base, object="chat.completion.chunk", choices=[], usage=completion["usage"]))
+        return chunks
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: MockState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body, content_type: str = "application/json", headers: Optional[dict] = None):
+        data = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, chunks: List[dict]):
+        # Server-sent events over chunked transfer encoding, as the OpenAI API streams
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for idx, chunk in enumerate(chunks + ["[DONE]"]):
+                if idx and self.state.config.token_delay:
+                    time.sleep(self.state.config.token_delay)
+                event = f"data: {chunk if isinstance(chunk, str) else json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the stream early
+            self.close_connection = True
+
+    def _error(self, status: int):
+        headers = {"Retry-After": "0.2"} if status == 429 else None
+        self._send(status, {"error": {"message": "mock failure", "type": "mock_error", "code": status}}, headers=headers)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _route(self, route: str, config: RouteConfig) -> bool:
+        # Applies the route's latency; answers with an error and returns False for failed requests
+        status = self.state.delay_and_fail(route, config)
+        if status is not None:
+            self._error(status)
+            return False
+        return True
+
+    def do_GET(self):
+        state = self.state
+        path = self.path.split("?")[0]
+        if path.startswith("/pages/"):
+            if self._route("pages", state.config.pages):
+                self._send(200, state.page(path), content_type="text/html; charset=utf-8")
+        elif re.fullmatch(r"/v1/files/[^/]+/content", path):
+            content = state.files.get(path.split("/")[3])
+            if content is None:
+                self._error(404)
+            else:
+                self._send(200, content, content_type="application/jsonl")
+        elif path.startswith("/v1/batches/"):
+            batch = state.retrieve_batch(path.rsplit("/", 1)[1])
+            if batch is None:
+                self._error(404)
+            else:
+                self._send(200, batch)
+        elif path == "/stats":
+            self._send(200, {"requests": state.requests, "errors": state.errors})
+        else:
+            self._error(404)
+
+    def do_POST(self):
+        state = self.state
+        path = self.path.split("?")[0]
+        body = self._body()
+        if path == "/v1/chat/completions":
+            if self._route("llm", state.config.llm):
+                request = json.loads(body)
+                completion = state.chat_completion(request)
+                if request.get("stream"):
+                    include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+                    self._send_stream(state.chat_chunks(completion, include_usage))
+                else:
+                    self._send(200, completion)
+        elif path == "/search":
+            if self._route("search", state.config.search):
+                host = self.headers.get("Host", "127.0.0.1")
+                request = json.loads(body)
+                # Serper batch payloads are a list of queries, answered by a list of results
+                if isinstance(request, list):
+                    self._send(200, [state.search_results(host, query) for query in request])
+                else:
+                    self._send(200, state.search_results(host, request))
+        elif path == "/v1/files":
+            content, filename = _multipart_file(self.headers.get("Content-Type", ""), body)
+            file_id = state.next_id("file")
+            with state.lock:
+                state.files[file_id] = content
+            self._send(200, {
+                "id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": filename or "batch.jsonl", "purpose": "batch", "status": "processed"
+            })
+        elif path == "/v1/batches":
+            self._send(200, state.create_batch(json.loads(body)))
+        else:
+            self._error(404)
+
+def _multipart_file(content_type: str, body: bytes) -> Tuple[bytes, Optional[str]]:
+    message = email.message_from_bytes(f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body)
+    for part in message.walk():
+        if part.get_filename() is not None or part.get_param("name", header="content-disposition") == "file":
+            return part.get_payload(decode=True), part.get_filename()
+    return b"", None
+
+def start_mock_server(config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """
+    Starts the mock server on a background thread.
+
+    Parameters:
+        config (MockConfig, optional): Latencies, error rates and response sizes.
+        host (str): Interface to bind.
+        port (int): Port to bind; 0 picks a free port (see server.server_address).
+
+    Returns:
+        ThreadingHTTPServer: The running server. The OpenAI base URL is http://host:port/v1,
+            the Serper endpoint http://host:port/search.
+    """
+    handler = type("BoundMockHandler", (MockHandler,), {"state": MockState(config or MockConfig())})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, name="mock-server", daemon=True).start()
+    return server
+
+def add_mock_arguments(parser: argparse.ArgumentParser):
+    """
+    Adds the mock server options to an argument parser.
+    """
+    for route in ("llm", "search", "pages"):
+        parser.add_argument(f"--{route}_latency", type=float, default={"llm": 0.5, "search": 0.3, "pages": 0.1}[route],
+                            help=f"Mean latency of {route} requests in seconds.")
+        parser.add_argument(f"--{route}_error_rate", type=float, default=0.0,
+                            help=f"Probability that a {route} request fails with 429 or 500.")
+    parser.add_argument("--questions_per_sample", type=int, default=5, help="Questions per question-generation response.")
+    parser.add_argument("--answer_words", type=int, default=200, help="Words per generated answer.")
+    parser.add_argument("--page_words", type=int, default=3000, help="Words of body text per result page.")
+    parser.add_argument("--batch_latency", type=float, default=2.0, help="Seconds until a submitted batch completes.")
+    parser.add_argument("--token_delay", type=float, default=0.0, help="Seconds between two chunks of a streamed answer.")
+
+def mock_config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        llm=RouteConfig(args.llm_latency, args.llm_error_rate),
+        search=RouteConfig(args.search_latency, args.search_error_rate),
+        pages=RouteConfig(args.pages_latency, args.pages_error_rate),
+        questions_per_sample=args.questions_per_sample,
+        answer_words=args.answer_words,
+        page_words=args.page_words,
+        batch_latency=args.batch_latency,
+        token_delay=args.token_delay
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI, Serper and web page servers for offline benchmarks.")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_mock_server(mock_config_from_args(args), args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"\033[32mMock servers listening on http://{host}:{port}\033[0m")
+    print(f"  OpenAI base URL: http://{host}:{port}/v1")
+    print(f"  Serper endpoint: http://{host}:{port}/search")
+    print(f"  Request stats:   http://{host}:{port}/stats")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,37 @@
 import argparse
+import json
 import os
-import pandas as pd
-from pipeline import Pipeline
-from tools import LLM, SerpTool, SerperTool, GoogleSearchTool
+from typing import Set
+from utils.Record import CONTEXT_MODES
+from utils.Ledger import LEDGER_STAGES
+from utils.Export import EXPORT_FORMATS, LiveSink, export_records, missing_dependencies, read_jsonl, split_export_path
+from tools import available_tools, get_tool
+
+def load_checkpoint(path: str) -> Set[str]:
+    """
+    Reads a JSON Lines checkpoint and returns the instructions it already contains.
+    A truncated last line left by a crash is cut off so new records append cleanly.
+
+    Parameters:
+        path (str): Path of the checkpoint file.
+
+    Returns:
+        Set[str]: The answered instructions.
+    """
+    answered = set()
+    valid_size = 0
+    with open(path, 'rb') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            answered.add(record['instruction'])
+            valid_size += len(line)
+    if valid_size < os.path.getsize(path):
+        with open(path, 'r+b') as file:
+            file.truncate(valid_size)
+    return answered
 
 def main():
     # Parse command-line arguments
@@ -42,7 +71,26 @@ def main():
         "--seed_file",
         type=str,
         required=True,
-        help="Path to the seed file containing sample questions."
+        help="Path to the seed file containing sample questions (.txt, .jsonl, .csv, .parquet, .json or .xlsx)."
+    )
+    parser.add_argument(
+        "--seed_column",
+        type=str,
+        default="question",
+        help="Field or column holding the seed questions in structured seed files."
+    )
+    parser.add_argument(
+        "--seed_stream",
+        action='store_true',
+        help="Sample .txt/.jsonl/.csv seed files with a reservoir-sampling pass per iteration instead of "
+             "building an in-memory line-offset index (8 bytes per seed) once."
+    )
+    parser.add_argument(
+        "--seed_shard",
+        type=str,
+        default=None,
+        help="Use only shard I of N of the seed questions, given as I/N (every N-th seed starting at I). "
+             "Set by shard_runner.py so that worker processes sample disjoint seeds."
     )
     parser.add_argument(
         "--number_created_questions",
@@ -72,7 +120,26 @@ def main():
         "--output_path",
         type=str,
         required=True,
-        help="Path to save the output file."
+        help="Path to save the output file: .jsonl, .json, .csv, .txt (optionally ending in .gz or .zst), .parquet or .xlsx."
+    )
+    parser.add_argument(
+        "--export_chunk_size",
+        type=int,
+        default=None,
+        help="Number of records written at a time when exporting (rows per row group for Parquet)."
+    )
+    parser.add_argument(
+        "--parquet_shard_size",
+        type=int,
+        default=None,
+        help="If set, Parquet output is split into files of at most this many rows (OUTPUT-00000.parquet, ...)."
+    )
+    parser.add_argument(
+        "--parquet_compression",
+        type=str,
+        default="snappy",
+        choices=['snappy', 'zstd', 'gzip', 'none'],
+        help="Compression codec of Parquet output."
     )
     parser.add_argument(
         "--verbose",
@@ -109,28 +176,464 @@ def main():
         default=4,
         help="Maximum number of worker threads for iterations."
     )
+    parser.add_argument(
+        "--max_workers_retrieve",
+        type=int,
+        default=None,
+        help="Number of worker threads for search and page fetching. Defaults to --max_workers_questions."
+    )
+    parser.add_argument(
+        "--max_workers_respond",
+        type=int,
+        default=None,
+        help="Number of worker threads for responder calls. Defaults to --max_workers_questions."
+    )
+    parser.add_argument(
+        "--queue_size",
+        type=int,
+        default=None,
+        help="Capacity of the queues between the sample, retrieve and respond stages. Defaults to twice the larger stage worker count."
+    )
     parser.add_argument(
         "--tool_name",
         type=str,
         required=True,
-        choices=['serp_tool', 'serper_tool', 'google_search'],
-        help="Name of the search tool to use."
+        choices=available_tools(),
+        help="Name of the search tool to use. Only the selected tool's backend is imported."
+    )
+    parser.add_argument(
+        "--search_endpoint",
+        type=str,
+        default="https://google.serper.dev/search",
+        help="URL of the Serper search endpoint (e.g. a local mock server for benchmarks)."
+    )
+    parser.add_argument(
+        "--query_variants",
+        type=int,
+        default=1,
+        help="If above 1, --model_search rewrites each question into up to this many search queries (Persian and "
+             "English phrasings, the question included), which are searched concurrently; their links are merged "
+             "and deduplicated, and further result pages are requested only if too few pages could be fetched."
+    )
+    parser.add_argument(
+        "--search_prefetch",
+        type=int,
+        default=1,
+        help="Number of result pages (serp_tool, serper_tool) requested ahead of the one being used, so the next "
+             "page is in hand while the current one's links are fetched; 0 requests them one after another. "
+             "Each page ahead is usually a billed search even when it is not needed: a question whose first "
+             "page is enough costs up to 1 + N searches instead of 1."
+    )
+    parser.add_argument(
+        "--search_batch_size",
+        type=int,
+        default=None,
+        help="If set, serper_tool sends the queries of concurrent questions together, up to this many per request."
+    )
+    parser.add_argument(
+        "--search_batch_interval",
+        type=float,
+        default=0.05,
+        help="Maximum number of seconds a query waits for a --search_batch_size batch to fill."
+    )
+    parser.add_argument(
+        "--llm_max_connections",
+        type=int,
+        default=None,
+        help="Size of the shared LLM connection pool. Defaults to the sum of the per-model concurrency limits, or 64."
+    )
+    parser.add_argument(
+        "--llm_model_concurrency",
+        nargs='*',
+        default=[],
+        help="Per-model limits on in-flight LLM requests, given as MODEL=N pairs (e.g. gpt-4o-mini=32)."
+    )
+    parser.add_argument(
+        "--llm_default_concurrency",
+        type=int,
+        default=None,
+        help="Limit on in-flight LLM requests for models not listed in --llm_model_concurrency."
+    )
+    parser.add_argument(
+        "--rate_limit",
+        nargs='*',
+        default=[],
+        help="Client-side rate limits per model or search engine (serper, serpapi, google), given as "
+             "NAME=RPM or NAME=RPM:TPM pairs (e.g. gpt-4o-mini=500:200000 serper=300)."
+    )
+    parser.add_argument(
+        "--max_retries",
+        type=int,
+        default=6,
+        help="Retries for throttled (429), server-side and network errors of LLM and search calls, "
+             "with jittered exponential backoff that honors Retry-After. 0 disables retries."
+    )
+    parser.add_argument(
+        "--max_backoff",
+        type=float,
+        default=60.0,
+        help="Maximum delay in seconds between two retries."
+    )
+    parser.add_argument(
+        "--stream_responses",
+        action='store_true',
+        help="Stream responder answers: records time to first token and tokens/sec per model, and stops reading "
+             "early at --max_output_chars or a --stop_sequences match (sync mode only)."
+    )
+    parser.add_argument(
+        "--max_output_chars",
+        type=int,
+        default=None,
+        help="With --stream_responses, cut answers at this many characters and close the stream."
+    )
+    parser.add_argument(
+        "--stop_sequences",
+        nargs='*',
+        default=[],
+        help="With --stream_responses, cut answers before the first occurrence of any of these strings."
+    )
+    parser.add_argument(
+        "--live_output",
+        type=str,
+        default=None,
+        help="With --stream_responses, JSON Lines file receiving partial answers while they are generated "
+             "(\"done\": false) and each final answer (\"done\": true)."
+    )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        default="threads",
+        choices=['threads', 'async'],
+        help="Execution engine: three thread-pool stages (sample, retrieve, respond) connected by bounded queues, "
+             "or a single asyncio event loop with per-stage semaphores."
+    )
+    parser.add_argument(
+        "--llm_mode",
+        type=str,
+        default="sync",
+        choices=['sync', 'batch'],
+        help="'sync' sends one chat completion per request; 'batch' sends sampler and responder requests through the OpenAI Batch API (threads engine only)."
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=1000,
+        help="Maximum number of requests per Batch API job in --llm_mode batch."
+    )
+    parser.add_argument(
+        "--batch_flush_interval",
+        type=float,
+        default=60,
+        help="Seconds a request may wait for its batch to fill up before the batch is submitted."
+    )
+    parser.add_argument(
+        "--batch_poll_interval",
+        type=float,
+        default=30,
+        help="Seconds between Batch API status checks."
+    )
+    parser.add_argument(
+        "--batch_work_dir",
+        type=str,
+        default=None,
+        help="Directory where the submitted Batch API JSONL files are kept."
+    )
+    parser.add_argument(
+        "--resume",
+        action='store_true',
+        help="Continue an interrupted run: keep the records already written and skip questions that are already answered."
+    )
+    parser.add_argument(
+        "--fetch_workers",
+        type=int,
+        default=32,
+        help="Number of threads shared by all questions for fetching result pages concurrently."
+    )
+    parser.add_argument(
+        "--fetch_timeout",
+        type=float,
+        default=30,
+        help="Timeout in seconds for each result page request."
+    )
+    parser.add_argument(
+        "--html_parser",
+        type=str,
+        default="auto",
+        choices=['auto', 'selectolax', 'lxml', 'html.parser'],
+        help="Backend for extracting page text; 'auto' picks the fastest installed one."
+    )
+    parser.add_argument(
+        "--keep_boilerplate",
+        action='store_true',
+        help="If set, navigation bars, headers, footers and forms are kept in the extracted page text."
+    )
+    parser.add_argument(
+        "--parse_processes",
+        type=int,
+        default=0,
+        help="Number of processes for HTML parsing; 0 parses on the fetch threads."
+    )
+    parser.add_argument(
+        "--max_context_tokens",
+        type=int,
+        default=32000,
+        help="Token budget for the responder context, split fairly across the fetched pages."
+    )
+    parser.add_argument(
+        "--retrieval_top_k",
+        type=int,
+        default=None,
+        help="If set, fetched pages are chunked and only the top-k chunks most relevant to the question (BM25) are sent to the responder."
+    )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=200,
+        help="Number of words per chunk for --retrieval_top_k."
+    )
+    parser.add_argument(
+        "--embedding_model",
+        type=str,
+        default=None,
+        help="Name or path of a local sentence-transformers model to combine with BM25 for chunk ranking (runs on CPU)."
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Drop generated questions that duplicate an earlier one (exactly, after Persian normalization, or nearly via MinHash/LSH)."
+    )
+    parser.add_argument(
+        "--dedup_threshold",
+        type=float,
+        default=0.8,
+        help="Estimated Jaccard similarity of character shingles above which two questions are near duplicates."
+    )
+    parser.add_argument(
+        "--dedup_index",
+        type=str,
+        default=None,
+        help="File (.npz) of the dedup index. Loaded if it exists and saved at the end, so later runs skip questions "
+             "already answered; questions that failed or were interrupted are asked again. Implies --dedup."
+    )
+    parser.add_argument(
+        "--dedup_embedding_threshold",
+        type=float,
+        default=None,
+        help="If set (e.g. 0.92), questions passing MinHash are also compared by cosine similarity of "
+             "--embedding_model embeddings."
+    )
+    parser.add_argument(
+        "--answer_store",
+        type=str,
+        default=None,
+        help="SQLite file memoizing responder answers across runs, keyed on normalized question, responder model, "
+             "prompt and context. Combine with --search_cache and --page_cache_dir so re-runs reproduce the contexts."
+    )
+    parser.add_argument(
+        "--ledger",
+        type=str,
+        default=None,
+        help="SQLite file recording every iteration and question with its state (sampled, retrieved, answered, failed) "
+             "and intermediate results. Rerunning with the same ledger resumes where the run stopped without repeating "
+             "sampler, search or responder calls; implies --resume once the ledger exists."
+    )
+    parser.add_argument(
+        "--retry_failed",
+        type=str,
+        nargs='*',
+        default=None,
+        help=f"Retry the units recorded as failed in --ledger at the given stages ({', '.join(LEDGER_STAGES)}); "
+             "all stages if none are given."
+    )
+    parser.add_argument(
+        "--context_mode",
+        type=str,
+        default="inline",
+        choices=CONTEXT_MODES,
+        help="How records carry their retrieved context: 'inline' writes the full context into every record, "
+             "'ref' keeps each distinct context once, compressed, in --context_store and writes its sha256 as "
+             "context_hash, 'drop' leaves the context out."
+    )
+    parser.add_argument(
+        "--context_store",
+        type=str,
+        default=None,
+        help="SQLite file of the contexts for --context_mode ref. Defaults to OUTPUT_PATH.contexts.sqlite."
+    )
+    parser.add_argument(
+        "--page_cache_dir",
+        type=str,
+        default=None,
+        help="Directory for the persistent cache of fetched pages and extracted text. Disabled if not set."
+    )
+    parser.add_argument(
+        "--page_cache_ttl",
+        type=float,
+        default=168,
+        help="Lifetime of cached pages in hours."
+    )
+    parser.add_argument(
+        "--page_cache_max_mb",
+        type=int,
+        default=2048,
+        help="Maximum size of the page cache in megabytes; least recently used pages are evicted first."
+    )
+    parser.add_argument(
+        "--search_cache",
+        type=str,
+        default=None,
+        help="Cache for search API responses: a .sqlite/.db file, or a directory for one JSON file per query. Disabled if not set."
+    )
+    parser.add_argument(
+        "--search_cache_ttl",
+        type=float,
+        default=168,
+        help="Lifetime of cached search responses in hours."
+    )
+    parser.add_argument(
+        "--metrics_path",
+        type=str,
+        default=None,
+        help="File the run's metrics (stage latencies, tokens, bytes, cache hits, errors) are written to at the end: "
+             "JSON for .json paths, Prometheus text otherwise."
+    )
+    parser.add_argument(
+        "--metrics_port",
+        type=int,
+        default=None,
+        help="If set, serves live metrics on http://127.0.0.1:PORT/metrics (Prometheus text) and /metrics.json."
     )
 
     args = parser.parse_args()
 
-    # Initialize the LLM with base URL and API key
-    llm = LLM(args.llm_base_url, args.llm_api_key)
+    if args.dedup_embedding_threshold is not None and not args.embedding_model:
+        parser.error("--dedup_embedding_threshold requires --embedding_model")
 
-    # Determine which search tool to use based on the provided tool name
+    output_extension, output_compression = split_export_path(args.output_path)
+    if output_extension not in EXPORT_FORMATS:
+        parser.error(f"Unsupported output file format: {output_extension}")
+    missing = missing_dependencies(args.output_path)
+    if missing:
+        parser.error(f"Writing {args.output_path} requires: {', '.join(missing)}")
+
+    if args.retry_failed is not None:
+        if not args.ledger:
+            parser.error("--retry_failed requires --ledger")
+        unknown = [stage for stage in args.retry_failed if stage not in LEDGER_STAGES]
+        if unknown:
+            parser.error(f"Unknown --retry_failed stages: {', '.join(unknown)} (choose from {', '.join(LEDGER_STAGES)})")
+    # A run with an existing ledger continues the earlier one
+    resume = args.resume or bool(args.ledger and os.path.exists(args.ledger))
+
+    seed_shard = None
+    if args.seed_shard is not None:
+        shard, _, shards = args.seed_shard.partition('/')
+        if not (shard.isdigit() and shards.isdigit() and int(shard) < int(shards)):
+            parser.error(f"Invalid --seed_shard value: {args.seed_shard} (expected I/N with 0 <= I < N)")
+        seed_shard = (int(shard), int(shards))
+
+    if args.llm_mode == 'batch' and args.engine == 'async':
+        parser.error("--llm_mode batch is only supported with --engine threads")
+
+    if (args.max_output_chars or args.stop_sequences or args.live_output) and not args.stream_responses:
+        parser.error("--max_output_chars, --stop_sequences and --live_output require --stream_responses")
+    if args.stream_responses and args.llm_mode == 'batch':
+        parser.error("--stream_responses is only supported with --llm_mode sync")
+
+    # The pipeline and its dependencies are imported only once the arguments are valid,
+    # so --help and argument errors return immediately
+    from pipeline import Pipeline
+    from async_pipeline import AsyncPipeline
+    from utils.Index import LocalEmbedder
+    from utils.Memo import AnswerStore
+    from utils.Ledger import WorkLedger
+    from utils.Record import ContextStore
+    from utils.Seeds import ShardedSeedSource, open_seed_source
+    from tools import LLM, RateLimiterRegistry, get_metrics, BatchClient, HTMLExtractor, PageFetcher, PageCache, open_search_cache
+    from tools import SearchPlanner, PlannedSearchTool
+
+    metrics = get_metrics()
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+        print(f"\033[33mServing metrics on http://127.0.0.1:{args.metrics_port}/metrics\033[0m")
+
+    # Parse per-model concurrency limits
+    model_concurrency = {}
+    for item in args.llm_model_concurrency:
+        model_name, _, limit = item.rpartition('=')
+        if not model_name or not limit.isdigit():
+            parser.error(f"Invalid --llm_model_concurrency value: {item} (expected MODEL=N)")
+        model_concurrency[model_name] = int(limit)
+
+    # Parse per-model / per-engine rate limits
+    rate_limits = {}
+    for item in args.rate_limit:
+        name, _, limit = item.rpartition('=')
+        rpm, _, tpm = limit.partition(':')
+        try:
+            rate_limits[name] = {"rpm": float(rpm), "tpm": float(tpm) if tpm else None}
+        except ValueError:
+            name = None
+        if not name:
+            parser.error(f"Invalid --rate_limit value: {item} (expected NAME=RPM or NAME=RPM:TPM)")
+    rate_limiters = RateLimiterRegistry(rate_limits, max_retries=args.max_retries, max_delay=args.max_backoff)
+
+    # Initialize the LLM with base URL, API key and connection pool settings
+    llm = LLM(
+        args.llm_base_url,
+        args.llm_api_key,
+        max_connections=args.llm_max_connections,
+        model_concurrency=model_concurrency,
+        default_concurrency=args.llm_default_concurrency,
+        rate_limiters=rate_limiters
+    )
+
+    # Optional on-disk cache of fetched pages
+    page_cache = None
+    if args.page_cache_dir:
+        page_cache = PageCache(
+            args.page_cache_dir,
+            ttl=args.page_cache_ttl * 3600,
+            max_bytes=args.page_cache_max_mb * 1024 * 1024
+        )
+
+    # Shared page fetcher with a pooled HTTP session, used by every search tool
+    fetcher = PageFetcher(
+        max_workers=args.fetch_workers,
+        pool_maxsize=args.fetch_workers,
+        timeout=args.fetch_timeout,
+        cache=page_cache,
+        extractor=HTMLExtractor(
+            backend=args.html_parser,
+            remove_boilerplate=not args.keep_boilerplate,
+            processes=args.parse_processes
+        )
+    )
+
+    # Optional cache of search API responses
+    search_cache = None
+    if args.search_cache:
+        search_cache = open_search_cache(args.search_cache, ttl=args.search_cache_ttl * 3600)
+
+    # Determine which search tool to use based on the provided tool name; the registry
+    # imports only the selected backend
+    tool_class = get_tool(args.tool_name)
     if args.tool_name == 'serp_tool':
-        search_tool = SerpTool('serp', args.search_api_key)
+        search_tool = tool_class('serp', args.search_api_key, fetcher=fetcher, search_cache=search_cache, rate_limiters=rate_limiters, prefetch=args.search_prefetch)
     elif args.tool_name == 'serper_tool':
-        search_tool = SerperTool('serper', args.search_api_key)
+        search_tool = tool_class('serper', args.search_api_key, fetcher=fetcher, search_cache=search_cache, rate_limiters=rate_limiters, endpoint=args.search_endpoint,
+                                 prefetch=args.search_prefetch, batch_size=args.search_batch_size, batch_interval=args.search_batch_interval)
     elif args.tool_name == 'google_search':
-        search_tool = GoogleSearchTool('google_search', llm, args.model_search)
+        search_tool = tool_class('google_search', llm, args.model_search, fetcher=fetcher, rate_limiters=rate_limiters)
     else:
-        raise ValueError(f"Unknown tool name: {args.tool_name}")
+        # Tools added with tools.register_tool() take the API key like the built-in search API tools
+        search_tool = tool_class(args.tool_name, args.search_api_key, fetcher=fetcher, search_cache=search_cache, rate_limiters=rate_limiters)
+
+    # Optional search planner: several query variants per question, searched in one concurrent round
+    planner = None
+    if args.query_variants > 1:
+        planner = SearchPlanner(llm, args.model_search, num_variants=args.query_variants, max_workers=args.fetch_workers)
+        search_tool = PlannedSearchTool(search_tool, planner)
 
     # Define the sample prompt for question generation
     sample_prompt = f"""
@@ -163,33 +666,70 @@ def main():
     Do not include information or assumptions outside of this content.
     """
 
-    # Read seed questions from the seed file
-    input_extension = os.path.splitext(args.seed_file)[1].lower()
-    if input_extension in ['.txt']:
-        # Read seed questions from a text file
-        with open(args.seed_file, 'r', encoding='utf-8') as file:
-            seed_questions = [line.strip() for line in file if line.strip()]
-    elif input_extension in ['.json']:
-        # Read seed questions from a JSON file
-        df = pd.read_json(args.seed_file, orient='records')
-        seed_questions = df['question'].tolist()
-    elif input_extension in ['.jsonl']:
-        # Read seed questions from a JSON Lines file
-        df = pd.read_json(args.seed_file, orient='records', lines=True)
-        seed_questions = df['question'].tolist()
-    elif input_extension in ['.csv']:
-        # Read seed questions from a CSV file
-        df = pd.read_csv(args.seed_file)
-        seed_questions = df['question'].tolist()
-    elif input_extension in ['.xlsx']:
-        # Read seed questions from an Excel file
-        df = pd.read_excel(args.seed_file)
-        seed_questions = df['question'].tolist()
-    else:
-        raise ValueError(f"Unsupported seed file format: {input_extension}")
+    # Open the seed file; line-based and Parquet files are sampled without loading them into memory
+    seed_questions = open_seed_source(args.seed_file, column=args.seed_column, index=not args.seed_stream)
+    if seed_shard is not None:
+        seed_questions = ShardedSeedSource(seed_questions, *seed_shard)
+    if args.verbose:
+        print(f"\033[33mLoaded {len(seed_questions)} seed questions from {args.seed_file}\033[0m")
+
+    # Optional Batch API client for the sampler and responder requests
+    batch_client = None
+    if args.llm_mode == 'batch':
+        batch_client = BatchClient(
+            llm,
+            max_batch_size=args.batch_size,
+            flush_interval=args.batch_flush_interval,
+            poll_interval=args.batch_poll_interval,
+            work_dir=args.batch_work_dir
+        )
+
+    # Optional local embedding model, shared by chunk ranking and semantic dedup
+    embedder = LocalEmbedder(args.embedding_model) if args.embedding_model else None
+
+    # Optional dedup of generated questions, persisted across runs with --dedup_index
+    deduplicator = None
+    if args.dedup or args.dedup_index:
+        from utils.Dedup import QuestionDeduplicator
+
+        dedup_embedder = embedder if args.dedup_embedding_threshold is not None else None
+        if args.dedup_index and os.path.exists(args.dedup_index):
+            deduplicator = QuestionDeduplicator.load(
+                args.dedup_index,
+                embedder=dedup_embedder,
+                threshold=args.dedup_threshold,
+                embedding_threshold=args.dedup_embedding_threshold or 0.92
+            )
+            print(f"\033[33mLoaded dedup index {args.dedup_index}: {len(deduplicator)} questions.\033[0m")
+        else:
+            deduplicator = QuestionDeduplicator(
+                threshold=args.dedup_threshold,
+                embedder=dedup_embedder,
+                embedding_threshold=args.dedup_embedding_threshold or 0.92
+            )
+
+    # Optional memo of responder answers across runs
+    answer_store = AnswerStore(args.answer_store) if args.answer_store else None
+
+    # Optional ledger of the run's units of work, for restarts and selective retries
+    ledger = None
+    if args.ledger:
+        ledger = WorkLedger(args.ledger)
+        if args.retry_failed is not None:
+            reset = ledger.retry(args.retry_failed or LEDGER_STAGES)
+            print(f"\033[33mRetrying {reset} failed units from {args.ledger}.\033[0m")
+
+    # Optional sidecar store of the contexts referenced by the records
+    context_store = None
+    if args.context_mode == 'ref':
+        context_store = ContextStore(args.context_store or args.output_path + '.contexts.sqlite')
+
+    # Optional live feed of the streamed answers
+    live_sink = LiveSink(args.live_output) if args.live_output else None
 
     # Initialize the pipeline with the LLM, models, prompts, search tool, and new parameters
-    pipeline = Pipeline(
+    pipeline_class = AsyncPipeline if args.engine == 'async' else Pipeline
+    pipeline = pipeline_class(
         llm_agent=llm,
         model_sampler_name=args.model_sampler,
         model_responder_name=args.model_responder,
@@ -198,60 +738,125 @@ def main():
         search_tool=search_tool,
         number_retrieved_pages=args.number_retrieved_pages,
         skip_websites=args.skip_websites,
-        used_number_of_links=args.used_number_of_links
-    )
-
-    # Run the pipeline to generate instructions
-    instructions = pipeline(
-        seed_questions=seed_questions,
-        verbose=args.verbose,
-        sample_size=args.sample_size,
-        iterations=args.iterations,
-        max_workers_iterations=args.max_workers_iterations,
-        max_workers_questions=args.max_workers_questions
-    )
-
-    # Convert the instructions to a DataFrame
-    instructions_df = pd.DataFrame(instructions)
-
-    # Save the DataFrame to the output file based on the file format
-    output_extension = os.path.splitext(args.output_path)[1].lower()
-    if output_extension == '.json':
-        instructions_df.to_json(
-            args.output_path,
-            orient="records",
-            force_ascii=False,
-            indent=4
-        )
-    elif output_extension == '.jsonl':
-        instructions_df.to_json(
-            args.output_path,
-            orient="records",
-            force_ascii=False,
-            lines=True
-        )
-    elif output_extension in ['.csv']:
-        instructions_df.to_csv(
-            args.output_path,
-            index=False,
-            encoding='utf-8-sig'
-        )
-    elif output_extension == '.xlsx':
-        instructions_df.to_excel(
-            args.output_path,
-            index=False
-        )
-    elif output_extension == '.txt':
-        # Save as a text file with one instruction per line
-        with open(args.output_path, 'w', encoding='utf-8') as file:
-            for idx, row in instructions_df.iterrows():
-                file.write(f"Instruction {idx + 1}:\n")
-                file.write(f"Question: {row['instruction']}\n")
-                file.write(f"Answer: {row['output']}\n")
-                file.write(f"Sources: {row['links']}\n")
-                file.write("\n")
-    else:
-        raise ValueError(f"Unsupported output file format: {output_extension}")
+        used_number_of_links=args.used_number_of_links,
+        max_context_tokens=args.max_context_tokens,
+        retrieval_top_k=args.retrieval_top_k,
+        chunk_size=args.chunk_size,
+        embedder=embedder,
+        batch_client=batch_client,
+        deduplicator=deduplicator,
+        answer_store=answer_store,
+        context_mode=args.context_mode,
+        context_store=context_store,
+        stream_responses=args.stream_responses,
+        max_output_chars=args.max_output_chars,
+        stop_sequences=args.stop_sequences or None,
+        live_sink=live_sink,
+        ledger=ledger
+    )
+
+    # Records are appended to a JSON Lines checkpoint as they complete: the output file itself
+    # for .jsonl outputs, otherwise a sidecar file that is converted once the run finishes
+    is_checkpoint = output_extension == '.jsonl' and output_compression is None
+    checkpoint_path = args.output_path if is_checkpoint else args.output_path + '.partial.jsonl'
+
+    answered_instructions = set()
+    if resume and os.path.exists(checkpoint_path):
+        answered_instructions = load_checkpoint(checkpoint_path)
+        print(f"\033[33mResuming from {checkpoint_path}: {len(answered_instructions)} instructions already answered.\033[0m")
+
+    # Run the pipeline and write each instruction as soon as it is answered
+    try:
+        with open(checkpoint_path, 'a' if resume else 'w', encoding='utf-8') as checkpoint:
+            if ledger is not None:
+                # Answers the ledger recorded after the checkpoint was last written
+                recovered = 0
+                for instruction in ledger.answered_records():
+                    if instruction["instruction"] not in answered_instructions:
+                        instruction = pipeline.compact(instruction)
+                        record = instruction if isinstance(instruction, dict) else instruction.to_dict()
+                        checkpoint.write(json.dumps(record, ensure_ascii=False) + "\n")
+                        recovered += 1
+                checkpoint.flush()
+                if recovered:
+                    print(f"\033[33mRecovered {recovered} answered instructions from {args.ledger}.\033[0m")
+            for instruction in pipeline.iter_instructions(
+                seed_questions=seed_questions,
+                verbose=args.verbose,
+                sample_size=args.sample_size,
+                iterations=args.iterations,
+                max_workers_iterations=args.max_workers_iterations,
+                max_workers_questions=args.max_workers_questions,
+                max_workers_retrieve=args.max_workers_retrieve,
+                max_workers_respond=args.max_workers_respond,
+                queue_size=args.queue_size,
+                skip_instructions=answered_instructions
+            ):
+                record = instruction if isinstance(instruction, dict) else instruction.to_dict()
+                checkpoint.write(json.dumps(record, ensure_ascii=False) + "\n")
+                checkpoint.flush()
+                metrics.inc("instructions_total")
+    except KeyboardInterrupt:
+        print(f"\033[31mInterrupted. Answered instructions are saved in {checkpoint_path}; rerun with --resume to continue.\033[0m")
+        raise
+    finally:
+        if args.metrics_path:
+            metrics.dump(args.metrics_path)
+        if deduplicator is not None and args.dedup_index:
+            deduplicator.save(args.dedup_index)
+
+    if args.verbose:
+        print("\033[36mPer-host page fetch latency:\033[0m")
+        print(fetcher.format_host_latency())
+        if page_cache is not None:
+            print(f"\033[36mPage cache:\033[0m {page_cache.stats()}")
+        if search_cache is not None:
+            print(f"\033[36mSearch cache:\033[0m {search_cache.stats()}")
+        print(f"\033[36mRate limiters:\033[0m {rate_limiters.stats()}")
+        if deduplicator is not None:
+            print(f"\033[36mDedup:\033[0m {deduplicator.stats()}")
+        if answer_store is not None:
+            print(f"\033[36mAnswer store:\033[0m {answer_store.stats()}")
+        if context_store is not None:
+            print(f"\033[36mContext store:\033[0m {context_store.stats()}")
+        if ledger is not None:
+            print(f"\033[36mLedger:\033[0m {ledger.stats()}")
+        print("\033[36mStage latency:\033[0m")
+        print(metrics.format_stages())
+        if args.stream_responses:
+            print("\033[36mStreamed responses:\033[0m")
+            print(metrics.format_streaming())
+    if search_cache is not None:
+        search_cache.close()
+    if answer_store is not None:
+        answer_store.close()
+    if context_store is not None:
+        context_store.close()
+    if ledger is not None:
+        ledger.close()
+    if live_sink is not None:
+        live_sink.close()
+    if batch_client is not None:
+        batch_client.close()
+    if planner is not None:
+        planner.close()
+    fetcher.close()
+
+    if is_checkpoint:
+        return
+
+    # Stream the checkpointed instructions to the output file, a chunk at a time
+    exported = export_records(
+        read_jsonl(checkpoint_path),
+        args.output_path,
+        chunk_size=args.export_chunk_size,
+        shard_size=args.parquet_shard_size,
+        parquet_compression=args.parquet_compression
+    )
+    if args.verbose:
+        print(f"\033[36mExported {exported} instructions to {args.output_path}\033[0m")
+
+    os.remove(checkpoint_path)
 
 if __name__ == '__main__':
     main()
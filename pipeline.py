@@ -1,8 +1,43 @@
-from typing import List, Union
-from utils import get_examples, make_context, get_response
+import queue
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+from utils import get_examples, make_context, get_response, stream_response
+from utils.Index import LocalEmbedder
+from utils.Ledger import WorkLedger
+from utils.Memo import AnswerStore
+from utils.Record import CONTEXT_MODES, ContextStore, InstructionRecord
+from utils.Seeds import SeedSource
+from utils.Export import LiveSink
+from utils.Sampler import select_seed_questions, build_sample_messages, parse_sample_output
+from utils.Responder import build_response_messages, make_response_record
 from tools import LLM, Tools
+from tools.batch import BatchClient
+from tools.metrics import get_metrics
 from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, wait
+
+if TYPE_CHECKING:
+    # numpy is only needed when a deduplicator is used
+    from utils.Dedup import QuestionDeduplicator
+
+# Sentinel that tells a stage worker to exit
+_STOP = object()
+
+def chain_future(future: Future, callback: Callable[[Future], object]) -> Future:
+    """
+    Returns a future resolved with callback(future) once the given future is done.
+    """
+    chained = Future()
+
+    def on_done(done):
+        try:
+            chained.set_result(callback(done))
+        except Exception as err:
+            chained.set_exception(err)
+
+    future.add_done_callback(on_done)
+    return chained
 
 class Pipeline:
     def __init__(
@@ -15,7 +50,21 @@ class Pipeline:
         search_tool: Tools,
         number_retrieved_pages: int,
         skip_websites: List[str],
-        used_number_of_links: int
+        used_number_of_links: int,
+        max_context_tokens: int = 32000,
+        retrieval_top_k: Optional[int] = None,
+        chunk_size: int = 200,
+        embedder: Optional[LocalEmbedder] = None,
+        batch_client: Optional[BatchClient] = None,
+        deduplicator: Optional["QuestionDeduplicator"] = None,
+        answer_store: Optional[AnswerStore] = None,
+        context_mode: str = "inline",
+        context_store: Optional[ContextStore] = None,
+        stream_responses: bool = False,
+        max_output_chars: Optional[int] = None,
+        stop_sequences: Optional[List[str]] = None,
+        live_sink: Optional[LiveSink] = None,
+        ledger: Optional[WorkLedger] = None
     ):
         """
         Initializes the Pipeline with the necessary components.
@@ -30,7 +79,34 @@ class Pipeline:
             number_retrieved_pages (int): The number of pages to retrieve from the search tool.
             skip_websites (List[str]): List of website domains to skip during content retrieval.
             used_number_of_links (int): Desired number of successfully fetched links.
+            max_context_tokens (int): Token budget for the responder context, split fairly across the fetched pages.
+            retrieval_top_k (int, optional): If set, pages are chunked and only the top-k chunks most
+                relevant to the question are passed to the responder.
+            chunk_size (int): Number of words per chunk for retrieval.
+            embedder (LocalEmbedder, optional): Local embedding model for hybrid BM25 + embedding ranking.
+            batch_client (BatchClient, optional): If set, sampling and response requests go through the
+                OpenAI Batch API while retrieval keeps running.
+            deduplicator (QuestionDeduplicator, optional): If set, generated questions that duplicate an
+                earlier question (exactly, after normalization, or nearly) are dropped before retrieval.
+            answer_store (AnswerStore, optional): Memo of earlier answers, checked before each responder call.
+            context_mode (str): How answered instructions carry their context: "inline" yields dicts with the
+                full context, "ref" yields compact InstructionRecords whose context is kept in context_store
+                and referenced by hash, and "drop" yields InstructionRecords without context.
+            context_store (ContextStore, optional): Sidecar store of contexts, required by the "ref" mode.
+            stream_responses (bool): If True, responder answers are streamed: partial answers go to live_sink,
+                time to first token and tokens/sec are recorded per model, and reading stops early at
+                max_output_chars or a stop sequence. Not used with batch_client.
+            max_output_chars (int, optional): Maximum answer length in characters when streaming.
+            stop_sequences (List[str], optional): Client-side stop sequences when streaming.
+            live_sink (LiveSink, optional): Feed receiving the partial and final streamed answers.
+            ledger (WorkLedger, optional): Durable record of the run's iterations and questions. Sampled
+                iterations are not sampled again, unfinished questions of earlier runs are resumed at the
+                stage they reached, and empty answers are recorded as failed instead of being yielded.
         """
+        if context_mode not in CONTEXT_MODES:
+            raise ValueError(f"context_mode must be one of {CONTEXT_MODES}.")
+        if context_mode == "ref" and context_store is None:
+            raise ValueError("The \"ref\" context mode requires a context_store.")
         self.llm = llm_agent
         self.model_sampler_name = model_sampler_name
         self.model_responder_name = model_responder_name
@@ -40,150 +116,641 @@ class Pipeline:
         self.number_retrieved_pages = number_retrieved_pages
         self.skip_websites = skip_websites
         self.used_number_of_links = used_number_of_links
+        self.max_context_tokens = max_context_tokens
+        self.retrieval_top_k = retrieval_top_k
+        self.chunk_size = chunk_size
+        self.embedder = embedder
+        self.batch_client = batch_client
+        self.deduplicator = deduplicator
+        self.answer_store = answer_store
+        self.context_mode = context_mode
+        self.context_store = context_store
+        self.stream_responses = stream_responses
+        self.max_output_chars = max_output_chars
+        self.stop_sequences = stop_sequences
+        self.live_sink = live_sink
+        self.ledger = ledger
 
     def __call__(
         self,
-        seed_questions: Union[str, List[str]],
+        seed_questions: Union[str, List[str], SeedSource],
         verbose: bool = False,
         seed_as_instructions: bool = False,
         sample_size: int = None,
         iterations: int = 1,
         max_workers_iterations: int = 2,  # Number of threads for iterations
-        max_workers_questions: int = 4  # Number of threads for questions
+        max_workers_questions: int = 4,  # Number of threads for questions
+        skip_instructions: Optional[Iterable[str]] = None,
+        max_workers_retrieve: Optional[int] = None,
+        max_workers_respond: Optional[int] = None,
+        queue_size: Optional[int] = None
     ):
         """
         Executes the pipeline with the provided seed questions.
 
         Parameters:
-            seed_questions (str or List[str]): The seed question(s) to start with.
+            seed_questions (str, List[str] or SeedSource): The seed question(s) to start with.
             verbose (bool): If True, prints additional information during execution.
             seed_as_instructions (bool): If True, use seed questions as instructions.
             sample_size (int, optional): Number of seed questions to randomly select.
             iterations (int): Number of times to run the pipeline. Defaults to 1.
             max_workers_iterations (int): Maximum number of worker threads for iterations.
-            max_workers_questions (int): Maximum number of worker threads for processing questions.
+            max_workers_questions (int): Default number of worker threads for the retrieve and respond stages.
+            skip_instructions (Iterable[str], optional): Questions that are already answered and should not be processed again.
+            max_workers_retrieve (int, optional): Number of worker threads for search and page fetching.
+            max_workers_respond (int, optional): Number of worker threads for responder calls.
+            queue_size (int, optional): Capacity of each queue between stages. Defaults to twice the
+                larger of the retrieve and respond worker counts.
 
         Returns:
-            List[dict]: A list of instructions generated by the pipeline.
+            List[dict]: A list of instructions generated by the pipeline (InstructionRecords in the
+                "ref" and "drop" context modes).
         """
-        all_instructions = []
+        return list(self.iter_instructions(
+            seed_questions=seed_questions,
+            verbose=verbose,
+            seed_as_instructions=seed_as_instructions,
+            sample_size=sample_size,
+            iterations=iterations,
+            max_workers_iterations=max_workers_iterations,
+            max_workers_questions=max_workers_questions,
+            skip_instructions=skip_instructions,
+            max_workers_retrieve=max_workers_retrieve,
+            max_workers_respond=max_workers_respond,
+            queue_size=queue_size
+        ))
 
-        # Define a helper function for processing a single iteration
-        def process_iteration(iteration_index):
-            iteration_instructions = []
+    def iter_instructions(
+        self,
+        seed_questions: Union[str, List[str], SeedSource],
+        verbose: bool = False,
+        seed_as_instructions: bool = False,
+        sample_size: int = None,
+        iterations: int = 1,
+        max_workers_iterations: int = 2,
+        max_workers_questions: int = 4,
+        skip_instructions: Optional[Iterable[str]] = None,
+        max_workers_retrieve: Optional[int] = None,
+        max_workers_respond: Optional[int] = None,
+        queue_size: Optional[int] = None
+    ) -> Iterator[dict]:
+        """
+        Executes the pipeline and yields each instruction as soon as it is answered.
 
-            if verbose:
-                print(f"\033[34m\nStarting iteration {iteration_index + 1} of {iterations}\033[0m")
+        The work runs as three stages, sample -> retrieve -> respond, each with its own worker
+        threads. The stages are connected by bounded queues, so a slow responder applies
+        backpressure without stopping retrieval from prefetching contexts ahead of it.
+        Takes the same parameters as __call__.
 
-            # Generate sample questions based on the seed questions
-            if verbose:
-                print("\033[36mGenerating sample questions...\033[0m")
-            samples = get_examples(
-                seed=seed_questions,
-                agent=self.llm,
-                model=self.model_sampler_name,
-                prompt=self.sample_prompt,
-                verbose=verbose,
-                seed_as_instructs=seed_as_instructions,
-                sample_size=sample_size
-            )
+        Yields:
+            dict or InstructionRecord: Instructions in completion order.
+        """
+        skip_instructions = set(skip_instructions or ())
+        max_workers_retrieve = max_workers_retrieve or max_workers_questions
+        max_workers_respond = max_workers_respond or max_workers_questions
+        queue_size = queue_size or 2 * max(max_workers_retrieve, max_workers_respond)
 
-            if verbose:
-                print("\033[32mGenerated Samples:\033[0m")
-                for idx, question in enumerate(samples['questions'], start=1):
-                    print(f"  {idx}. {question}")
+        stop = threading.Event()
+        iteration_queue = queue.Queue()
+        retrieve_queue = queue.Queue(maxsize=queue_size)
+        respond_queue = queue.Queue(maxsize=queue_size)
+        output_queue = queue.Queue()
+        self._queues = {"retrieve": retrieve_queue, "respond": respond_queue, "output": output_queue}
+        self._active = {"sample": 0, "retrieve": 0, "respond": 0}
+        self._active_lock = threading.Lock()
+        batch_futures = {"sample": [], "respond": []}
 
-            questions = samples['questions']
+        # Prepare the progress bars for iterations and questions
+        iteration_progress = tqdm(total=iterations, desc="Iterations", unit="iteration")
+        question_progress = tqdm(total=0, desc="Questions", unit="question", leave=False)
 
-            # Prepare the progress bar for questions
-            question_progress = tqdm(total=len(questions), desc=f"Questions (Iteration {iteration_index + 1})", unit="question", leave=False)
+        def put(target: queue.Queue, item) -> bool:
+            # Blocks while the queue is full, giving up if the run is being stopped
+            while not stop.is_set():
+                try:
+                    target.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
 
-            # Use ThreadPoolExecutor for concurrent processing of questions
-            with ThreadPoolExecutor(max_workers=max_workers_questions) as executor:
-                future_to_question = {
-                    executor.submit(self.process_question, question, verbose): question for question in questions
-                }
+        def get(source: queue.Queue):
+            while not stop.is_set():
+                try:
+                    return source.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+            return _STOP
 
-                for future in as_completed(future_to_question):
-                    question = future_to_question[future]
+        def enqueue_questions(questions: List[str], iteration_index: int):
+            try:
+                questions = self.track_sampled(iteration_index, questions, self.filter_questions(questions, skip_instructions, verbose))
+            except Exception as err:
+                print(f"\033[31mError in iteration {iteration_index + 1}: {err}\033[0m")
+                self.track_failed("sample", iteration_index, err)
+                return
+            question_progress.total += len(questions)
+            question_progress.refresh()
+            for question in questions:
+                if not put(retrieve_queue, question):
+                    return
+
+        def sample_worker():
+            while True:
+                iteration_index = get(iteration_queue)
+                if iteration_index is _STOP:
+                    return
+                with self._stage("sample"):
                     try:
-                        instruction = future.result()
-                        if instruction:
-                            iteration_instructions.append(instruction)
+                        if self.batch_client is not None:
+                            future = self.submit_sample_batch(
+                                iteration_index, iterations, seed_questions, verbose, seed_as_instructions, sample_size
+                            )
+                            batch_futures["sample"].append(chain_future(
+                                future, lambda done, index=iteration_index: self._finish_sample(done, index, enqueue_questions, iteration_progress)
+                            ))
+                            continue
+                        questions = self.sample_questions(
+                            iteration_index, iterations, seed_questions, verbose, seed_as_instructions, sample_size
+                        )
                     except Exception as err:
-                        print(f"\033[31mError processing question '{question}': {err}\033[0m")
-                    finally:
-                        question_progress.update(1)
+                        print(f"\033[31mError in iteration {iteration_index + 1}: {err}\033[0m")
+                        self.track_failed("sample", iteration_index, err)
+                        iteration_progress.update(1)
+                        continue
+                    iteration_progress.update(1)
+                    enqueue_questions(questions, iteration_index)
 
-            question_progress.close()
-            return iteration_instructions
+        def retrieve_worker():
+            while True:
+                question = get(retrieve_queue)
+                if question is _STOP:
+                    return
+                with self._stage("retrieve"):
+                    try:
+                        context, links = self.retrieve_context(question, verbose)
+                        if self.ledger is not None:
+                            self.ledger.record_retrieved(question, context, links)
+                    except Exception as err:
+                        print(f"\033[31mUnexpected error processing question '{question}': {err}\033[0m")
+                        self.track_failed("retrieve", question, err)
+                        output_queue.put(None)
+                        continue
+                put(respond_queue, (question, context, links))
 
-        # Prepare the progress bar for iterations
-        iteration_progress = tqdm(total=iterations, desc="Iterations", unit="iteration")
+        def respond_worker():
+            while True:
+                item = get(respond_queue)
+                if item is _STOP:
+                    return
+                question, context, links = item
+                with self._stage("respond"):
+                    try:
+                        if self.batch_client is None:
+                            instruction = self.respond(question, context, links, verbose)
+                        else:
+                            instruction = self.lookup_answer(question, context, links)
+                            if instruction is None:
+                                future = self.submit_response_batch(question, context, links, verbose)
+                                # Chained so that waiting on it also waits for the record to be queued
+                                batch_futures["respond"].append(chain_future(
+                                    future, lambda done, question=question: finish_answer(question, done.result)
+                                ))
+                                continue
+                    except Exception as err:
+                        print(f"\033[31mUnexpected error processing question '{question}': {err}\033[0m")
+                        self.track_failed("respond", question, err)
+                        output_queue.put(None)
+                        continue
+                finish_answer(question, lambda: instruction)
+
+        def finish_answer(question: str, answer: Callable[[], dict]):
+            # Records the answer in the ledger and queues its output record; the ledger and the
+            # context store can fail too, which must not take the worker thread down
+            try:
+                output = self.compact(self.track_answer(question, answer()))
+            except Exception as err:
+                print(f"\033[31mUnexpected error processing question '{question}': {err}\033[0m")
+                self.track_failed("respond", question, err)
+                output = None
+            output_queue.put(output)
+
+        def start(target, count: int, name: str) -> List[threading.Thread]:
+            threads = [threading.Thread(target=target, name=f"{name}-{idx}", daemon=True) for idx in range(count)]
+            for thread in threads:
+                thread.start()
+            return threads
+
+        def supervise():
+            # Shuts each stage down once the stage before it is finished
+            for iteration_index in range(iterations):
+                if iteration_index not in done_iterations:
+                    iteration_queue.put(iteration_index)
+            # Questions left unfinished by an earlier run go straight to the stage they reached
+            for question, retrieved in resumed:
+                if retrieved is None:
+                    put(retrieve_queue, question)
+                else:
+                    put(respond_queue, (question, *retrieved))
+            for _ in sample_threads:
+                iteration_queue.put(_STOP)
+            for thread in sample_threads:
+                thread.join()
+            if self.batch_client is not None:
+                self.batch_client.flush()
+                wait(batch_futures["sample"])
+
+            for _ in retrieve_threads:
+                put(retrieve_queue, _STOP)
+            for thread in retrieve_threads:
+                thread.join()
 
-        # Use ThreadPoolExecutor for concurrent processing of iterations
-        with ThreadPoolExecutor(max_workers=max_workers_iterations) as executor:
-            future_to_iteration = {
-                executor.submit(process_iteration, iteration_index): iteration_index for iteration_index in range(iterations)
-            }
+            for _ in respond_threads:
+                put(respond_queue, _STOP)
+            for thread in respond_threads:
+                thread.join()
+            if self.batch_client is not None:
+                self.batch_client.flush()
+                wait(batch_futures["respond"])
+            output_queue.put(_STOP)
 
-            for future in as_completed(future_to_iteration):
-                iteration_index = future_to_iteration[future]
+        done_iterations, resumed = set(), []
+        if self.ledger is not None:
+            skip_instructions |= self.ledger.answered_questions()
+            done_iterations = self.ledger.done_iterations()
+            resumed = list(self.ledger.pending())
+            iteration_progress.update(len(done_iterations & set(range(iterations))))
+            question_progress.total += len(resumed)
+            if resumed:
+                print(f"\033[33mResuming {len(resumed)} unfinished questions from the ledger.\033[0m")
+
+        sample_threads = start(sample_worker, max_workers_iterations, "sample")
+        retrieve_threads = start(retrieve_worker, max_workers_retrieve, "retrieve")
+        respond_threads = start(respond_worker, max_workers_respond, "respond")
+        threading.Thread(target=supervise, name="pipeline-supervisor", daemon=True).start()
+
+        try:
+            while True:
                 try:
-                    iteration_instructions = future.result()
-                    all_instructions.extend(iteration_instructions)
-                except Exception as err:
-                    print(f"\033[31mError in iteration {iteration_index + 1}: {err}\033[0m")
-                finally:
-                    iteration_progress.update(1)
+                    instruction = output_queue.get(timeout=1.0)
+                except queue.Empty:
+                    question_progress.set_postfix(self.stage_stats(), refresh=True)
+                    continue
+                if instruction is _STOP:
+                    break
+                question_progress.update(1)
+                question_progress.set_postfix(self.stage_stats(), refresh=False)
+                if instruction:
+                    yield instruction
+        finally:
+            # Stop the stages if the consumer stops early
+            stop.set()
+            iteration_progress.close()
+            question_progress.close()
 
-        iteration_progress.close()
+    @contextmanager
+    def _stage(self, name: str):
+        with self._active_lock:
+            self._active[name] += 1
+        try:
+            yield
+        finally:
+            with self._active_lock:
+                self._active[name] -= 1
 
-        return all_instructions
+    def _finish_sample(self, done: Future, iteration_index: int, enqueue: Callable[[List[str], int], None], progress: tqdm):
+        # Batch mode: hands a finished sampling request to the retrieve stage
+        try:
+            questions = done.result()
+        except Exception as err:
+            print(f"\033[31mError in iteration {iteration_index + 1}: {err}\033[0m")
+            self.track_failed("sample", iteration_index, err)
+            progress.update(1)
+            return
+        progress.update(1)
+        enqueue(questions, iteration_index)
 
-    def process_question(self, question: str, verbose: bool = False):
+    def stage_stats(self) -> Dict[str, int]:
         """
-        Processes a single question: retrieves context, generates response.
+        Returns the current depth of each inter-stage queue and the number of busy workers per stage.
+        Safe to call from another thread while a run is in progress.
+
+        Returns:
+            Dict[str, int]: Queue depths ("retrieve_queue", "respond_queue", "output_queue") and
+            busy worker counts ("sampling", "retrieving", "responding").
+        """
+        queues = getattr(self, "_queues", None)
+        if queues is None:
+            return {}
+        with self._active_lock:
+            active = dict(self._active)
+        return {
+            "retrieve_queue": queues["retrieve"].qsize(),
+            "respond_queue": queues["respond"].qsize(),
+            "output_queue": queues["output"].qsize(),
+            "sampling": active["sample"],
+            "retrieving": active["retrieve"],
+            "responding": active["respond"],
+        }
+
+    def filter_questions(self, questions: List[str], skip_instructions: Set[str], verbose: bool = False) -> List[str]:
+        """
+        Drops questions that are already answered and, if a deduplicator is set, duplicates of earlier questions.
+        """
+        questions = [question for question in questions if question not in skip_instructions]
+        if self.deduplicator is not None:
+            questions = self.deduplicator.filter(questions, verbose=verbose)
+        return questions
+
+    def sample_questions(
+        self,
+        iteration_index: int,
+        iterations: int,
+        seed_questions: Union[str, List[str], SeedSource],
+        verbose: bool,
+        seed_as_instructions: bool,
+        sample_size: Optional[int]
+    ) -> List[str]:
+        """
+        Generates the questions for one iteration.
 
         Parameters:
-            question (str): The question to process.
+            iteration_index (int): Index of the iteration, used in log messages.
+            iterations (int): Total number of iterations.
+            seed_questions (str, List[str] or SeedSource): The seed question(s).
             verbose (bool): If True, prints additional information.
+            seed_as_instructions (bool): If True, use seed questions as instructions.
+            sample_size (int, optional): Number of seed questions to randomly select.
 
         Returns:
-            dict: The instruction generated for the question.
+            List[str]: The generated questions.
+        """
+        if verbose:
+            print(f"\033[34m\nStarting iteration {iteration_index + 1} of {iterations}\033[0m")
+
+        # Generate sample questions based on the seed questions
+        if verbose:
+            print("\033[36mGenerating sample questions...\033[0m")
+        samples = get_examples(
+            seed=seed_questions,
+            agent=self.llm,
+            model=self.model_sampler_name,
+            prompt=self.sample_prompt,
+            verbose=verbose,
+            seed_as_instructs=seed_as_instructions,
+            sample_size=sample_size
+        )
+
+        if verbose:
+            print("\033[32mGenerated Samples:\033[0m")
+            for idx, question in enumerate(samples['questions'], start=1):
+                print(f"  {idx}. {question}")
+
+        return samples['questions']
+
+    def submit_sample_batch(
+        self,
+        iteration_index: int,
+        iterations: int,
+        seed_questions: Union[str, List[str], SeedSource],
+        verbose: bool,
+        seed_as_instructions: bool,
+        sample_size: Optional[int]
+    ) -> Future:
+        """
+        Batch-mode counterpart of sample_questions(): queues the sampling request in the Batch API.
+
+        Returns:
+            Future: Resolves to the generated questions.
+        """
+        if verbose:
+            print(f"\033[34m\nQueueing iteration {iteration_index + 1} of {iterations} for batch sampling\033[0m")
+        selected = select_seed_questions(seed_questions, verbose=verbose, sample_size=sample_size)
+        if seed_as_instructions:
+            future = Future()
+            future.set_result(selected)
+            return future
+
+        batch_future = self.batch_client.submit(
+            self.model_sampler_name,
+            build_sample_messages(selected, self.sample_prompt),
+            temperature=0.2
+        )
+        return chain_future(
+            batch_future,
+            lambda done: parse_sample_output(done.result()["choices"][0]["message"]["content"], verbose=verbose)['questions']
+        )
+
+    def submit_response_batch(self, question: str, context: str, links: List[str], verbose: bool = False) -> Future:
+        """
+        Batch-mode counterpart of get_response(): queues the response request in the Batch API.
+
+        Returns:
+            Future: Resolves to the instruction record. Failed requests yield an empty output, as in get_response().
+        """
+        batch_future = self.batch_client.submit(
+            self.model_responder_name,
+            build_response_messages(question, context, self.respond_prompt),
+            temperature=0.1
+        )
+
+        def to_record(done):
+            try:
+                result = done.result()["choices"][0]["message"]["content"].strip()
+                if verbose:
+                    print(f"\033[32mLLM response for:\033[0m {question}")
+                    print(f"{result}")
+            except Exception as e:
+                print(f"\033[31mError generating response: {e}\033[0m")
+                result = ""
+            instruction = make_response_record(question, context, links, result)
+            self.store_answer(question, context, instruction)
+            return instruction
+
+        return chain_future(batch_future, to_record)
+
+    def track_sampled(self, iteration_index: int, sampled: List[str], questions: List[str]) -> List[str]:
         """
+        Records a sampled iteration in the ledger and returns the questions to process: those
+        not already in the ledger from an earlier iteration or run.
+        """
+        if self.ledger is None:
+            return questions
+        return self.ledger.record_sampled(iteration_index, sampled, questions)
+
+    def track_answer(self, question: str, instruction: Optional[dict]) -> Optional[dict]:
+        """
+        Records an answered question in the ledger and the dedup index. An empty answer (a failed
+        responder call) is recorded as failed and None is returned, so it can be retried instead of written.
+        """
+        if instruction is None:
+            return None
+        if self.deduplicator is not None and instruction["output"]:
+            self.deduplicator.mark_answered(question)
+        if self.ledger is None:
+            return instruction
+        if not instruction["output"]:
+            self.ledger.record_failed(question, "respond", "empty response")
+            return None
+        self.ledger.record_answered(question, instruction["output"])
+        return instruction
+
+    def track_failed(self, stage: str, unit: Union[int, str], err: Exception):
+        """
+        Records a failed unit of work in the ledger: an iteration (by index) for the "sample"
+        stage, a question otherwise. A ledger error is printed rather than raised, so it does
+        not take the worker down with it.
+        """
+        if self.ledger is None:
+            return
         try:
-            if verbose:
-                print(f"\033[35m\nProcessing question:\033[0m {question}")
+            if stage == "sample":
+                self.ledger.record_failed_iteration(unit, err)
+            else:
+                self.ledger.record_failed(unit, stage, err)
+        except Exception as ledger_err:
+            print(f"\033[31mCould not record the failure in the ledger: {ledger_err}\033[0m")
+
+    def compact(self, instruction: Optional[dict]) -> Union[dict, InstructionRecord, None]:
+        """
+        Converts an answered instruction to the output form of the context mode. In the "ref" and
+        "drop" modes the context is moved to the context store or dropped here, so records waiting
+        in the output queue or accumulated by __call__ do not hold it.
+        """
+        if not instruction or self.context_mode == "inline":
+            return instruction
+        return InstructionRecord.from_dict(instruction, self.context_store if self.context_mode == "ref" else None)
+
+    def lookup_answer(self, question: str, context: str, links: List[str]) -> Optional[dict]:
+        """
+        Returns the instruction record for a memoized answer, or None if there is no answer store or no earlier answer.
+        """
+        if self.answer_store is None:
+            return None
+        output = self.answer_store.get(question, self.model_responder_name, self.respond_prompt, context)
+        if output is None:
+            return None
+        return make_response_record(question, context, links, output)
+
+    def store_answer(self, question: str, context: str, instruction: Optional[dict]):
+        """
+        Memoizes a generated answer if an answer store is set.
+        """
+        if self.answer_store is not None and instruction:
+            self.answer_store.put(question, self.model_responder_name, self.respond_prompt, context, instruction["output"])
+
+    def respond(self, question: str, context: str, links: List[str], verbose: bool = False) -> dict:
+        """
+        Answers a question from its context with the responder model, reusing a memoized answer when one exists.
 
-            # Generate context and retrieve links using the search tool
+        Returns:
+            dict: The instruction record.
+        """
+        instruction = self.lookup_answer(question, context, links)
+        if instruction is not None:
             if verbose:
-                print("\033[36mRetrieving context...\033[0m")
-            context, links = make_context(
+                print(f"\033[33mUsing memoized answer for:\033[0m {question}")
+            return instruction
+
+        if verbose:
+            print("\033[36mGenerating response...\033[0m")
+        if self.stream_responses:
+            finished = []
+            instruction = stream_response(
                 query=question,
-                tool=self.search_tool,
-                num_pages=self.number_retrieved_pages,
+                context=context,
+                links=links,
+                agent=self.llm,
+                model=self.model_responder_name,
+                prompt=self.respond_prompt,
                 verbose=verbose,
-                skip_websites=self.skip_websites,
-                used_number_of_links=self.used_number_of_links
+                on_finish=finished.append,
+                **self.stream_options(question)
             )
-            # Truncate context if necessary
-            max_context_length = 200000
-            truncated_context = context[:min(max_context_length, len(context))]
-
-            if verbose:
-                print("\033[36mGenerating response...\033[0m")
-            # Get the response using the responder model
+            self.finish_stream(question, instruction)
+            if finished and finished[0].aborted:
+                # Not memoized: the memo key does not cover the early-stop limits, so a later run
+                # would take the cut-short answer for a complete one
+                return instruction
+        else:
             instruction = get_response(
                 query=question,
-                context=truncated_context,
+                context=context,
                 links=links,
                 agent=self.llm,
                 model=self.model_responder_name,
                 prompt=self.respond_prompt,
                 verbose=verbose
             )
-            return instruction
+        self.store_answer(question, context, instruction)
+        return instruction
+
+    def stream_options(self, question: str) -> dict:
+        """
+        Returns the stream_response() options for a question: the early-stop limits and a
+        progress callback feeding the live sink.
+        """
+        on_progress = None
+        if self.live_sink is not None:
+            on_progress = lambda text: self.live_sink.partial(question, text)
+        return {"max_output_chars": self.max_output_chars, "stop": self.stop_sequences, "on_progress": on_progress}
+
+    def finish_stream(self, question: str, instruction: dict):
+        """
+        Writes the final streamed answer to the live sink.
+        """
+        if self.live_sink is not None:
+            self.live_sink.done(question, instruction["output"])
+
+    def retrieve_context(self, question: str, verbose: bool = False) -> Tuple[str, List[str]]:
+        """
+        Retrieves the context and links for a question with the search tool.
+
+        Parameters:
+            question (str): The question to process.
+            verbose (bool): If True, prints additional information.
+
+        Returns:
+            Tuple[str, List[str]]: The context string and the list of used links.
+        """
+        if verbose:
+            print(f"\033[35m\nProcessing question:\033[0m {question}")
+
+        # Generate context and retrieve links using the search tool
+        if verbose:
+            print("\033[36mRetrieving context...\033[0m")
+        with get_metrics().timer("retrieve"):
+            return make_context(
+                query=question,
+                tool=self.search_tool,
+                num_pages=self.number_retrieved_pages,
+                verbose=verbose,
+                skip_websites=self.skip_websites,
+                used_number_of_links=self.used_number_of_links,
+                max_tokens=self.max_context_tokens,
+                top_k=self.retrieval_top_k,
+                chunk_size=self.chunk_size,
+                embedder=self.embedder,
+                model=self.model_responder_name
+            )
+
+    def process_question(self, question: str, verbose: bool = False):
+        """
+        Processes a single question: retrieves context, then generates the response
+        (or reuses a memoized one from the answer store).
+
+        Parameters:
+            question (str): The question to process.
+            verbose (bool): If True, prints additional information.
+
+        Returns:
+            dict: The instruction generated for the question.
+        """
+        try:
+            context, links = self.retrieve_context(question, verbose)
+
+            # Get the response using the responder model
+            return self.respond(question, context, links, verbose)
         except Exception as err:
             print(f"\033[31mUnexpected error processing question '{question}': {err}\033[0m")
             return None
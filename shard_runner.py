@@ -0,0 +1,381 @@
+"""
+Runs main.py as N shards in parallel worker processes and merges their outputs.
+
+Each shard gets every N-th seed question (--seed_shard I/N) and its share of the
+iterations, and writes its own JSON Lines output, which is also its checkpoint, and its
+own work ledger into a shared work directory, so a restarted shard repeats none of its
+finished sampler, search and responder calls. Shards are claimed with lock files, so
+several hosts pointed at the same work directory (e.g. an NFS mount) split the shards
+between them, and an interrupted run continues where it stopped when started again.
+The merge step then streams the shard outputs into the final dataset.
+
+Examples (from the repository root):
+    python shard_runner.py run --work_dir runs/big --shards 16 --processes 8 --iterations 400 -- \\
+        --llm_base_url ... --llm_api_key ... --model_sampler ... --model_responder ... \\
+        --seed_file seeds.jsonl --tool_name serper_tool --search_api_key ...
+    python shard_runner.py run --work_dir runs/big --processes 8      # another host, or a restart
+    python shard_runner.py status --work_dir runs/big
+    python shard_runner.py merge --work_dir runs/big --output_path dataset.parquet
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+from typing import Dict, Iterator, List, Optional
+
+from utils.Export import EXPORT_FORMATS, export_records, missing_dependencies, split_export_path
+
+MAIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+MANIFEST = "manifest.json"
+
+# main.py options set by the runner for each shard
+RESERVED_OPTIONS = ["--output_path", "--seed_shard", "--iterations", "--resume", "--ledger", "--metrics_path", "--metrics_port"]
+# main.py options that cannot be shared by concurrent processes
+UNSUPPORTED_OPTIONS = {
+    "--dedup_index": "every shard would overwrite the same index; use --dedup, and merge drops duplicates across shards",
+    "--live_output": "concurrent shards would interleave their lines in one file"
+}
+
+def shard_path(work_dir: str, shard: int, suffix: str) -> str:
+    """
+    Returns the path of one of a shard's files, e.g. "work/shard-00003.jsonl".
+    """
+    return os.path.join(work_dir, f"shard-{shard:05d}{suffix}")
+
+def shard_iterations(iterations: int, shard: int, shards: int) -> int:
+    """
+    Returns the number of iterations run by a shard, spreading the remainder over the first shards.
+    """
+    return iterations // shards + (1 if shard < iterations % shards else 0)
+
+def load_manifest(work_dir: str) -> Optional[Dict]:
+    path = os.path.join(work_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+def create_manifest(work_dir: str, manifest: Dict) -> Dict:
+    """
+    Writes the manifest of a new run and returns the manifest in effect. The file is linked
+    into place atomically, so when several hosts start at once the first one wins and the
+    others pick up its manifest.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    path = os.path.join(work_dir, MANIFEST)
+    temp_path = f"{path}.{socket.gethostname()}.{os.getpid()}"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2)
+    try:
+        os.link(temp_path, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(temp_path)
+    return load_manifest(work_dir)
+
+def claim_shard(work_dir: str, shard: int) -> bool:
+    """
+    Takes the lock of a shard that is neither done nor claimed. A lock left by a dead
+    process on this host is taken over; locks of other hosts must be removed by hand.
+
+    Returns:
+        bool: True if this process now owns the shard.
+    """
+    if os.path.exists(shard_path(work_dir, shard, ".done")):
+        return False
+    lock_path = shard_path(work_dir, shard, ".lock")
+    owner = json.dumps({"host": socket.gethostname(), "pid": os.getpid(), "time": time.time()})
+    for _ in range(2):
+        try:
+            descriptor = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if not is_stale_lock(lock_path):
+                return False
+            os.remove(lock_path)
+            continue
+        with os.fdopen(descriptor, "w") as file:
+            file.write(owner)
+        return True
+    return False
+
+def is_stale_lock(lock_path: str) -> bool:
+    try:
+        with open(lock_path, "r", encoding="utf-8") as file:
+            owner = json.load(file)
+    except (OSError, ValueError):
+        return False
+    if owner.get("host") != socket.gethostname():
+        return False
+    try:
+        os.kill(owner["pid"], 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+def shard_command(manifest: Dict, work_dir: str, shard: int, python: str) -> List[str]:
+    shards = manifest["shards"]
+    return [
+        python, MAIN_PATH, *manifest["main_args"],
+        "--seed_shard", f"{shard}/{shards}",
+        "--iterations", str(shard_iterations(manifest["iterations"], shard, shards)),
+        "--output_path", shard_path(work_dir, shard, ".jsonl"),
+        "--ledger", shard_path(work_dir, shard, ".ledger.sqlite"),
+        "--metrics_path", shard_path(work_dir, shard, ".metrics.json"),
+        "--resume"
+    ]
+
+def run_shards(work_dir: str, manifest: Dict, processes: int, python: str, poll_interval: float = 0.5) -> List[int]:
+    """
+    Runs the unclaimed shards of a work directory, at most processes at a time, each in its
+    own main.py process logging to shard-NNNNN.log. A shard that exits cleanly is marked
+    done; a failed shard is unlocked so the next run retries it.
+
+    Returns:
+        List[int]: The shards that failed.
+    """
+    shards = manifest["shards"]
+    pending = list(range(shards))
+    running: Dict[int, tuple] = {}
+    failed = []
+    try:
+        while pending or running:
+            poll_shards(work_dir, manifest, processes, python, pending, running, failed)
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        # The shards receive the interrupt as well and keep what they have written
+        for shard, (process, log, _) in running.items():
+            process.wait()
+            log.close()
+            os.remove(shard_path(work_dir, shard, ".lock"))
+        print(f"\033[31mInterrupted. Shard outputs are kept in {work_dir}; run again to continue.\033[0m")
+        raise
+    return failed
+
+def poll_shards(
+    work_dir: str,
+    manifest: Dict,
+    processes: int,
+    python: str,
+    pending: List[int],
+    running: Dict[int, tuple],
+    failed: List[int]
+):
+    """
+    Starts pending shards while fewer than processes are running and collects the finished ones.
+    """
+    shards = manifest["shards"]
+    for shard, (process, log, start) in list(running.items()):
+        if process.poll() is None:
+            continue
+        log.close()
+        del running[shard]
+        seconds = time.time() - start
+        if process.returncode == 0:
+            finish_shard(work_dir, shard, count_records(shard_path(work_dir, shard, ".jsonl")), seconds)
+            print(f"\033[32mShard {shard + 1}/{shards} done in {seconds:.1f}s\033[0m")
+        else:
+            os.remove(shard_path(work_dir, shard, ".lock"))
+            failed.append(shard)
+            print(
+                f"\033[31mShard {shard + 1}/{shards} failed with exit code {process.returncode}; "
+                f"see {shard_path(work_dir, shard, '.log')}\033[0m"
+            )
+
+    while pending and len(running) < processes:
+        shard = pending.pop(0)
+        if not claim_shard(work_dir, shard):
+            continue
+        if shard_iterations(manifest["iterations"], shard, shards) == 0:
+            finish_shard(work_dir, shard, 0, 0.0)
+            continue
+        log = open(shard_path(work_dir, shard, ".log"), "a", encoding="utf-8")
+        process = subprocess.Popen(
+            shard_command(manifest, work_dir, shard, python),
+            stdout=log, stderr=subprocess.STDOUT
+        )
+        running[shard] = (process, log, time.time())
+        print(f"\033[34mStarted shard {shard + 1}/{shards} (pid {process.pid})\033[0m")
+
+def finish_shard(work_dir: str, shard: int, records: int, seconds: float):
+    with open(shard_path(work_dir, shard, ".done"), "w", encoding="utf-8") as file:
+        json.dump({"records": records, "seconds": seconds, "host": socket.gethostname()}, file)
+    os.remove(shard_path(work_dir, shard, ".lock"))
+
+def iter_shard_records(path: str) -> Iterator[Dict]:
+    """
+    Yields the records of a shard output, stopping at a truncated last line left by a shard
+    that is still running or was killed.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                return
+            yield record
+
+def count_records(path: str) -> int:
+    return sum(1 for _ in iter_shard_records(path))
+
+def shard_states(work_dir: str, shards: int) -> List[str]:
+    states = []
+    for shard in range(shards):
+        if os.path.exists(shard_path(work_dir, shard, ".done")):
+            states.append("done")
+        elif os.path.exists(shard_path(work_dir, shard, ".lock")):
+            states.append("running")
+        else:
+            states.append("pending")
+    return states
+
+def merge_records(work_dir: str, shards: int, keep_duplicates: bool = False) -> Iterator[Dict]:
+    """
+    Yields the records of every shard in shard order. Unless keep_duplicates is set, an
+    instruction already yielded by an earlier shard is skipped; only the set of seen
+    instructions is held in memory.
+    """
+    seen = set()
+    for shard in range(shards):
+        for record in iter_shard_records(shard_path(work_dir, shard, ".jsonl")):
+            if not keep_duplicates:
+                if record["instruction"] in seen:
+                    continue
+                seen.add(record["instruction"])
+            yield record
+
+def merge_context_stores(work_dir: str, shards: int, output_path: str) -> int:
+    """
+    Copies the per-shard context stores of a --context_mode ref run into OUTPUT_PATH.contexts.sqlite,
+    so the merged records resolve their context_hash against a single store.
+
+    Returns:
+        int: The number of shard stores merged.
+    """
+    paths = [
+        path for path in (shard_path(work_dir, shard, ".jsonl.contexts.sqlite") for shard in range(shards))
+        if os.path.exists(path)
+    ]
+    if not paths:
+        return 0
+    from utils.Record import ContextStore
+
+    target = ContextStore(output_path + ".contexts.sqlite")
+    target.close()
+    conn = sqlite3.connect(output_path + ".contexts.sqlite")
+    for path in paths:
+        conn.execute("ATTACH DATABASE ? AS shard", (path,))
+        conn.execute("INSERT OR IGNORE INTO contexts SELECT hash, size, data FROM shard.contexts")
+        conn.commit()
+        conn.execute("DETACH DATABASE shard")
+    conn.close()
+    return len(paths)
+
+def command_run(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    main_args = args.main_args[1:] if args.main_args[:1] == ["--"] else args.main_args
+    for option in main_args:
+        name = option.split("=", 1)[0]
+        if name in RESERVED_OPTIONS:
+            parser.error(f"{name} is set by the runner for each shard; use the runner's options instead.")
+        if name in UNSUPPORTED_OPTIONS:
+            parser.error(f"{name} cannot be used with sharded runs: {UNSUPPORTED_OPTIONS[name]}.")
+
+    manifest = load_manifest(args.work_dir)
+    if manifest is None:
+        if not args.shards or not main_args:
+            parser.error("A new work directory needs --shards and the main.py arguments after --.")
+        manifest = create_manifest(
+            args.work_dir, {"shards": args.shards, "iterations": args.iterations, "main_args": main_args}
+        )
+    elif (args.shards and args.shards != manifest["shards"]) or (main_args and main_args != manifest["main_args"]):
+        parser.error(f"{args.work_dir} already holds a run with different settings; see {MANIFEST}.")
+
+    processes = args.processes or os.cpu_count() or 1
+    print(f"\033[33mRunning {manifest['shards']} shards in {args.work_dir} with up to {processes} processes\033[0m")
+    start = time.time()
+    failed = run_shards(args.work_dir, manifest, processes, args.python)
+    states = shard_states(args.work_dir, manifest["shards"])
+    print(
+        f"\033[36mFinished in {time.time() - start:.1f}s: {states.count('done')} done, "
+        f"{states.count('running')} running elsewhere, {states.count('pending')} pending.\033[0m"
+    )
+    if failed:
+        print(f"\033[31mFailed shards: {', '.join(str(shard) for shard in failed)}. Run again to retry them.\033[0m")
+        sys.exit(1)
+
+def command_status(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    manifest = load_manifest(args.work_dir)
+    if manifest is None:
+        parser.error(f"No run in {args.work_dir}")
+    states = shard_states(args.work_dir, manifest["shards"])
+    print(f"{'shard':>6} {'state':<8} {'records':>8}")
+    for shard, state in enumerate(states):
+        print(f"{shard:>6} {state:<8} {count_records(shard_path(args.work_dir, shard, '.jsonl')):>8}")
+    print(f"{states.count('done')}/{len(states)} shards done")
+
+def command_merge(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    manifest = load_manifest(args.work_dir)
+    if manifest is None:
+        parser.error(f"No run in {args.work_dir}")
+    output_extension, _ = split_export_path(args.output_path)
+    if output_extension not in EXPORT_FORMATS:
+        parser.error(f"Unsupported output file format: {output_extension}")
+    missing = missing_dependencies(args.output_path)
+    if missing:
+        parser.error(f"Writing {args.output_path} requires: {', '.join(missing)}")
+
+    states = shard_states(args.work_dir, manifest["shards"])
+    unfinished = [str(shard) for shard, state in enumerate(states) if state != "done"]
+    if unfinished and not args.allow_partial:
+        parser.error(f"Shards {', '.join(unfinished)} are not done; finish them or pass --allow_partial.")
+
+    exported = export_records(
+        merge_records(args.work_dir, manifest["shards"], keep_duplicates=args.keep_duplicates),
+        args.output_path,
+        chunk_size=args.export_chunk_size,
+        shard_size=args.parquet_shard_size,
+        parquet_compression=args.parquet_compression
+    )
+    print(f"\033[36mMerged {exported} instructions from {manifest['shards']} shards into {args.output_path}\033[0m")
+    stores = merge_context_stores(args.work_dir, manifest["shards"], args.output_path)
+    if stores:
+        print(f"\033[36mMerged {stores} context stores into {args.output_path}.contexts.sqlite\033[0m")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the pipeline as parallel shards and merge their outputs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run the unfinished shards of a work directory.")
+    run.add_argument("--work_dir", type=str, required=True, help="Directory shared by the shards (and hosts) of a run.")
+    run.add_argument("--shards", type=int, default=None, help="Number of shards; required when starting a new run.")
+    run.add_argument("--processes", type=int, default=None, help="Shards run at once on this host; defaults to the CPU count.")
+    run.add_argument("--iterations", type=int, default=1, help="Total number of pipeline iterations, split across the shards.")
+    run.add_argument("--python", type=str, default=sys.executable, help="Python interpreter running main.py.")
+    run.add_argument("main_args", nargs=argparse.REMAINDER, help="Arguments passed to main.py, after --.")
+
+    status = commands.add_parser("status", help="Show the state and record count of each shard.")
+    status.add_argument("--work_dir", type=str, required=True, help="Work directory of the run.")
+
+    merge = commands.add_parser("merge", help="Merge the shard outputs into the final dataset.")
+    merge.add_argument("--work_dir", type=str, required=True, help="Work directory of the run.")
+    merge.add_argument("--output_path", type=str, required=True, help=f"Output file ({', '.join(EXPORT_FORMATS)}, text formats optionally .gz/.zst).")
+    merge.add_argument("--allow_partial", action="store_true", help="Merge even if some shards are not done.")
+    merge.add_argument("--keep_duplicates", action="store_true", help="Keep instructions generated by more than one shard.")
+    merge.add_argument("--export_chunk_size", type=int, default=None, help="Number of records written at a time.")
+    merge.add_argument("--parquet_shard_size", type=int, default=None, help="Maximum number of rows per Parquet file.")
+    merge.add_argument("--parquet_compression", type=str, default=None, choices=["snappy", "zstd", "gzip", "none"],
+                       help="Parquet codec; defaults to snappy.")
+
+    args = parser.parse_args()
+    {"run": command_run, "status": command_status, "merge": command_merge}[args.command](parser, args)
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,67 @@
 """
 tools package: Contains various tool classes for context retrieval and LLM interactions.
+
+Names are imported lazily on first access, so importing one tool does not pull in the
+dependencies (openai, serpapi, googlesearch, BeautifulSoup, ...) of the others.
 """
 
-from .tools import Tools
-from .llm import LLM
-from .serp_tool import SerpTool
-from .serper_tool import SerperTool
-from .google_search_tool import GoogleSearchTool
+import importlib
+
+from .registry import register_tool, available_tools, get_tool
+
+_EXPORTS = {
+    "Tools": ".tools",
+    "Metrics": ".metrics",
+    "get_metrics": ".metrics",
+    "RateLimiter": ".rate_limiter",
+    "RateLimiterRegistry": ".rate_limiter",
+    "LLM": ".llm",
+    "BatchClient": ".batch",
+    "HTMLExtractor": ".extractor",
+    "PageFetcher": ".fetcher",
+    "PageCache": ".page_cache",
+    "SearchCache": ".search_cache",
+    "SQLiteSearchCache": ".search_cache",
+    "FileSearchCache": ".search_cache",
+    "open_search_cache": ".search_cache",
+    "SerpTool": ".serp_tool",
+    "SerperTool": ".serper_tool",
+    "GoogleSearchTool": ".google_search_tool",
+    "SearchPlanner": ".search_planner",
+    "PlannedSearchTool": ".search_planner",
+}
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals()) + list(_EXPORTS))
 
 __all__ = [
     "Tools",
+    "Metrics",
+    "get_metrics",
+    "RateLimiter",
+    "RateLimiterRegistry",
     "LLM",
+    "BatchClient",
+    "HTMLExtractor",
+    "PageFetcher",
+    "PageCache",
+    "SearchCache",
+    "SQLiteSearchCache",
+    "FileSearchCache",
+    "open_search_cache",
     "SerpTool",
     "SerperTool",
     "GoogleSearchTool",
+    "SearchPlanner",
+    "PlannedSearchTool",
+    "register_tool",
+    "available_tools",
+    "get_tool",
 ]
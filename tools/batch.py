@@ -0,0 +1,231 @@
+import io
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+from .llm import LLM
+from .metrics import get_metrics
+
+class BatchError(Exception):
+    """Raised for requests that failed or were not completed by the Batch API."""
+
+class BatchClient:
+    def __init__(
+        self,
+        llm: LLM,
+        endpoint: str = "/v1/chat/completions",
+        max_batch_size: int = 1000,
+        flush_interval: float = 60.0,
+        poll_interval: float = 30.0,
+        completion_window: str = "24h",
+        work_dir: Optional[str] = None
+    ):
+        """
+        Collects chat completion requests into OpenAI Batch API jobs and resolves them asynchronously.
+
+        Requests are buffered and written to a JSONL file once max_batch_size requests are
+        waiting or flush_interval seconds have passed. The file is uploaded, a batch is created,
+        and a background thread polls it and resolves each request's future from the output file.
+
+        Parameters:
+            llm (LLM): The LLM whose shared client (and base_url) is used for the Batch API.
+            endpoint (str): The endpoint the batched requests target.
+            max_batch_size (int): Number of requests that triggers a flush.
+            flush_interval (float): Maximum number of seconds a request waits before its batch is submitted.
+            poll_interval (float): Seconds between batch status checks.
+            completion_window (str): Completion window requested from the Batch API.
+            work_dir (str, optional): Directory where the submitted JSONL files are kept. If None, files are built in memory.
+        """
+        self.llm = llm
+        self.endpoint = endpoint
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+        self.work_dir = work_dir
+        if work_dir:
+            os.makedirs(work_dir, exist_ok=True)
+
+        self._lock = threading.Condition()
+        self._ids = itertools.count()
+        self._buffer = []  # (custom_id, body)
+        self._buffer_started = None
+        self._futures: Dict[str, Future] = {}
+        self._active = {}  # batch id -> list of custom ids
+        self._closed = False
+        self._flush_requested = False
+        self._thread = threading.Thread(target=self._run, name="batch-client", daemon=True)
+        self._thread.start()
+
+    def submit(self, model: str, messages: List[dict], **params) -> Future:
+        """
+        Queues a chat completion request for the next batch.
+
+        Parameters:
+            model (str): The name of the model to use.
+            messages (List[dict]): The chat messages.
+            **params: Extra request parameters such as temperature.
+
+        Returns:
+            Future: Resolves to the chat completion response body as a dict.
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("BatchClient is closed.")
+            custom_id = f"request-{next(self._ids)}"
+            self._futures[custom_id] = future
+            self._buffer.append((custom_id, {"model": model, "messages": messages, **params}))
+            if self._buffer_started is None:
+                self._buffer_started = time.monotonic()
+            self._lock.notify_all()
+        return future
+
+    def pending(self) -> int:
+        """
+        Returns the number of submitted requests that are not resolved yet.
+        """
+        with self._lock:
+            return len(self._futures)
+
+    def _run(self):
+        last_poll = 0.0
+        while True:
+            with self._lock:
+                if self._closed and not self._buffer and not self._active:
+                    return
+                self._lock.wait(timeout=1.0)
+                due = self._buffer and (
+                    self._closed or
+                    self._flush_requested or
+                    len(self._buffer) >= self.max_batch_size or
+                    time.monotonic() - self._buffer_started >= self.flush_interval
+                )
+                if due:
+                    requests, self._buffer = self._buffer[:self.max_batch_size], self._buffer[self.max_batch_size:]
+                    self._buffer_started = time.monotonic() if self._buffer else None
+                    self._flush_requested = bool(self._buffer) and self._flush_requested
+                else:
+                    requests = None
+
+            # Nothing may end this thread while futures are pending, or their waiters would hang
+            try:
+                if requests:
+                    self._submit_batch(requests)
+                if self._active and time.monotonic() - last_poll >= self.poll_interval:
+                    last_poll = time.monotonic()
+                    self._poll()
+            except Exception as err:
+                print(f"\033[31mBatch client error: {err}\033[0m")
+
+    def _submit_batch(self, requests):
+        lines = "".join(
+            json.dumps({"custom_id": custom_id, "method": "POST", "url": self.endpoint, "body": body}, ensure_ascii=False) + "\n"
+            for custom_id, body in requests
+        ).encode('utf-8')
+        custom_ids = [custom_id for custom_id, _ in requests]
+        try:
+            if self.work_dir:
+                path = os.path.join(self.work_dir, f"batch-{int(time.time() * 1000)}-{custom_ids[0]}.jsonl")
+                with open(path, 'wb') as file:
+                    file.write(lines)
+                with open(path, 'rb') as file:
+                    input_file = self.llm.get_client().files.create(file=file, purpose="batch")
+            else:
+                input_file = self.llm.get_client().files.create(
+                    file=("batch.jsonl", io.BytesIO(lines)), purpose="batch"
+                )
+            batch = self.llm.get_client().batches.create(
+                input_file_id=input_file.id,
+                endpoint=self.endpoint,
+                completion_window=self.completion_window
+            )
+        except Exception as err:
+            self._fail(custom_ids, err)
+            return
+        with self._lock:
+            self._active[batch.id] = custom_ids
+
+    def _poll(self):
+        client = self.llm.get_client()
+        for batch_id, custom_ids in list(self._active.items()):
+            try:
+                batch = client.batches.retrieve(batch_id)
+            except Exception:
+                continue  # Transient error, retry on the next poll
+
+            if batch.status in ("validating", "in_progress", "finalizing", "cancelling"):
+                continue
+
+            if batch.status == "completed":
+                try:
+                    contents = [
+                        client.files.content(file_id).text
+                        for file_id in (batch.output_file_id, batch.error_file_id) if file_id
+                    ]
+                except Exception as err:
+                    print(f"\033[33mCould not download the results of batch {batch_id}, retrying on the next poll: {err}\033[0m")
+                    continue  # The batch stays active
+                for content in contents:
+                    self._resolve_file(content)
+            self._fail(custom_ids, BatchError(f"Batch {batch_id} ended with status '{batch.status}' without a result for this request."))
+            with self._lock:
+                del self._active[batch_id]
+
+    def _resolve_file(self, content: str):
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            try:
+                result = json.loads(line)
+                custom_id = result["custom_id"]
+            except (ValueError, TypeError, KeyError):
+                # Its request is failed with the others left without a result
+                print(f"\033[33mSkipping malformed batch result line: {line[:200]}\033[0m")
+                continue
+            with self._lock:
+                future = self._futures.pop(custom_id, None)
+            if future is None:
+                continue
+            try:
+                response = result.get("response") or {}
+                if result.get("error") or response.get("status_code", 200) >= 400:
+                    future.set_exception(BatchError(str(result.get("error") or response.get("body"))))
+                else:
+                    body = response["body"]
+                    get_metrics().record_usage(body.get("model", "batch"), body.get("usage"))
+                    future.set_result(body)
+            except Exception as err:
+                if not future.done():
+                    future.set_exception(BatchError(f"Malformed batch result for {custom_id}: {err}"))
+
+    def _fail(self, custom_ids: List[str], err: Exception):
+        # Fails the requests that are still unresolved
+        for custom_id in custom_ids:
+            with self._lock:
+                future = self._futures.pop(custom_id, None)
+            if future is not None:
+                future.set_exception(err)
+
+    def flush(self):
+        """
+        Submits the buffered requests now instead of waiting for the batch to fill up.
+        """
+        with self._lock:
+            # With nothing buffered the request would carry over to the next submit
+            if self._buffer:
+                self._flush_requested = True
+                self._lock.notify_all()
+
+    def close(self, wait: bool = True):
+        """
+        Submits the buffered requests and, if wait is True, blocks until every batch has finished.
+        """
+        with self._lock:
+            self._closed = True
+            self._lock.notify_all()
+        if wait:
+            self._thread.join()
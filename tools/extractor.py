@@ -0,0 +1,141 @@
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Union
+
+# Tags whose content is never part of the page's main text
+BOILERPLATE_TAGS = [
+    'script', 'style', 'noscript', 'template', 'svg', 'iframe',
+    'nav', 'header', 'footer', 'aside', 'form', 'button', 'select'
+]
+
+# Tags whose content is never text, dropped even when boilerplate is kept
+SCRIPT_TAGS = ['script', 'style']
+
+def available_backends() -> List[str]:
+    """
+    Returns the installed parser backends, fastest first. html.parser (via BeautifulSoup) is the fallback.
+    """
+    backends = []
+    if importlib.util.find_spec('selectolax') is not None:
+        backends.append('selectolax')
+    if importlib.util.find_spec('lxml') is not None:
+        backends.append('lxml')
+    backends.append('html.parser')
+    return backends
+
+def _extract_selectolax(html: Union[str, bytes], remove_boilerplate: bool) -> Optional[str]:
+    try:
+        from selectolax.lexbor import LexborHTMLParser as HTMLParser
+    except ImportError:
+        # selectolax < 0.3 only has the Modest backend, which 1.0 removed
+        from selectolax.parser import HTMLParser
+
+    tree = HTMLParser(html)
+    tree.strip_tags(BOILERPLATE_TAGS if remove_boilerplate else SCRIPT_TAGS)
+    if tree.body is None:
+        return None
+    return tree.body.text(separator=' ', strip=True)
+
+def _extract_lxml(html: Union[str, bytes], remove_boilerplate: bool) -> Optional[str]:
+    import lxml.html
+    from lxml import etree
+
+    encoding = None
+    if isinstance(html, str):
+        # lxml rejects str input that carries an XML encoding declaration
+        html = html.encode('utf-8')
+        encoding = 'utf-8'
+    if not html.strip():
+        return None
+    parser = lxml.html.HTMLParser(encoding=encoding, remove_comments=True)
+    doc = lxml.html.document_fromstring(html, parser=parser)
+    body = doc.find('body')
+    if body is None:
+        return None
+    etree.strip_elements(body, *(BOILERPLATE_TAGS if remove_boilerplate else SCRIPT_TAGS), with_tail=False)
+    return ' '.join(text.strip() for text in body.itertext() if text.strip())
+
+def _extract_html_parser(html: Union[str, bytes], remove_boilerplate: bool) -> Optional[str]:
+    from bs4 import BeautifulSoup
+
+    bs = BeautifulSoup(html, 'html.parser')
+    body = bs.find('body')
+    if not body:
+        return None
+    for tag in body(BOILERPLATE_TAGS if remove_boilerplate else SCRIPT_TAGS):
+        tag.decompose()
+    return body.get_text(separator=' ', strip=True)
+
+_EXTRACTORS = {
+    'selectolax': _extract_selectolax,
+    'lxml': _extract_lxml,
+    'html.parser': _extract_html_parser,
+}
+
+def extract_text(
+    html: Union[str, bytes],
+    backend: str = 'auto',
+    remove_boilerplate: bool = True
+) -> Optional[str]:
+    """
+    Extracts the visible body text from an HTML document.
+
+    Parameters:
+        html (str or bytes): The page content. Bytes are decoded by the parser.
+        backend (str): 'selectolax', 'lxml', 'html.parser', or 'auto' for the fastest installed one.
+        remove_boilerplate (bool): If True, scripts, styles, navigation, headers, footers and forms are dropped.
+
+    Returns:
+        str or None: The body text, or None if the page has no body.
+    """
+    if backend == 'auto':
+        backend = available_backends()[0]
+    return _EXTRACTORS[backend](html, remove_boilerplate)
+
+class HTMLExtractor:
+    def __init__(
+        self,
+        backend: str = 'auto',
+        remove_boilerplate: bool = True,
+        processes: int = 0
+    ):
+        """
+        Pluggable HTML-to-text extractor shared by the search tools.
+
+        Parameters:
+            backend (str): 'selectolax', 'lxml', 'html.parser', or 'auto' for the fastest installed one.
+            remove_boilerplate (bool): If True, scripts, styles, navigation, headers, footers and forms are dropped.
+            processes (int): If greater than 0, parsing runs in a pool of this many processes
+                so it does not compete for the GIL with the network threads.
+        """
+        installed = available_backends()
+        if backend == 'auto':
+            backend = installed[0]
+        elif backend not in installed:
+            raise ValueError(f"HTML parser backend '{backend}' is not installed (available: {', '.join(installed)})")
+        self.backend = backend
+        self.remove_boilerplate = remove_boilerplate
+        self.processes = processes
+        self._pool = ProcessPoolExecutor(max_workers=processes) if processes > 0 else None
+
+    def extract(self, html: Union[str, bytes]) -> Optional[str]:
+        """
+        Extracts the visible body text from an HTML document, in the process pool if one is configured.
+
+        Parameters:
+            html (str or bytes): The page content.
+
+        Returns:
+            str or None: The body text, or None if the page has no body.
+        """
+        if self._pool is not None:
+            return self._pool.submit(extract_text, html, self.backend, self.remove_boilerplate).result()
+        return extract_text(html, self.backend, self.remove_boilerplate)
+
+    def close(self):
+        """
+        Shuts down the process pool, if any.
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,258 @@
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+from .page_cache import PageCache
+from .extractor import HTMLExtractor
+from .metrics import get_metrics
+
+class FetchCancelled(Exception):
+    """Raised inside a fetch when enough pages have already been retrieved."""
+
+class PageFetcher:
+    def __init__(
+        self,
+        max_workers: int = 16,
+        pool_maxsize: int = 64,
+        timeout: float = 30,
+        max_page_bytes: int = 5 * 1024 * 1024,
+        headers: Optional[Dict[str, str]] = None,
+        cache: Optional[PageCache] = None,
+        extractor: Optional[HTMLExtractor] = None
+    ):
+        """
+        Fetches result pages concurrently over a shared, pooled HTTP session.
+
+        Parameters:
+            max_workers (int): Number of fetch threads shared by all callers.
+            pool_maxsize (int): Number of keep-alive connections kept per host.
+            timeout (float): Connect/read timeout per request in seconds.
+            max_page_bytes (int): Pages larger than this are truncated.
+            headers (Dict[str, str], optional): Extra headers sent with every request.
+            cache (PageCache, optional): On-disk page cache consulted before the network.
+            extractor (HTMLExtractor, optional): HTML-to-text extractor. Defaults to the fastest installed backend.
+        """
+        self.cache = cache
+        self.extractor = extractor or HTMLExtractor()
+        self.timeout = timeout
+        self.max_page_bytes = max_page_bytes
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+
+        self._stats_lock = threading.Lock()
+        self._host_stats = {}
+
+    def _record(self, link: str, elapsed: float, ok: bool):
+        host = urlparse(link).netloc
+        with self._stats_lock:
+            stats = self._host_stats.setdefault(
+                host, {"requests": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            )
+            stats["requests"] += 1
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+            if not ok:
+                stats["errors"] += 1
+
+    def download(self, link: str, cancel_event: Optional[threading.Event] = None) -> Union[str, bytes]:
+        """
+        Downloads a single page, aborting between chunks if cancel_event is set.
+
+        Parameters:
+            link (str): The URL to download.
+            cancel_event (threading.Event, optional): Set by the caller once the download is no longer needed.
+
+        Returns:
+            str or bytes: The decoded page if the server declared a charset, otherwise the raw bytes.
+        """
+        with self.session.get(link, timeout=self.timeout, stream=True) as resp:
+            resp.raise_for_status()
+            chunks = []
+            size = 0
+            for chunk in resp.iter_content(chunk_size=65536):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise FetchCancelled(link)
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= self.max_page_bytes:
+                    break
+            get_metrics().inc("bytes_downloaded_total", size)
+            raw = b"".join(chunks)
+            encoding = requests.utils.get_encoding_from_headers(resp.headers)
+            if encoding and 'charset' in resp.headers.get('content-type', '').lower():
+                return raw.decode(encoding, errors='replace')
+            return raw
+
+    def cached_text(self, link: str) -> Optional[str]:
+        """
+        Returns the cached body text of a page, or None if there is no cache or no entry.
+        """
+        if self.cache is None:
+            return None
+        entry = self.cache.get(link)
+        get_metrics().inc("page_cache_requests_total", result="miss" if entry is None else "hit")
+        return entry["text"] if entry is not None else None
+
+    def fetch_text(self, link: str, cancel_event: Optional[threading.Event] = None) -> Optional[str]:
+        """
+        Downloads a page and extracts its body text, recording the host's latency.
+        Cached pages skip both the download and the parse.
+
+        Returns:
+            str or None: The body text, or None if the page has no body.
+        """
+        text = self.cached_text(link)
+        if text is not None:
+            return text
+        html, text = self.download_text(link, cancel_event)
+        if self.cache is not None:
+            self.cache.put(link, html, text)
+        return text
+
+    def download_text(self, link: str, cancel_event: Optional[threading.Event] = None) -> Tuple[Union[str, bytes], Optional[str]]:
+        """
+        Downloads a page and extracts its body text without touching the cache.
+
+        Returns:
+            Tuple: The raw page and its body text (None if the page has no body).
+        """
+        metrics = get_metrics()
+        start = time.perf_counter()
+        try:
+            html = self.download(link, cancel_event)
+        except FetchCancelled:
+            metrics.inc("fetch_cancelled_total")
+            raise
+        except Exception:
+            self._record(link, time.perf_counter() - start, ok=False)
+            metrics.error("fetch")
+            raise
+        elapsed = time.perf_counter() - start
+        self._record(link, elapsed, ok=True)
+        metrics.observe("stage_seconds", elapsed, stage="fetch")
+        with metrics.timer("parse"):
+            text = self.extractor.extract(html)
+        return html, text
+
+    def fetch(
+        self,
+        links: List[str],
+        needed: int,
+        verbose: bool = False
+    ) -> List[Tuple[str, str]]:
+        """
+        Fetches candidate links concurrently and stops once `needed` pages have succeeded.
+
+        Pending fetches are cancelled and in-progress downloads are aborted as soon as
+        enough pages are in hand. Cached pages are taken first, in ranking order, and only
+        the pages that are returned are added to the cache, so a re-run with a warm cache
+        selects exactly the same pages (and builds the same contexts) without the network.
+
+        Parameters:
+            links (List[str]): Candidate links in ranking order.
+            needed (int): Number of successfully fetched pages wanted.
+            verbose (bool): If True, prints fetch failures.
+
+        Returns:
+            List[Tuple[str, str]]: (link, text) pairs in the links' original order.
+        """
+        if needed <= 0 or not links:
+            return []
+
+        pages = {}
+        for idx, link in enumerate(links):
+            if len(pages) >= needed:
+                break
+            text = self.cached_text(link)
+            if text:
+                pages[idx] = text
+        if len(pages) >= needed:
+            return [(links[idx], pages[idx]) for idx in sorted(pages)]
+
+        cancel_event = threading.Event()
+        futures = {
+            self.executor.submit(self.download_text, link, cancel_event): idx
+            for idx, link in enumerate(links) if idx not in pages
+        }
+        downloaded = {}
+        pending = set(futures)
+        try:
+            while pending and len(pages) < needed:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    idx = futures[future]
+                    try:
+                        html, text = future.result()
+                    except FetchCancelled:
+                        continue
+                    except Exception as e:
+                        if verbose:
+                            print(f"\033[94mCan't open {links[idx]}: {e}\033[0m")
+                        continue
+                    if text and len(pages) < needed:
+                        pages[idx] = text
+                        downloaded[idx] = html
+        finally:
+            cancel_event.set()
+            for future in pending:
+                future.cancel()
+
+        if self.cache is not None:
+            for idx, html in downloaded.items():
+                self.cache.put(links[idx], html, pages[idx])
+
+        return [(links[idx], pages[idx]) for idx in sorted(pages)]
+
+    def host_latency(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns per-host request counts, error counts and mean/max latency in seconds.
+        """
+        with self._stats_lock:
+            report = {}
+            for host, stats in self._host_stats.items():
+                report[host] = dict(stats)
+                report[host]["mean_seconds"] = stats["total_seconds"] / stats["requests"]
+            return report
+
+    def format_host_latency(self, top: int = 20) -> str:
+        """
+        Formats the slowest hosts by mean latency as a printable table.
+        """
+        rows = sorted(self.host_latency().items(), key=lambda item: item[1]["mean_seconds"], reverse=True)
+        lines = [f"{'host':<40} {'requests':>8} {'errors':>6} {'mean s':>8} {'max s':>8}"]
+        for host, stats in rows[:top]:
+            lines.append(
+                f"{host[:40]:<40} {stats['requests']:>8} {stats['errors']:>6} "
+                f"{stats['mean_seconds']:>8.2f} {stats['max_seconds']:>8.2f}"
+            )
+        return "\n".join(lines)
+
+    def close(self):
+        """
+        Shuts down the fetch threads, the extractor and the HTTP session.
+        """
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.extractor.close()
+        self.session.close()
+
+_default_fetcher = None
+_default_fetcher_lock = threading.Lock()
+
+def get_default_fetcher() -> PageFetcher:
+    """
+    Returns the process-wide PageFetcher shared by tools that were not given one.
+    """
+    global _default_fetcher
+    if _default_fetcher is None:
+        with _default_fetcher_lock:
+            if _default_fetcher is None:
+                _default_fetcher = PageFetcher()
+    return _default_fetcher
@@ -1,18 +1,18 @@
 from .tools import Tools
-import requests
-from bs4 import BeautifulSoup
-from googlesearch import search
 from .llm import LLM
-from time import sleep
+from .fetcher import PageFetcher
+from .rate_limiter import RateLimiterRegistry
+from .metrics import get_metrics
 from typing import List, Tuple, Optional
-from urllib.parse import urlparse
 
 class GoogleSearchTool(Tools):
     def __init__(
         self,
         name: str,
         agent: Optional[LLM] = None,
-        model: str = "gpt-4o-mini"
+        model: str = "gpt-4o-mini",
+        fetcher: Optional[PageFetcher] = None,
+        rate_limiters: Optional[RateLimiterRegistry] = None
     ):
         """
         Initializes the GoogleSearchTool.
@@ -21,21 +21,23 @@ class GoogleSearchTool(Tools):
             name (str): The name of the tool.
             agent (LLM, optional): An instance of the LLM agent for query preparation.
             model (str): The name of the model to use with the LLM agent.
+            fetcher (PageFetcher, optional): Shared page fetcher. Defaults to the process-wide fetcher.
+            rate_limiters (RateLimiterRegistry, optional): Shared rate limiters; Google searches use the "google" entry.
         """
-        super().__init__(name)
+        super().__init__(name, fetcher, rate_limiters=rate_limiters)
         self.agent = agent
         self.model = model
 
-    def get_context(
+    def get_pages(
         self,
         query: str,
         num_pages: int = 1,
         verbose: bool = False,
         skip_websites: Optional[List[str]] = None,
         used_number_of_links: Optional[int] = None
-    ) -> Tuple[str, List[str]]:
+    ) -> List[Tuple[str, str]]:
         """
-        Retrieves context and links for the given query using Google search.
+        Retrieves the body text of result pages for the given query using Google search.
 
         Parameters:
             query (str): The search query.
@@ -45,82 +47,65 @@ class GoogleSearchTool(Tools):
             used_number_of_links (int, optional): Desired number of successfully fetched links.
 
         Returns:
-            Tuple[str, List[str]]: A tuple containing the concatenated context string and a list of used links.
+            List[Tuple[str, str]]: (link, body text) pairs for the used links, in ranking order.
         """
         if skip_websites is None:
             skip_websites = []
         if used_number_of_links is None:
             used_number_of_links = 3  # Default desired number of used links
 
-        max_attempts = 3
-        attempts = 0
-        results_per_page = 10  # Max number of results per search query
-        context = ""
-        used_links = []
+        from googlesearch import search
 
         # Prepare the query, potentially using the LLM agent
         prepared_query = self.prepare_query(query)
 
-        while attempts < max_attempts:
-            attempts += 1
-            try:
-                # Perform Google search
-                results = search(
+        try:
+            # Perform Google search; the "google" rate limiter retries throttled and transient failures
+            with get_metrics().timer("search", engine="google"):
+                results = self.rate_limited("google", lambda: list(search(
                     prepared_query,
                     num_results=used_number_of_links * 2,  # Fetch more results to account for skips/failures
                     advanced=True,
                     lang="fa"
-                )
-                if verbose:
-                    print(f"Retrieved links:")
-
-                # Process links
-                for idx, result in enumerate(results):
-                    if len(used_links) >= used_number_of_links:
-                        break
-
-                    link = result.url
-                    if verbose:
-                        print(f"{idx + 1}: {link}")
-
-                    # Skip links from skipped websites
-                    parsed_url = urlparse(link)
-                    domain = parsed_url.netloc
-
-                    if any(skip_domain in domain for skip_domain in skip_websites):
-                        if verbose:
-                            print(f"Skipping link from skipped website: {link}")
-                        continue
-
-                    try:
-                        resp = requests.get(link, timeout=30)
-                        resp.raise_for_status()
-                        bs = BeautifulSoup(resp.text, 'html.parser')
-                        body = bs.find('body')
-                        if body:
-                            context += body.get_text(separator=' ', strip=True)
-                            context += "\n"
-                            used_links.append(link)
-                    except requests.RequestException as e:
-                        if verbose:
-                            print(f"\033[94mCan't open {link}: {e}\033[0m")
-                        continue
-
-                # If we've reached the desired number of used links, exit the loop
-                if len(used_links) >= used_number_of_links:
-                    break
-
-                if len(used_links) < used_number_of_links:
-                    if verbose:
-                        print(f"Could only retrieve {len(used_links)} out of {used_number_of_links} desired links.")
-                    break  # No more results to process
-
-            except Exception as e:
-                if verbose:
-                    print(f"Error during search: {e}")
-                sleep(5)  # Wait before retrying
-
-        return context, used_links
+                )))
+        except Exception as e:
+            if verbose:
+                print(f"Error during search: {e}")
+            return []
+
+        if verbose:
+            print("Retrieved links:")
+
+        # Skip links from skipped websites, then fetch the rest concurrently
+        candidates = self.filter_links(
+            [result.url for result in results],
+            skip_websites,
+            verbose=verbose
+        )
+        pages = self.fetch_pages(candidates, used_number_of_links, verbose=verbose)
+
+        if len(pages) < used_number_of_links:
+            if verbose:
+                print(f"Could only retrieve {len(pages)} out of {used_number_of_links} desired links.")
+        return pages
+
+    def search_links(self, query: str, page: int = 0, results_per_page: int = 10) -> List[str]:
+        """
+        Returns the result links of a Google search. Only the first page is available, so
+        later pages are empty; the query is searched as given, without prepare_query().
+        """
+        if page > 0:
+            return []
+        from googlesearch import search
+
+        with get_metrics().timer("search", engine="google"):
+            results = self.rate_limited("google", lambda: list(search(
+                query,
+                num_results=results_per_page,
+                advanced=True,
+                lang="fa"
+            )))
+        return [result.url for result in results]
 
     def prepare_query(self, query: str) -> str:
         """
@@ -140,13 +125,14 @@ class GoogleSearchTool(Tools):
             )
             try:
                 # Generate the search query using the LLM agent
-                completion = self.agent.get_client().chat.completions.create(
-                    messages=[
-                        {"role": "system", "content": prompt},
-                        {"role": "user", "content": query}
-                    ],
-                    model=self.model,
-                )
+                with get_metrics().timer("prepare_query"):
+                    completion = self.agent.chat(
+                        messages=[
+                            {"role": "system", "content": prompt},
+                            {"role": "user", "content": query}
+                        ],
+                        model=self.model,
+                    )
                 result = completion.choices[0].message.content.strip()
                 return result
             except Exception as e:
@@ -1,15 +1,444 @@
-from openai import OpenAI
+import asyncio
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Union
+
+from .rate_limiter import CHARS_PER_TOKEN, RateLimiterRegistry, estimate_tokens
+from .metrics import RATE_BUCKETS, get_metrics
+
+if TYPE_CHECKING:
+    import httpx
+    from openai import OpenAI, AsyncOpenAI
+
+@dataclass
+class StreamResult:
+    """
+    Outcome of a streamed chat completion.
+    """
+    text: str
+    seconds: float  # From sending the request to the last token read
+    ttft: Optional[float] = None  # Time to the first content token
+    completion_tokens: Optional[int] = None  # Reported by the API, or estimated from the text
+    finish_reason: Optional[str] = None  # The API's finish reason, or "max_chars" / "stop_sequence" if aborted
+    aborted: bool = False  # True if the stream was closed early by max_chars or a stop sequence
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        generation = self.seconds - (self.ttft or 0.0)
+        if not self.completion_tokens or generation <= 0:
+            return None
+        return self.completion_tokens / generation
+
+class _StreamReader:
+    """
+    Accumulates the chunks of one streamed completion and decides when to stop reading.
+    """
+    def __init__(
+        self,
+        max_chars: Optional[int],
+        stop: Sequence[str],
+        on_progress: Optional[Callable[[str], None]],
+        progress_interval: float
+    ):
+        self.start = time.perf_counter()
+        self.max_chars = max_chars
+        self.stop = [sequence for sequence in stop if sequence]
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self.last_progress = self.start
+        self.pieces: List[str] = []
+        self.length = 0
+        self.tail = ""
+        self.ttft = None
+        self.usage = None
+        self.finish_reason = None
+        self.aborted = False
+
+    def text(self) -> str:
+        return "".join(self.pieces)
+
+    def _truncate(self, length: int, reason: str):
+        self.pieces = [self.text()[:length]]
+        self.length = length
+        self.finish_reason = reason
+        self.aborted = True
+
+    def feed(self, chunk) -> bool:
+        """
+        Adds one chunk; returns True once the stream should be closed.
+        """
+        if getattr(chunk, "usage", None) is not None:
+            self.usage = chunk.usage
+        for choice in getattr(chunk, "choices", None) or []:
+            if choice.finish_reason:
+                self.finish_reason = choice.finish_reason
+            piece = getattr(choice.delta, "content", None) if choice.delta is not None else None
+            if not piece:
+                continue
+            now = time.perf_counter()
+            if self.ttft is None:
+                self.ttft = now - self.start
+            self.pieces.append(piece)
+            self.length += len(piece)
+
+            # Stop sequences may span chunks, so they are searched in the new piece plus the preceding tail
+            if self.stop:
+                window = self.tail + piece
+                matches = [window.find(sequence) for sequence in self.stop]
+                found = [position for position in matches if position >= 0]
+                if found:
+                    self._truncate(self.length - len(window) + min(found), "stop_sequence")
+                    return True
+                self.tail = window[-max(len(sequence) for sequence in self.stop):]
+            if self.max_chars is not None and self.length >= self.max_chars:
+                self._truncate(self.max_chars, "max_chars")
+                return True
+            if self.on_progress is not None and now - self.last_progress >= self.progress_interval:
+                self.last_progress = now
+                self.on_progress(self.text())
+        return False
+
+    def result(self) -> StreamResult:
+        text = self.text()
+        completion_tokens = getattr(self.usage, "completion_tokens", None) if not self.aborted else None
+        if completion_tokens is None:
+            completion_tokens = round(len(text) / CHARS_PER_TOKEN)
+        return StreamResult(
+            text=text,
+            seconds=time.perf_counter() - self.start,
+            ttft=self.ttft,
+            completion_tokens=completion_tokens,
+            finish_reason=self.finish_reason,
+            aborted=self.aborted
+        )
 
 class LLM:
-    def __init__(self, base_url:str, api_key:str):
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 120.0,
+        model_concurrency: Optional[Dict[str, int]] = None,
+        default_concurrency: Optional[int] = None,
+        rate_limiters: Optional[RateLimiterRegistry] = None
+    ):
+        """
+        Initializes the LLM with a shared, pooled OpenAI client.
+
+        Parameters:
+            base_url (str): Base URL of the OpenAI-compatible API.
+            api_key (str): API key for the LLM.
+            max_connections (int, optional): Size of the HTTP connection pool. Defaults to the
+                sum of the per-model concurrency limits, or 64 if no limits are given.
+            max_keepalive_connections (int, optional): Number of idle connections kept alive.
+                Defaults to max_connections.
+            keepalive_expiry (float): Seconds an idle connection is kept open.
+            timeout (float): Request timeout in seconds.
+            model_concurrency (Dict[str, int], optional): Maximum number of in-flight requests per model.
+            default_concurrency (int, optional): Limit for models not listed in model_concurrency.
+                If None, those models are only bounded by the connection pool.
+            rate_limiters (RateLimiterRegistry, optional): Per-model RPM/TPM limits, adaptive concurrency
+                and retries with backoff. If set, the OpenAI client's own retries are disabled.
+        """
         self.base_url = base_url
         self.api_key = api_key
-    
-    def get_client(self):
-        return OpenAI(
-            api_key=self.api_key,
+        self.model_concurrency = dict(model_concurrency or {})
+        self.default_concurrency = default_concurrency
+        self.rate_limiters = rate_limiters
+
+        if max_connections is None:
+            max_connections = sum(self.model_concurrency.values()) or 64
+            if default_concurrency:
+                max_connections += default_concurrency
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections or max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._client = None
+        self._async_client = None
+        self._semaphores = {}
+        self._async_semaphores = {}
+
+    def _limits(self) -> "httpx.Limits":
+        import httpx
+
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
         )
+
+    def _max_retries(self) -> int:
+        # Retries are handled by the rate limiters when they are configured
+        return 0 if self.rate_limiters is not None else 2
+
+    def get_client(self) -> "OpenAI":
+        """
+        Returns the shared synchronous client, creating it on first use.
+        The client is thread-safe and reuses keep-alive connections across calls.
+        """
+        if self._client is None:
+            import httpx
+            from openai import OpenAI
+
+            with self._lock:
+                if self._client is None:
+                    self._client = OpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url or None,
+                        timeout=self.timeout,
+                        max_retries=self._max_retries(),
+                        http_client=httpx.Client(limits=self._limits(), timeout=self.timeout)
+                    )
+        return self._client
+
+    def get_async_client(self) -> "AsyncOpenAI":
+        """
+        Returns the shared asynchronous client, creating it on first use.
+        """
+        if self._async_client is None:
+            import httpx
+            from openai import AsyncOpenAI
+
+            with self._lock:
+                if self._async_client is None:
+                    self._async_client = AsyncOpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url or None,
+                        timeout=self.timeout,
+                        max_retries=self._max_retries(),
+                        http_client=httpx.AsyncClient(limits=self._limits(), timeout=self.timeout)
+                    )
+        return self._async_client
+
+    def get_concurrency(self, model: str) -> Optional[int]:
+        """
+        Returns the concurrency limit for the given model, or None if unlimited.
+        """
+        return self.model_concurrency.get(model, self.default_concurrency)
+
+    @contextmanager
+    def limit(self, model: str):
+        """
+        Context manager that holds one of the model's concurrency slots.
+        """
+        limit = self.get_concurrency(model)
+        if not limit:
+            yield
+            return
+        with self._lock:
+            semaphore = self._semaphores.get(model)
+            if semaphore is None:
+                semaphore = self._semaphores[model] = threading.BoundedSemaphore(limit)
+        with semaphore:
+            yield
+
+    @asynccontextmanager
+    async def async_limit(self, model: str):
+        """
+        Async counterpart of limit().
+        """
+        limit = self.get_concurrency(model)
+        if not limit:
+            yield
+            return
+        semaphore = self._async_semaphores.get(model)
+        if semaphore is None:
+            semaphore = self._async_semaphores[model] = asyncio.Semaphore(limit)
+        async with semaphore:
+            yield
+
+    def chat(self, model: str, messages: List[dict], **kwargs):
+        """
+        Sends a chat completion request through the shared client, respecting the model's concurrency
+        limit and, if configured, its rate limiter (which retries throttled and transient failures).
+
+        Parameters:
+            model (str): The name of the model to use.
+            messages (List[dict]): The chat messages.
+            **kwargs: Extra arguments passed to chat.completions.create.
+
+        Returns:
+            The chat completion object.
+        """
+        def request():
+            with self.limit(model), get_metrics().timer("llm_request", model=model):
+                return self.get_client().chat.completions.create(
+                    messages=messages,
+                    model=model,
+                    **kwargs
+                )
+
+        if self.rate_limiters is None:
+            completion = request()
+        else:
+            limiter = self.rate_limiters.get(model)
+            tokens = estimate_tokens(messages, kwargs.get("max_tokens"))
+            completion = limiter.call(request, tokens=tokens)
+            limiter.record_usage(tokens, getattr(getattr(completion, "usage", None), "total_tokens", None))
+        get_metrics().record_usage(model, getattr(completion, "usage", None))
+        return completion
+
+    async def achat(self, model: str, messages: List[dict], **kwargs):
+        """
+        Async counterpart of chat().
+        """
+        async def request():
+            async with self.async_limit(model):
+                with get_metrics().timer("llm_request", model=model):
+                    return await self.get_async_client().chat.completions.create(
+                        messages=messages,
+                        model=model,
+                        **kwargs
+                    )
+
+        if self.rate_limiters is None:
+            completion = await request()
+        else:
+            limiter = self.rate_limiters.get(model)
+            tokens = estimate_tokens(messages, kwargs.get("max_tokens"))
+            completion = await limiter.acall(request, tokens=tokens)
+            limiter.record_usage(tokens, getattr(getattr(completion, "usage", None), "total_tokens", None))
+        get_metrics().record_usage(model, getattr(completion, "usage", None))
+        return completion
+
+    def _stream_kwargs(self, kwargs: dict) -> dict:
+        return {"stream": True, "stream_options": {"include_usage": True}, **kwargs}
+
+    def _record_stream(self, model: str, tokens: float, limiter, reader: _StreamReader, result: StreamResult):
+        metrics = get_metrics()
+        if result.ttft is not None:
+            metrics.observe("llm_ttft_seconds", result.ttft, model=model)
+        if result.tokens_per_second is not None:
+            metrics.observe("llm_tokens_per_second", result.tokens_per_second, buckets=RATE_BUCKETS, model=model)
+        if result.aborted:
+            metrics.inc("llm_stream_aborted_total", model=model, reason=result.finish_reason)
+        usage = reader.usage or {"completion_tokens": result.completion_tokens}
+        if limiter is not None:
+            prompt_tokens = getattr(reader.usage, "prompt_tokens", None) if reader.usage is not None else None
+            used = prompt_tokens + result.completion_tokens if prompt_tokens is not None else None
+            limiter.record_usage(tokens, used)
+        metrics.record_usage(model, usage)
+
+    def stream_chat(
+        self,
+        model: str,
+        messages: List[dict],
+        max_chars: Optional[int] = None,
+        stop: Union[str, Sequence[str], None] = None,
+        on_progress: Optional[Callable[[str], None]] = None,
+        progress_interval: float = 0.5,
+        **kwargs
+    ) -> StreamResult:
+        """
+        Sends a streaming chat completion request and reads the answer incrementally. Reading
+        stops, and the connection is closed, as soon as the answer reaches max_chars or contains
+        one of the stop sequences, so the slot is freed without waiting for the full answer.
+        Time to first token and tokens/sec are recorded per model.
+
+        Parameters:
+            model (str): The name of the model to use.
+            messages (List[dict]): The chat messages.
+            max_chars (int, optional): Maximum length of the answer in characters.
+            stop (str or Sequence[str], optional): Client-side stop sequences; the answer is cut before the first match.
+            on_progress (Callable[[str], None], optional): Called with the partial answer at most every progress_interval seconds.
+            progress_interval (float): Minimum seconds between two on_progress calls.
+            **kwargs: Extra arguments passed to chat.completions.create.
+
+        Returns:
+            StreamResult: The answer and its timings.
+        """
+        stops = [stop] if isinstance(stop, str) else list(stop or [])
+        limiter = self.rate_limiters.get(model) if self.rate_limiters is not None else None
+        tokens = estimate_tokens(messages, kwargs.get("max_tokens"))
+        readers = []
+
+        def request():
+            reader = _StreamReader(max_chars, stops, on_progress, progress_interval)
+            readers.append(reader)
+            with self.limit(model), get_metrics().timer("llm_request", model=model):
+                stream = self.get_client().chat.completions.create(
+                    messages=messages,
+                    model=model,
+                    **self._stream_kwargs(kwargs)
+                )
+                try:
+                    for chunk in stream:
+                        if reader.feed(chunk):
+                            break
+                finally:
+                    stream.close()
+            return reader.result()
+
+        result = request() if limiter is None else limiter.call(request, tokens=tokens)
+        self._record_stream(model, tokens, limiter, readers[-1], result)
+        return result
+
+    async def astream_chat(
+        self,
+        model: str,
+        messages: List[dict],
+        max_chars: Optional[int] = None,
+        stop: Union[str, Sequence[str], None] = None,
+        on_progress: Optional[Callable[[str], None]] = None,
+        progress_interval: float = 0.5,
+        **kwargs
+    ) -> StreamResult:
+        """
+        Async counterpart of stream_chat().
+        """
+        stops = [stop] if isinstance(stop, str) else list(stop or [])
+        limiter = self.rate_limiters.get(model) if self.rate_limiters is not None else None
+        tokens = estimate_tokens(messages, kwargs.get("max_tokens"))
+        readers = []
+
+        async def request():
+            reader = _StreamReader(max_chars, stops, on_progress, progress_interval)
+            readers.append(reader)
+            async with self.async_limit(model):
+                with get_metrics().timer("llm_request", model=model):
+                    stream = await self.get_async_client().chat.completions.create(
+                        messages=messages,
+                        model=model,
+                        **self._stream_kwargs(kwargs)
+                    )
+                    try:
+                        async for chunk in stream:
+                            if reader.feed(chunk):
+                                break
+                    finally:
+                        await stream.close()
+            return reader.result()
+
+        result = await request() if limiter is None else await limiter.acall(request, tokens=tokens)
+        self._record_stream(model, tokens, limiter, readers[-1], result)
+        return result
+
+    def close(self):
+        """
+        Closes the shared synchronous client. The async client is closed with aclose().
+        """
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self):
+        """
+        Closes the shared asynchronous client and drops the per-model async semaphores, which
+        are bound to the event loop they were first awaited on.
+        """
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+        self._async_semaphores = {}
+
     def __call__(self):
-        return OpenAI(
-            api_key=self.api_key,
-        )
\ No newline at end of file
+        return self.get_client()
@@ -0,0 +1,274 @@
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+PREFIX = "searchinstruct_"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, math.inf)
+RATE_BUCKETS = (1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0, 500.0, 1000.0, math.inf)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """
+        Fixed-bucket histogram with count, sum, min and max.
+        """
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def observe(self, value: float):
+        for idx, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[idx] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates the q-quantile by linear interpolation inside the bucket that contains it.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                upper = min(bound, self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99)
+        }
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class Metrics:
+    def __init__(self):
+        """
+        Thread-safe registry of counters and latency histograms for one run.
+
+        Stages (get_examples, prepare_query, search, fetch, parse, get_response, ...) are timed
+        into the "stage_seconds" histogram labelled by stage; failures are counted in
+        "stage_errors_total". Other counters cover tokens, bytes downloaded and cache hits.
+        """
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self.started = time.time()
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        """
+        Adds value to a counter.
+        """
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = LATENCY_BUCKETS, **labels):
+        """
+        Records one observation in a histogram. buckets applies when the series is created.
+        """
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def error(self, stage: str, **labels):
+        """
+        Counts a failure of a stage.
+        """
+        self.inc("stage_errors_total", stage=stage, **labels)
+
+    @contextmanager
+    def timer(self, stage: str, **labels):
+        """
+        Context manager timing a stage. Exceptions are counted as errors of the stage and re-raised.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.error(stage, **labels)
+            raise
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, stage=stage, **labels)
+
+    def record_usage(self, model: str, usage):
+        """
+        Counts the prompt and completion tokens of an LLM response. usage may be an object or a dict.
+        """
+        if usage is None:
+            return
+        for kind in ("prompt_tokens", "completion_tokens"):
+            value = usage.get(kind) if isinstance(usage, dict) else getattr(usage, kind, None)
+            if value:
+                self.inc("llm_tokens_total", value, model=model, kind=kind.split("_")[0])
+
+    def snapshot(self) -> dict:
+        """
+        Returns all counters and histogram summaries as plain data.
+        """
+        with self._lock:
+            return {
+                "started": self.started,
+                "elapsed_seconds": time.time() - self.started,
+                "counters": {
+                    name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                    for name, series in self._counters.items()
+                },
+                "histograms": {
+                    name: [{"labels": dict(key), **histogram.summary()} for key, histogram in series.items()]
+                    for name, series in self._histograms.items()
+                }
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self) -> str:
+        """
+        Renders the metrics in the Prometheus text exposition format.
+        """
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+                for key, value in series.items():
+                    lines.append(f"{PREFIX}{name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == math.inf else f"{bound:g}"
+                        lines.append(f"{PREFIX}{name}_bucket{_format_labels(key, ('le', le))} {cumulative}")
+                    lines.append(f"{PREFIX}{name}_sum{_format_labels(key)} {histogram.sum:g}")
+                    lines.append(f"{PREFIX}{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str):
+        """
+        Writes the metrics to path: JSON for .json files, Prometheus text otherwise.
+        """
+        content = self.to_json() if path.endswith(".json") else self.to_prometheus()
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(content)
+
+    def format_stages(self) -> str:
+        """
+        Formats the stage latency histograms as a printable table, slowest total time first.
+        """
+        with self._lock:
+            rows = [
+                (dict(key), histogram.summary(), self._counters.get("stage_errors_total", {}).get(key, 0))
+                for key, histogram in self._histograms.get("stage_seconds", {}).items()
+            ]
+        rows.sort(key=lambda row: row[1]["sum"], reverse=True)
+        lines = [f"{'stage':<32} {'count':>7} {'errors':>6} {'total s':>9} {'p50 s':>7} {'p99 s':>7} {'max s':>7}"]
+        for labels, summary, errors in rows:
+            name = ",".join(str(value) for value in labels.values())
+            lines.append(
+                f"{name[:32]:<32} {summary['count']:>7} {int(errors):>6} {summary['sum']:>9.1f} "
+                f"{summary['p50']:>7.2f} {summary['p99']:>7.2f} {summary['max']:>7.2f}"
+            )
+        return "\n".join(lines)
+
+    def format_streaming(self) -> str:
+        """
+        Formats the time-to-first-token and tokens/sec histograms of streamed responses per model.
+        """
+        with self._lock:
+            ttft = {dict(key).get("model"): histogram.summary() for key, histogram in self._histograms.get("llm_ttft_seconds", {}).items()}
+            rates = {dict(key).get("model"): histogram.summary() for key, histogram in self._histograms.get("llm_tokens_per_second", {}).items()}
+            aborted: Dict[str, float] = {}
+            for key, value in self._counters.get("llm_stream_aborted_total", {}).items():
+                model = dict(key).get("model")
+                aborted[model] = aborted.get(model, 0) + value
+        lines = [f"{'model':<32} {'streams':>7} {'aborted':>7} {'ttft p50':>8} {'ttft p99':>8} {'tok/s p50':>9} {'tok/s mean':>10}"]
+        for model, summary in sorted(ttft.items(), key=lambda item: str(item[0])):
+            rate = rates.get(model, Histogram().summary())
+            lines.append(
+                f"{str(model)[:32]:<32} {summary['count']:>7} {int(aborted.get(model, 0)):>7} {summary['p50']:>8.2f} "
+                f"{summary['p99']:>8.2f} {rate['p50']:>9.1f} {rate['mean']:>10.1f}"
+            )
+        return "\n".join(lines)
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> "ThreadingHTTPServer":
+        """
+        Starts a background HTTP server exposing /metrics (Prometheus text) and /metrics.json.
+
+        Returns:
+            ThreadingHTTPServer: The running server; call shutdown() to stop it.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics.json"):
+                    body, content_type = registry.to_json(), "application/json"
+                elif self.path.startswith("/metrics"):
+                    body, content_type = registry.to_prometheus(), "text/plain; version=0.0.4"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        return server
+
+_default_metrics = Metrics()
+
+def get_metrics() -> Metrics:
+    """
+    Returns the process-wide metrics registry that the tools and pipeline stages report to.
+    """
+    return _default_metrics
@@ -0,0 +1,170 @@
+import base64
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Union
+
+class PageCache:
+    def __init__(
+        self,
+        cache_dir: str,
+        ttl: Optional[float] = 7 * 24 * 3600,
+        max_bytes: int = 2 * 1024 ** 3,
+        store_raw: bool = True
+    ):
+        """
+        Persistent on-disk cache of fetched pages and their extracted body text.
+
+        Entries are content-addressed by the SHA-256 of the URL and stored as gzipped
+        JSON files. Expired entries are dropped on read, and the least recently used
+        entries are evicted once the cache grows beyond max_bytes.
+
+        Parameters:
+            cache_dir (str): Directory that holds the cache files.
+            ttl (float, optional): Lifetime of an entry in seconds. None keeps entries forever.
+            max_bytes (int): Maximum total size of the cache on disk.
+            store_raw (bool): If True, the raw response body is stored alongside the text.
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.store_raw = store_raw
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size on disk, least recently used first
+        self._total_bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def key(url: str) -> str:
+        """
+        Returns the cache key for a URL.
+        """
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json.gz")
+
+    def _load_index(self):
+        # Rebuild the LRU order from file modification times, which are bumped on every hit
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for file_name in files:
+                if not file_name.endswith(".json.gz"):
+                    continue
+                stat = os.stat(os.path.join(root, file_name))
+                entries.append((stat.st_mtime, file_name[:-len(".json.gz")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def _remove(self, key: str):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def get(self, url: str) -> Optional[dict]:
+        """
+        Looks up a URL in the cache.
+
+        Parameters:
+            url (str): The page URL.
+
+        Returns:
+            dict or None: The cached entry with "url", "fetched_at", "text" and, if stored,
+            "raw" keys, or None on a miss or an expired entry.
+        """
+        key = self.key(url)
+        path = self._path(key)
+        with self._lock:
+            size = self._entries.get(key)
+        if size is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # The file is read outside the lock so that fetch threads do not queue on disk I/O;
+        # put() replaces files atomically, so a concurrent write is seen whole or not at all
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            entry = None
+        expired = entry is not None and self.ttl is not None and time.time() - entry["fetched_at"] > self.ttl
+
+        with self._lock:
+            if entry is None or expired:
+                # Unless put() stored a new version in the meantime
+                if self._entries.get(key) == size:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        if entry.get("raw_base64"):
+            entry["raw"] = base64.b64decode(entry.pop("raw_base64"))
+        return entry
+
+    def put(self, url: str, raw: Union[str, bytes, None], text: Optional[str]):
+        """
+        Stores a fetched page and its extracted text.
+
+        Parameters:
+            url (str): The page URL.
+            raw (str or bytes): The raw response body.
+            text (str, optional): The extracted body text, or None if the page had no body.
+        """
+        entry = {"url": url, "fetched_at": time.time(), "text": text}
+        if self.store_raw and raw is not None:
+            if isinstance(raw, bytes):
+                entry["raw_base64"] = base64.b64encode(raw).decode('ascii')
+            else:
+                entry["raw"] = raw
+        data = gzip.compress(json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+
+        key = self.key(url)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique across threads and processes: shards of a run share the cache directory
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{key}.", suffix=".tmp", dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+
+        with self._lock:
+            os.replace(tmp_path, path)
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss counts and the current size of the cache.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes
+            }
@@ -0,0 +1,321 @@
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from .metrics import get_metrics
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# Characters per token used when no tokenizer is available; conservative because Persian
+# text tokenizes to noticeably fewer characters per token than English
+CHARS_PER_TOKEN = 2.5
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        """
+        Token bucket refilled continuously at per_minute units per minute.
+
+        Parameters:
+            per_minute (float): Capacity and refill rate per minute.
+        """
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """
+        Takes amount units from the bucket, going into debt if needed.
+
+        Returns:
+            float: Seconds the caller must wait before the reservation is covered.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # A single request larger than the bucket is allowed once the bucket is full
+            amount = min(amount, self.capacity)
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+    def adjust(self, amount: float):
+        """
+        Corrects an earlier reservation once the real usage is known (positive takes more, negative gives back).
+        """
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+class AIMDConcurrency:
+    def __init__(self, initial: int, minimum: int = 1, maximum: Optional[int] = None):
+        """
+        Concurrency window adjusted by additive increase / multiplicative decrease.
+
+        Each success grows the window by 1/window (about +1 per window of successes);
+        each throttling response halves it.
+
+        Parameters:
+            initial (int): Starting number of concurrent calls.
+            minimum (int): Lower bound of the window.
+            maximum (int, optional): Upper bound of the window. Defaults to initial.
+        """
+        self.minimum = minimum
+        self.maximum = maximum or initial
+        self.limit = float(initial)
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def try_acquire(self) -> bool:
+        with self._condition:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        with self._condition:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    def on_throttle(self):
+        with self._condition:
+            self.limit = max(self.minimum, self.limit / 2)
+
+def status_code(error: Exception) -> Optional[int]:
+    """
+    Returns the HTTP status code carried by an OpenAI or requests exception, if any.
+    """
+    code = getattr(error, "status_code", None)
+    if code is None:
+        response = getattr(error, "response", None)
+        code = getattr(response, "status_code", None)
+    return code if isinstance(code, int) else None
+
+def retry_after(error: Exception) -> Optional[float]:
+    """
+    Returns the delay requested by the server through Retry-After / retry-after-ms headers, in seconds.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    milliseconds = headers.get("retry-after-ms")
+    if milliseconds:
+        try:
+            return float(milliseconds) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None  # Malformed header, fall back to the backoff delay
+    return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Returns True for throttling, server-side and transient network errors.
+    """
+    code = status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS_CODES
+    name = type(error).__name__
+    return "Timeout" in name or "Connection" in name or "RateLimit" in name
+
+def estimate_tokens(messages: List[dict], max_tokens: Optional[int] = None) -> float:
+    """
+    Rough token estimate of a chat request (prompt plus the completion budget), used to reserve TPM.
+    """
+    chars = sum(len(message.get("content") or "") for message in messages)
+    return chars / CHARS_PER_TOKEN + (max_tokens or 0)
+
+def backoff_delay(attempt: int, base_delay: float = 1.0, max_delay: float = 60.0) -> float:
+    """
+    Returns a full-jitter exponential backoff delay for the given attempt (starting at 1).
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+class RateLimiter:
+    def __init__(
+        self,
+        name: str,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        max_concurrency: int = 64,
+        min_concurrency: int = 1,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0
+    ):
+        """
+        Client-side limiter for one model or search API: requests-per-minute and tokens-per-minute
+        buckets, an AIMD concurrency window driven by 429 responses, and jittered exponential
+        backoff that honors Retry-After.
+
+        Parameters:
+            name (str): Name of the model or API, used in log messages.
+            rpm (float, optional): Requests per minute. Unlimited if None.
+            tpm (float, optional): Tokens per minute. Unlimited if None.
+            max_concurrency (int): Starting and maximum number of concurrent calls.
+            min_concurrency (int): Lowest concurrency the window can shrink to.
+            max_retries (int): Number of retries for retryable errors before giving up.
+            base_delay (float): Backoff delay of the first retry in seconds.
+            max_delay (float): Maximum backoff delay in seconds.
+        """
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.concurrency = AIMDConcurrency(max_concurrency, minimum=min_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.throttled = 0
+        self.retries = 0
+
+    def _reserve(self, tokens: float) -> float:
+        delay = 0.0
+        if self.requests is not None:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens is not None and tokens:
+            delay = max(delay, self.tokens.reserve(tokens))
+        return delay
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        # Returns how long to wait before retrying, or None if the error should be raised
+        if attempt > self.max_retries or not is_retryable(error):
+            return None
+        self.retries += 1
+        get_metrics().inc("retries_total", limiter=self.name)
+        if status_code(error) == 429 or "RateLimit" in type(error).__name__:
+            self.throttled += 1
+            get_metrics().inc("throttled_total", limiter=self.name)
+            self.concurrency.on_throttle()
+        delay = retry_after(error)
+        if delay is None:
+            delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+        delay = min(delay, self.max_delay)
+        print(f"\033[33m{self.name}: {type(error).__name__} ({status_code(error) or 'no status'}), retry {attempt}/{self.max_retries} in {delay:.1f}s\033[0m")
+        return delay
+
+    def record_usage(self, estimated_tokens: float, used_tokens: Optional[float]):
+        """
+        Reconciles the tokens-per-minute bucket with the usage reported by the API.
+        """
+        if self.tokens is not None and used_tokens is not None:
+            self.tokens.adjust(used_tokens - estimated_tokens)
+
+    def call(self, fn: Callable[[], T], tokens: float = 0) -> T:
+        """
+        Calls fn under the rate limits, retrying retryable errors with backoff.
+
+        Parameters:
+            fn (Callable[[], T]): The request to perform.
+            tokens (float): Estimated number of tokens the request uses.
+
+        Returns:
+            T: The result of fn.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            # Every attempt is a request, but the tokens are only reserved once per call
+            time.sleep(self._reserve(tokens if attempt == 1 else 0))
+            self.concurrency.acquire()
+            try:
+                result = fn()
+            except Exception as error:
+                delay = self._retry_delay(error, attempt)
+                if delay is None:
+                    raise
+            else:
+                self.concurrency.on_success()
+                return result
+            finally:
+                self.concurrency.release()
+            time.sleep(delay)
+
+    async def acall(self, fn: Callable[[], Awaitable[T]], tokens: float = 0) -> T:
+        """
+        Async counterpart of call(); fn returns a new awaitable for each attempt.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            await asyncio.sleep(self._reserve(tokens if attempt == 1 else 0))
+            while not self.concurrency.try_acquire():
+                await asyncio.sleep(0.05)
+            try:
+                result = await fn()
+            except Exception as error:
+                delay = self._retry_delay(error, attempt)
+                if delay is None:
+                    raise
+            else:
+                self.concurrency.on_success()
+                return result
+            finally:
+                self.concurrency.release()
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        """
+        Returns the current concurrency window and retry counters.
+        """
+        return {
+            "concurrency": int(self.concurrency.limit),
+            "retries": self.retries,
+            "throttled": self.throttled
+        }
+
+class RateLimiterRegistry:
+    def __init__(self, limits: Optional[Dict[str, dict]] = None, **defaults):
+        """
+        Shared set of rate limiters, one per model or search API, created on first use.
+
+        Parameters:
+            limits (Dict[str, dict], optional): RateLimiter keyword arguments per key, e.g.
+                {"gpt-4o-mini": {"rpm": 500, "tpm": 200000}, "serper": {"rpm": 300}}.
+            **defaults: RateLimiter keyword arguments for keys without an entry in limits.
+                Those keys still get retries, backoff and AIMD concurrency.
+        """
+        self.limits = dict(limits or {})
+        self.defaults = defaults
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> RateLimiter:
+        """
+        Returns the limiter for a model or search API name.
+        """
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = self._limiters[key] = RateLimiter(key, **{**self.defaults, **self.limits.get(key, {})})
+            return limiter
+
+    def stats(self) -> Dict[str, dict]:
+        """
+        Returns the stats of every limiter created so far.
+        """
+        with self._lock:
+            return {key: limiter.stats() for key, limiter in self._limiters.items()}
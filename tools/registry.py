@@ -0,0 +1,47 @@
+import importlib
+import threading
+from typing import Dict, List, Type, Union
+
+# Search tools by --tool_name, as "module:ClassName" so a backend and its
+# dependencies (serpapi, googlesearch, ...) are imported only when it is selected
+_TOOLS: Dict[str, Union[str, type]] = {
+    "serp_tool": "tools.serp_tool:SerpTool",
+    "serper_tool": "tools.serper_tool:SerperTool",
+    "google_search": "tools.google_search_tool:GoogleSearchTool",
+}
+_lock = threading.Lock()
+
+def register_tool(name: str, target: Union[str, type]):
+    """
+    Registers a search tool under a name, replacing any tool already registered under it.
+
+    Parameters:
+        name (str): Name of the tool, as given to --tool_name.
+        target (str or type): The Tools subclass, or its "module:ClassName" path to import on first use.
+    """
+    if isinstance(target, str) and ":" not in target:
+        raise ValueError(f"Tool target must be 'module:ClassName', got: {target}")
+    with _lock:
+        _TOOLS[name] = target
+
+def available_tools() -> List[str]:
+    """
+    Returns the names of the registered search tools, without importing them.
+    """
+    with _lock:
+        return list(_TOOLS)
+
+def get_tool(name: str) -> Type:
+    """
+    Returns the search tool class registered under a name, importing its module on first use.
+    """
+    with _lock:
+        if name not in _TOOLS:
+            raise ValueError(f"Unknown tool name: {name} (available: {', '.join(_TOOLS)})")
+        target = _TOOLS[name]
+    if isinstance(target, str):
+        module_name, _, class_name = target.partition(":")
+        target = getattr(importlib.import_module(module_name), class_name)
+        with _lock:
+            _TOOLS[name] = target
+    return target
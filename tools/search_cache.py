@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+class SearchCache(ABC):
+    def __init__(self, ttl: Optional[float] = 7 * 24 * 3600):
+        """
+        Base class for caches of search API responses.
+
+        Responses are keyed on (engine, query, start, num) and expire after ttl seconds.
+
+        Parameters:
+            ttl (float, optional): Lifetime of a cached response in seconds. None keeps responses forever.
+        """
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+
+    @staticmethod
+    def key(engine: str, query: str, start: int, num: int) -> str:
+        """
+        Returns the cache key for a search request.
+        """
+        payload = json.dumps([engine, query, start, num], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def _count(self, hit: bool):
+        with self._counter_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, engine: str, query: str, start: int, num: int) -> Optional[dict]:
+        """
+        Looks up a cached search response.
+
+        Returns:
+            dict or None: The cached response, or None on a miss or an expired entry.
+        """
+        result = self._get(self.key(engine, query, start, num))
+        self._count(result is not None)
+        return result
+
+    def put(self, engine: str, query: str, start: int, num: int, response: dict):
+        """
+        Stores a search response.
+        """
+        self._put(self.key(engine, query, start, num), response)
+
+    def stats(self) -> dict:
+        """
+        Returns the hit and miss counters.
+        """
+        with self._counter_lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[dict]:
+        pass
+
+    @abstractmethod
+    def _put(self, key: str, response: dict):
+        pass
+
+    def close(self):
+        """
+        Releases any resources held by the cache.
+        """
+        pass
+
+class SQLiteSearchCache(SearchCache):
+    def __init__(self, path: str, ttl: Optional[float] = 7 * 24 * 3600):
+        """
+        Search cache backed by a single SQLite file.
+
+        Parameters:
+            path (str): Path of the SQLite database.
+            ttl (float, optional): Lifetime of a cached response in seconds.
+        """
+        super().__init__(ttl)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache "
+            "(key TEXT PRIMARY KEY, created_at REAL NOT NULL, response TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT created_at, response FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self._expired(row[0]):
+                self._conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+        return json.loads(row[1])
+
+    def _put(self, key: str, response: dict):
+        data = json.dumps(response, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, created_at, response) VALUES (?, ?, ?)",
+                (key, time.time(), data)
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class FileSearchCache(SearchCache):
+    def __init__(self, cache_dir: str, ttl: Optional[float] = 7 * 24 * 3600):
+        """
+        Search cache storing one JSON file per request in a local directory.
+
+        Parameters:
+            cache_dir (str): Directory that holds the cache files.
+            ttl (float, optional): Lifetime of a cached response in seconds.
+        """
+        super().__init__(ttl)
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _get(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if self._expired(entry["created_at"]):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+        return entry["response"]
+
+    def _put(self, key: str, response: dict):
+        path = self._path(key)
+        # Unique across threads and processes: shards of a run share the cache directory
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{key}.", suffix=".tmp", dir=os.path.dirname(path))
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump({"created_at": time.time(), "response": response}, file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+def open_search_cache(path: str, ttl: Optional[float] = 7 * 24 * 3600) -> SearchCache:
+    """
+    Opens a search cache, choosing the backend from the path.
+
+    Parameters:
+        path (str): A .sqlite/.sqlite3/.db file for the SQLite backend, otherwise a directory for the file backend.
+        ttl (float, optional): Lifetime of a cached response in seconds.
+
+    Returns:
+        SearchCache: The opened cache.
+    """
+    if os.path.splitext(path)[1].lower() in ['.sqlite', '.sqlite3', '.db']:
+        return SQLiteSearchCache(path, ttl=ttl)
+    return FileSearchCache(path, ttl=ttl)
@@ -0,0 +1,229 @@
+import json
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from .tools import Tools
+from .metrics import get_metrics
+
+if TYPE_CHECKING:
+    # openai is only needed once variants are generated
+    from .llm import LLM
+
+VARIANTS_PROMPT = """
+You are an expert in web search.
+Given a question, write up to {count} different search engine queries that would find pages answering it.
+Include at least one query in Persian and one in English, and vary the wording and keywords between them.
+
+Provide the output in JSON format with the following structure:
+{{
+    "queries": [
+        "Query 1",
+        "Query 2",
+        ...
+    ]
+}}
+
+Do not include any additional explanations, comments, or extra content. Only return the JSON output as specified.
+"""
+
+def canonical_url(link: str) -> str:
+    """
+    Returns the key under which result links are deduplicated. Scheme, "www.", fragment and
+    trailing slash are ignored, so the http and https or www and bare-domain forms of a page match.
+    """
+    parts = urlsplit(link.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parts.path.rstrip("/")
+    return f"{host}{path}?{parts.query}" if parts.query else f"{host}{path}"
+
+def merge_links(results: List[List[str]], seen: set) -> List[str]:
+    """
+    Merges the result links of several queries by rank: the first result of every query, then
+    the second of every query, and so on. Links already in seen (by canonical URL) are dropped,
+    and the new ones are added to it.
+
+    Parameters:
+        results (List[List[str]]): Result links of each query, in the queries' order.
+        seen (set): Canonical URLs of links already used; updated in place.
+
+    Returns:
+        List[str]: The merged, deduplicated links.
+    """
+    merged = []
+    for rank in range(max((len(links) for links in results), default=0)):
+        for links in results:
+            if rank < len(links) and links[rank]:
+                key = canonical_url(links[rank])
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(links[rank])
+    return merged
+
+def parse_queries(content: str) -> List[str]:
+    """
+    Extracts the query list from the variants LLM output, tolerating text around the JSON.
+    """
+    match = re.search(r"\{.*\}", content, re.DOTALL)
+    if match is None:
+        return []
+    queries = json.loads(match.group(0)).get("queries", [])
+    return [str(query) for query in queries if isinstance(query, str)]
+
+class SearchPlanner:
+    def __init__(self, agent: Optional["LLM"] = None, model: str = "gpt-4o-mini", num_variants: int = 3, max_workers: int = 16):
+        """
+        Plans the searches for a question: rewrites it into several query variants (Persian and
+        English phrasings) with one LLM call, and runs their searches concurrently.
+
+        Parameters:
+            agent (LLM, optional): LLM used to write the variants. Without it only the question itself is searched.
+            model (str): The model used to write the variants.
+            num_variants (int): Maximum number of queries per question, the question itself included.
+            max_workers (int): Number of threads sending search requests.
+        """
+        self.agent = agent
+        self.model = model
+        self.num_variants = num_variants
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="search-planner")
+
+    def variants(self, question: str, verbose: bool = False) -> List[str]:
+        """
+        Returns the queries to search for a question: the question itself first, then the
+        LLM-written variants, without duplicates. Falls back to the question alone if the
+        LLM call or its output fails.
+        """
+        queries = [question]
+        if self.agent is None or self.num_variants <= 1:
+            return queries
+        try:
+            with get_metrics().timer("plan_queries"):
+                completion = self.agent.chat(
+                    messages=[
+                        {"role": "system", "content": VARIANTS_PROMPT.format(count=self.num_variants - 1)},
+                        {"role": "user", "content": question}
+                    ],
+                    model=self.model,
+                    temperature=0.2
+                )
+            queries += parse_queries(completion.choices[0].message.content)
+        except Exception as e:
+            if verbose:
+                print(f"\033[31mError generating query variants: {e}\033[0m")
+        unique = list(dict.fromkeys(query.strip() for query in queries if query and query.strip()))
+        if verbose:
+            print(f"\033[36mSearch queries:\033[0m {unique[:self.num_variants]}")
+        return unique[:self.num_variants]
+
+    def search(
+        self,
+        tool: Tools,
+        queries: List[str],
+        page: int,
+        verbose: bool = False,
+        started: Optional[Dict[str, Future]] = None
+    ) -> List[List[str]]:
+        """
+        Requests one page of results for every query at once.
+
+        Parameters:
+            tool (Tools): The search tool.
+            queries (List[str]): The queries.
+            page (int): Index of the result page.
+            verbose (bool): If True, prints failed requests.
+            started (Dict[str, Future], optional): Requests for this page already submitted, by query.
+
+        Returns:
+            List[List[str]]: The result links of each query; empty for failed requests.
+        """
+        started = started or {}
+        futures = [started.get(query) or self.executor.submit(tool.search_links, query, page) for query in queries]
+        results = []
+        for query, future in zip(queries, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                if verbose:
+                    print(f"Search request for '{query}' failed: {e}")
+                results.append([])
+        return results
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+class PlannedSearchTool(Tools):
+    def __init__(self, tool: Tools, planner: SearchPlanner):
+        """
+        Wraps a search tool so that each question is searched through a SearchPlanner: all
+        query variants are searched in one concurrent round, their links are merged by rank
+        and deduplicated, and the pages are fetched until enough have succeeded. Another
+        round (the next result page of every variant) is requested only if they fall short.
+
+        Links are merged in a fixed order rather than as responses arrive, so re-runs with
+        the search and page caches build the same contexts.
+
+        Parameters:
+            tool (Tools): The search tool; it must implement search_links().
+            planner (SearchPlanner): The planner writing the variants and running the searches.
+        """
+        super().__init__(tool.name, tool.fetcher, tool.search_cache, tool.rate_limiters)
+        self.tool = tool
+        self.planner = planner
+
+    def search_links(self, query: str, page: int = 0, results_per_page: int = 10) -> List[str]:
+        return self.tool.search_links(query, page, results_per_page)
+
+    def get_pages(
+        self,
+        query: str,
+        num_pages: int = 1,
+        verbose: bool = False,
+        skip_websites: Optional[List[str]] = None,
+        used_number_of_links: Optional[int] = None
+    ) -> List[Tuple[str, str]]:
+        """
+        Retrieves the body text of result pages for a question through its query variants.
+
+        Parameters:
+            query (str): The question.
+            num_pages (int): Maximum number of search rounds (result pages per variant).
+            verbose (bool): If True, prints additional information.
+            skip_websites (List[str], optional): List of website domains to skip.
+            used_number_of_links (int, optional): Desired number of successfully fetched links.
+
+        Returns:
+            List[Tuple[str, str]]: (link, body text) pairs for the used links, in merged ranking order.
+        """
+        if skip_websites is None:
+            skip_websites = []
+        if used_number_of_links is None:
+            used_number_of_links = 3  # Default desired number of used links
+
+        metrics = get_metrics()
+        # The question itself is searched while the variants are being written
+        started = {query: self.planner.executor.submit(self.search_links, query, 0)}
+        queries = self.planner.variants(query, verbose=verbose)
+        pages = []
+        seen = set()
+        for page in range(max(num_pages, 1)):
+            results = self.planner.search(self, queries, page, verbose=verbose, started=started if page == 0 else None)
+            metrics.inc("search_planner_rounds_total")
+            links = merge_links(results, seen)
+            metrics.inc("search_planner_links_total", len(links), result="unique")
+            metrics.inc("search_planner_links_total", sum(len(result) for result in results) - len(links), result="duplicate")
+            if not links:
+                if verbose:
+                    print("No more search results available.")
+                break
+
+            candidates = self.filter_links(links, skip_websites, verbose=verbose)
+            pages.extend(self.fetch_pages(candidates, used_number_of_links - len(pages), verbose=verbose))
+            if len(pages) >= used_number_of_links:
+                break
+
+        if len(pages) < used_number_of_links:
+            if verbose:
+                print(f"Could only retrieve {len(pages)} out of {used_number_of_links} desired links.")
+        return pages
@@ -1,32 +1,99 @@
 from .tools import Tools
-import requests
-from bs4 import BeautifulSoup
-from serpapi import GoogleSearch
 from typing import Tuple, List, Optional
-from urllib.parse import urlparse
+from .fetcher import PageFetcher
+from .search_cache import SearchCache
+from .rate_limiter import RateLimiterRegistry
+
+# SerpAPI reports an empty result page as an error
+NO_RESULTS_ERROR = "hasn't returned any results"
+
+class SerpAPIError(Exception):
+    def __init__(self, message: str):
+        """
+        Error reported in the body of a SerpAPI response, which GoogleSearch returns instead of raising.
+        Quota and rate-limit errors carry status_code 429, so the rate limiter retries them.
+        """
+        super().__init__(message)
+        lowered = message.lower()
+        throttled = "run out of searches" in lowered or "rate limit" in lowered or "too many" in lowered
+        self.status_code = 429 if throttled else None
 
 class SerpTool(Tools):
-    def __init__(self, name: str, api_key: str):
+    def __init__(
+        self,
+        name: str,
+        api_key: str,
+        fetcher: Optional[PageFetcher] = None,
+        search_cache: Optional[SearchCache] = None,
+        rate_limiters: Optional[RateLimiterRegistry] = None,
+        prefetch: Optional[int] = 1
+    ):
         """
         Initializes the SerpTool with the given name and API key.
 
         Parameters:
             name (str): The name of the tool.
             api_key (str): The API key for SerpAPI.
+            fetcher (PageFetcher, optional): Shared page fetcher. Defaults to the process-wide fetcher.
+            search_cache (SearchCache, optional): Cache of search API responses.
+            rate_limiters (RateLimiterRegistry, optional): Shared rate limiters; this tool uses its engine's entry.
+            prefetch (int, optional): Number of result pages requested ahead of the one being used;
+                None requests all num_pages at once, 0 one after another. Pages requested ahead
+                are usually paid for even when the links of earlier pages turn out to be enough.
         """
-        super().__init__(name)
+        super().__init__(name, fetcher, search_cache, rate_limiters)
         self.api_key = api_key
+        self.prefetch = prefetch
+
+    def search(self, query: str, start: int = 0, num: int = 10) -> dict:
+        """
+        Requests one page of Google results from SerpAPI, using the search cache if one is set.
+
+        Parameters:
+            query (str): The search query.
+            start (int): Offset of the first result.
+            num (int): Number of results per page.
+
+        Returns:
+            dict: The SerpAPI response.
+        """
+        def request():
+            from serpapi import GoogleSearch
 
-    def get_context(
+            # Set up parameters for SerpAPI
+            params = {
+                "engine": "google",
+                "q": query,
+                "api_key": self.api_key,
+                "start": start,
+                "num": num
+            }
+            response = GoogleSearch(params).get_dict()
+            # Errors come back in the body; raise them before the rate limiter and the cache see them
+            error = response.get("error")
+            if error and NO_RESULTS_ERROR not in error:
+                raise SerpAPIError(error)
+            return response
+
+        return self.cached_search("serpapi", query, start, num, request)
+
+    def search_links(self, query: str, page: int = 0, results_per_page: int = 10) -> List[str]:
+        """
+        Returns the result links of one page of SerpAPI results.
+        """
+        results = self.search(query, page * results_per_page, results_per_page)
+        return [res.get('link') for res in results.get("organic_results", [])]
+
+    def get_pages(
         self,
         query: str,
         num_pages: int = 1,
         verbose: bool = False,
         skip_websites: Optional[List[str]] = None,
         used_number_of_links: Optional[int] = None
-    ) -> Tuple[str, List[str]]:
+    ) -> List[Tuple[str, str]]:
         """
-        Retrieves context and links for a given query using SerpAPI.
+        Retrieves the body text of result pages for a given query using SerpAPI.
 
         Parameters:
             query (str): The search query.
@@ -36,91 +103,19 @@ class SerpTool(Tools):
             used_number_of_links (int, optional): Desired number of successfully fetched links.
 
         Returns:
-            Tuple[str, List[str]]: A tuple containing the context string and a list of used links.
+            List[Tuple[str, str]]: (link, body text) pairs for the used links, in ranking order.
         """
         if skip_websites is None:
             skip_websites = []
         if used_number_of_links is None:
             used_number_of_links = 3  # Default desired number of used links
 
-        # SerpAPI supports up to 100 results per page
-        results_per_page = 10
-
-        used_links = []
-        context = ""
-        page = 0
-        total_pages_retrieved = 0
-
-        while (
-            len(used_links) < used_number_of_links and
-            total_pages_retrieved < num_pages
-        ):
-            # Set up parameters for SerpAPI
-            params = {
-                "engine": "google",
-                "q": query,
-                "api_key": self.api_key,
-                "start": page * results_per_page,
-                "num": results_per_page
-            }
-
-            try:
-                # Perform search using SerpAPI
-                search = GoogleSearch(params)
-                results = search.get_dict()
-            except Exception as e:
-                if verbose:
-                    print(f"SerpAPI request failed: {e}")
-                break  # Exit if API request fails
-
-            # Extract organic results
-            organic_results = results.get("organic_results", [])
-            if not organic_results:
-                if verbose:
-                    print("No more search results available.")
-                break
-
-            if verbose:
-                print(f"Retrieved links from page {page + 1}:")
-
-            # Process links
-            for res in organic_results:
-                if len(used_links) >= used_number_of_links:
-                    break
-
-                link = res.get('link')
-                if verbose:
-                    print(link)
-
-                # Skip links from skipped websites
-                parsed_url = urlparse(link)
-                domain = parsed_url.netloc
-
-                if any(skip_domain in domain for skip_domain in skip_websites):
-                    if verbose:
-                        print(f"Skipping link from skipped website: {link}")
-                    continue
-
-                try:
-                    resp = requests.get(link, timeout=30)
-                    resp.raise_for_status()
-                    bs = BeautifulSoup(resp.text, 'html.parser')
-                    body = bs.find('body')
-                    if body:
-                        context += body.get_text(separator=' ', strip=True)
-                        context += "\n"
-                        used_links.append(link)
-                except requests.RequestException as e:
-                    if verbose:
-                        print(f"Failed to fetch {link}: {e}")
-                    # Do not count this link as a used link
-                    continue
-
-            total_pages_retrieved += 1
-            page += 1  # Move to the next page of results
-
-        if len(used_links) < used_number_of_links:
-            if verbose:
-                print(f"Could only retrieve {len(used_links)} out of {used_number_of_links} desired links.")
-
-        return context, used_links
+        return self.paginate_pages(
+            query,
+            num_pages,
+            skip_websites,
+            used_number_of_links,
+            prefetch=self.prefetch,
+            verbose=verbose,
+            engine="serpapi"
+        )
@@ -1,31 +1,176 @@
 from .tools import Tools
+import threading
 import requests
-from bs4 import BeautifulSoup
-from typing import Tuple, List, Optional
-from urllib.parse import urlparse
+from concurrent.futures import Future
+from typing import Callable, Tuple, List, Optional
+from .fetcher import PageFetcher
+from .search_cache import SearchCache
+from .rate_limiter import RateLimiterRegistry
+from .metrics import get_metrics
+
+# Buckets for the number of queries per batched Serper request
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+class SerperBatcher:
+    def __init__(self, send: Callable[[List[dict]], List[dict]], max_batch_size: int = 100, flush_interval: float = 0.05):
+        """
+        Coalesces the Serper queries of concurrent callers into batched requests: Serper accepts
+        a list of query payloads in one POST and answers with the list of their responses.
+
+        A batch is sent once max_batch_size queries are waiting, by the thread adding the last
+        one, or flush_interval seconds after its first query, by a timer thread.
+
+        Parameters:
+            send (Callable[[List[dict]], List[dict]]): Sends one batched request and returns the responses in order.
+            max_batch_size (int): Number of queries that triggers a request.
+            flush_interval (float): Maximum number of seconds a query waits for others to join its batch.
+        """
+        self.send = send
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[dict, Future]] = []
+        self._generation = 0
+
+    def submit(self, payload: dict) -> Future:
+        """
+        Queues a query payload for the next batch.
+
+        Returns:
+            Future: Resolves to the query's search response.
+        """
+        future = Future()
+        batch = None
+        with self._lock:
+            self._pending.append((payload, future))
+            if len(self._pending) >= self.max_batch_size:
+                batch = self._take()
+            elif len(self._pending) == 1:
+                timer = threading.Timer(self.flush_interval, self._flush, args=(self._generation,))
+                timer.daemon = True
+                timer.start()
+        if batch:
+            self._send_batch(batch)
+        return future
+
+    def _take(self) -> List[Tuple[dict, Future]]:
+        # Called with the lock held; a new generation makes the timer of the taken batch a no-op
+        batch, self._pending = self._pending, []
+        self._generation += 1
+        return batch
+
+    def _flush(self, generation: int):
+        with self._lock:
+            batch = self._take() if generation == self._generation else None
+        if batch:
+            self._send_batch(batch)
+
+    def _send_batch(self, batch: List[Tuple[dict, Future]]):
+        get_metrics().observe("serper_batch_size", len(batch), buckets=BATCH_SIZE_BUCKETS)
+        try:
+            responses = self.send([payload for payload, _ in batch])
+            if len(responses) != len(batch):
+                raise requests.RequestException(f"Serper returned {len(responses)} responses for {len(batch)} queries.")
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), response in zip(batch, responses):
+            future.set_result(response)
 
 class SerperTool(Tools):
-    def __init__(self, name: str, api_key: str):
+    def __init__(
+        self,
+        name: str,
+        api_key: str,
+        fetcher: Optional[PageFetcher] = None,
+        search_cache: Optional[SearchCache] = None,
+        rate_limiters: Optional[RateLimiterRegistry] = None,
+        endpoint: str = "https://google.serper.dev/search",
+        prefetch: Optional[int] = 1,
+        batch_size: Optional[int] = None,
+        batch_interval: float = 0.05
+    ):
         """
         Initializes the SerperTool with the given name and API key.
 
         Parameters:
             name (str): The name of the tool.
             api_key (str): The API key for Serper API.
+            fetcher (PageFetcher, optional): Shared page fetcher. Defaults to the process-wide fetcher.
+            search_cache (SearchCache, optional): Cache of search API responses.
+            rate_limiters (RateLimiterRegistry, optional): Shared rate limiters; this tool uses its engine's entry.
+            endpoint (str): URL of the Serper search endpoint.
+            prefetch (int, optional): Number of result pages requested ahead of the one being used;
+                None requests all num_pages at once, 0 one after another. Pages requested ahead
+                are usually paid for even when the links of earlier pages turn out to be enough.
+            batch_size (int, optional): If set, the queries of concurrent questions are sent together,
+                up to batch_size per request (see SerperBatcher).
+            batch_interval (float): Maximum number of seconds a query waits for a batch to fill.
         """
-        super().__init__(name)
+        super().__init__(name, fetcher, search_cache, rate_limiters)
         self.api_key = api_key
+        self.endpoint = endpoint
+        self.prefetch = prefetch
+        self.batcher = None
+        if batch_size is not None:
+            self.batcher = SerperBatcher(self.post, max_batch_size=batch_size, flush_interval=batch_interval)
+
+    def post(self, payload):
+        """
+        Sends a payload (one query, or a list of queries) to the Serper endpoint over the
+        fetcher's pooled session and returns the decoded response.
+        """
+        response = self.fetcher.session.post(
+            self.endpoint,
+            headers={
+                'X-API-KEY': self.api_key,
+                'Content-Type': 'application/json'
+            },
+            json=payload,
+            timeout=self.fetcher.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def search(self, query: str, start: int = 0, num: int = 10) -> dict:
+        """
+        Requests one page of search results from Serper API, using the search cache if one is set.
+
+        Parameters:
+            query (str): The search query.
+            start (int): Offset of the first result.
+            num (int): Number of results per page.
+
+        Returns:
+            dict: The JSON response of Serper API.
+        """
+        payload = {"q": query, "num": num, "start": start}
+
+        def request():
+            if self.batcher is not None:
+                return self.batcher.submit(payload).result()
+            return self.post(payload)
+
+        return self.cached_search("serper", query, start, num, request)
+
+    def search_links(self, query: str, page: int = 0, results_per_page: int = 10) -> List[str]:
+        """
+        Returns the result links of one page of Serper API results.
+        """
+        results = self.search(query, page * results_per_page, results_per_page)
+        return [res.get('link') for res in results.get("organic", [])]
 
-    def get_context(
+    def get_pages(
         self,
         query: str,
         num_pages: int = 1,
         verbose: bool = False,
         skip_websites: Optional[List[str]] = None,
         used_number_of_links: Optional[int] = None
-    ) -> Tuple[str, List[str]]:
+    ) -> List[Tuple[str, str]]:
         """
-        Retrieves context and links for a given query using Serper API.
+        Retrieves the body text of result pages for a given query using Serper API.
 
         Parameters:
             query (str): The search query.
@@ -35,95 +180,20 @@ class SerperTool(Tools):
             used_number_of_links (int, optional): Desired number of successfully fetched links.
 
         Returns:
-            Tuple[str, List[str]]: A tuple containing the context string and a list of used links.
+            List[Tuple[str, str]]: (link, body text) pairs for the used links, in ranking order.
         """
         if skip_websites is None:
             skip_websites = []
         if used_number_of_links is None:
             used_number_of_links = 3  # Default desired number of used links
 
-        url = "https://google.serper.dev/search"
-        headers = {
-            'X-API-KEY': self.api_key,
-            'Content-Type': 'application/json'
-        }
-
-        used_links = []
-        context = ""
-        total_pages_retrieved = 0
-        page = 0  # Pagination counter
-        max_attempts = num_pages  # Number of pages to retrieve
-
-        results_per_page = 10  # Number of results per page (Serper API default)
-
-        while (
-            len(used_links) < used_number_of_links and
-            total_pages_retrieved < num_pages and
-            page < max_attempts
-        ):
-            payload = {
-                "q": query,
-                "num": results_per_page,
-                "start": page * results_per_page
-            }
-
-            try:
-                response = requests.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                results = response.json()
-            except requests.RequestException as e:
-                if verbose:
-                    print(f"Serper API request failed: {e}")
-                break  # Exit if API request fails
-
-            # Extract organic search results
-            organic_results = results.get("organic", [])
-            if not organic_results:
-                if verbose:
-                    print("No more search results available.")
-                break
-
-            if verbose:
-                print(f"Retrieved links from page {page + 1}:")
-
-            # Process links
-            for res in organic_results:
-                if len(used_links) >= used_number_of_links:
-                    break
-
-                link = res.get('link')
-                if verbose:
-                    print(link)
-
-                # Skip links from skipped websites
-                parsed_url = urlparse(link)
-                domain = parsed_url.netloc
-
-                if any(skip_domain in domain for skip_domain in skip_websites):
-                    if verbose:
-                        print(f"Skipping link from skipped website: {link}")
-                    continue
-
-                try:
-                    resp = requests.get(link, timeout=30)
-                    resp.raise_for_status()
-                    bs = BeautifulSoup(resp.text, 'html.parser')
-                    body = bs.find('body')
-                    if body:
-                        context += body.get_text(separator=' ', strip=True)
-                        context += "\n"
-                        used_links.append(link)
-                except requests.RequestException as e:
-                    if verbose:
-                        print(f"Failed to fetch {link}: {e}")
-                    # Do not count this link as a used link
-                    continue
-
-            total_pages_retrieved += 1
-            page += 1  # Move to the next page of results
-
-        if len(used_links) < used_number_of_links:
-            if verbose:
-                print(f"Could only retrieve {len(used_links)} out of {used_number_of_links} desired links.")
-
-        return context, used_links
+        return self.paginate_pages(
+            query,
+            num_pages,
+            skip_websites,
+            used_number_of_links,
+            prefetch=self.prefetch,
+            verbose=verbose,
+            engine="serper",
+            errors=(requests.RequestException,)
+        )
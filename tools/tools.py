@@ -1,27 +1,293 @@
-from typing import Tuple, List
+import asyncio
+import functools
+import threading
+from typing import Callable, Dict, Tuple, List, Optional, Type, TypeVar
 from abc import ABC, abstractmethod
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from urllib.parse import urlparse
+from .fetcher import PageFetcher, get_default_fetcher
+from .search_cache import SearchCache
+from .rate_limiter import RateLimiterRegistry
+from .metrics import get_metrics
+
+T = TypeVar("T")
+
+_search_executor = None
+_search_executor_lock = threading.Lock()
+
+def get_search_executor() -> ThreadPoolExecutor:
+    """
+    Returns the process-wide thread pool on which search result pages are requested ahead.
+    """
+    global _search_executor
+    if _search_executor is None:
+        with _search_executor_lock:
+            if _search_executor is None:
+                _search_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="search")
+    return _search_executor
 
 class Tools(ABC):
-    def __init__(self, name: str):
+    def __init__(
+        self,
+        name: str,
+        fetcher: Optional[PageFetcher] = None,
+        search_cache: Optional[SearchCache] = None,
+        rate_limiters: Optional[RateLimiterRegistry] = None
+    ):
         """
         Initializes the tool with a name.
 
         Parameters:
             name (str): The name of the tool.
+            fetcher (PageFetcher, optional): Page fetcher to use. Defaults to the process-wide shared fetcher.
+            search_cache (SearchCache, optional): Cache of search API responses. Disabled if None.
+            rate_limiters (RateLimiterRegistry, optional): Rate limiters keyed by search engine name.
+                If None, search requests are sent without client-side limits or retries.
         """
         self.name = name
+        self.fetcher = fetcher or get_default_fetcher()
+        self.search_cache = search_cache
+        self.rate_limiters = rate_limiters
 
     @abstractmethod
-    def get_context(self, query: str, num: int = 3, verbose: bool = False) -> Tuple[str, List[str]]:
+    def get_pages(
+        self,
+        query: str,
+        num_pages: int = 1,
+        verbose: bool = False,
+        skip_websites: Optional[List[str]] = None,
+        used_number_of_links: Optional[int] = None
+    ) -> List[Tuple[str, str]]:
         """
-        Abstract method to get context for a query.
+        Abstract method to retrieve the body text of result pages for a query.
 
         Parameters:
             query (str): The search query.
-            num (int): Number of results to retrieve.
+            num_pages (int): Number of result pages to retrieve from the search backend.
             verbose (bool): If True, prints additional information.
+            skip_websites (List[str], optional): List of website domains to skip.
+            used_number_of_links (int, optional): Desired number of successfully fetched links.
 
         Returns:
-            Tuple[str, List[str]]: Context string and list of links.
+            List[Tuple[str, str]]: (link, body text) pairs in ranking order.
         """
         pass
+
+    def search_links(self, query: str, page: int = 0, results_per_page: int = 10) -> List[str]:
+        """
+        Returns the result links of one page of search results, for tools that can be driven by
+        a SearchPlanner. Tools without separately addressable result pages do not implement it.
+
+        Parameters:
+            query (str): The search query.
+            page (int): Index of the result page, starting at 0.
+            results_per_page (int): Number of results per page.
+
+        Returns:
+            List[str]: The result links in ranking order.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support planned searches.")
+
+    def paginate_pages(
+        self,
+        query: str,
+        num_pages: int,
+        skip_websites: List[str],
+        used_number_of_links: int,
+        prefetch: Optional[int] = 1,
+        verbose: bool = False,
+        engine: str = "search",
+        errors: Tuple[Type[BaseException], ...] = (Exception,)
+    ) -> List[Tuple[str, str]]:
+        """
+        Walks the result pages of a query with search_links() and fetches their links until
+        used_number_of_links pages have succeeded. Result pages are requested ahead of time
+        on the shared search thread pool, so the next pages are already in hand while the
+        links of the current one are being fetched. Pages that turn out not to be needed are
+        cancelled if they have not been sent yet, but the pool rarely leaves them waiting, so
+        every page requested ahead is usually a paid search; keep prefetch small.
+
+        Parameters:
+            query (str): The search query.
+            num_pages (int): Maximum number of result pages.
+            skip_websites (List[str]): List of website domains to skip.
+            used_number_of_links (int): Desired number of successfully fetched links.
+            prefetch (int, optional): Number of result pages requested ahead of the one being used.
+                None requests all num_pages at once; 0 requests them strictly one after another.
+            verbose (bool): If True, prints additional information.
+            engine (str): Name of the search backend, as in the search cache and rate limiters.
+            errors (Tuple[type, ...]): Exceptions of a failed search request, which end the walk.
+
+        Returns:
+            List[Tuple[str, str]]: (link, body text) pairs for the used links, in ranking order.
+        """
+        window = num_pages if prefetch is None else prefetch + 1
+        executor = get_search_executor()
+        metrics = get_metrics()
+        requested: Dict[int, Future] = {}
+        pages = []
+        page = 0
+        try:
+            while len(pages) < used_number_of_links and page < num_pages:
+                for ahead in range(page, min(page + window, num_pages)):
+                    if ahead not in requested:
+                        requested[ahead] = executor.submit(self.search_links, query, ahead)
+                try:
+                    links = requested.pop(page).result()
+                except errors as e:
+                    if verbose:
+                        print(f"Search request to {engine} failed: {e}")
+                    break  # Exit if API request fails
+                metrics.inc("search_result_pages_total", engine=engine, result="used")
+
+                if not links:
+                    if verbose:
+                        print("No more search results available.")
+                    break
+
+                if verbose:
+                    print(f"Retrieved links from page {page + 1}:")
+
+                # Skip links from skipped websites, then fetch the rest concurrently
+                candidates = self.filter_links(links, skip_websites, verbose=verbose)
+                pages.extend(self.fetch_pages(candidates, used_number_of_links - len(pages), verbose=verbose))
+                page += 1
+        finally:
+            # Result pages requested ahead but not needed
+            for future in requested.values():
+                metrics.inc("search_result_pages_total", engine=engine, result="cancelled" if future.cancel() else "unused")
+
+        if len(pages) < used_number_of_links:
+            if verbose:
+                print(f"Could only retrieve {len(pages)} out of {used_number_of_links} desired links.")
+        return pages
+
+    def get_context(
+        self,
+        query: str,
+        num_pages: int = 1,
+        verbose: bool = False,
+        skip_websites: Optional[List[str]] = None,
+        used_number_of_links: Optional[int] = None
+    ) -> Tuple[str, List[str]]:
+        """
+        Retrieves context and links for a query by concatenating the texts returned by get_pages().
+
+        Returns:
+            Tuple[str, List[str]]: Context string and list of links.
+        """
+        pages = self.get_pages(
+            query=query,
+            num_pages=num_pages,
+            verbose=verbose,
+            skip_websites=skip_websites,
+            used_number_of_links=used_number_of_links
+        )
+        context = "".join(f"{text}\n" for _, text in pages)
+        return context, [link for link, _ in pages]
+
+    def cached_search(
+        self,
+        engine: str,
+        query: str,
+        start: int,
+        num: int,
+        request: Callable[[], dict]
+    ) -> dict:
+        """
+        Returns a search response from the search cache, or calls `request` (through the engine's
+        rate limiter, if any) and caches its result. Failed requests raise and are never cached, nor
+        are responses that are not a dict or that carry an "error" key.
+
+        Parameters:
+            engine (str): Name of the search backend, part of the cache key.
+            query (str): The search query.
+            start (int): Offset of the first result.
+            num (int): Number of results per page.
+            request (Callable[[], dict]): Performs the actual API call.
+
+        Returns:
+            dict: The search response.
+        """
+        def timed_request():
+            with get_metrics().timer("search", engine=engine):
+                return self.rate_limited(engine, request)
+
+        if self.search_cache is None:
+            return timed_request()
+        response = self.search_cache.get(engine, query, start, num)
+        get_metrics().inc("search_cache_requests_total", engine=engine, result="miss" if response is None else "hit")
+        if response is None:
+            response = timed_request()
+            if isinstance(response, dict) and "error" not in response:
+                self.search_cache.put(engine, query, start, num, response)
+        return response
+
+    def rate_limited(self, engine: str, request: Callable[[], T]) -> T:
+        """
+        Calls `request` under the engine's rate limiter, retrying throttled and transient
+        failures with backoff. Without rate limiters the request is called once.
+        """
+        if self.rate_limiters is None:
+            return request()
+        return self.rate_limiters.get(engine).call(request)
+
+    def filter_links(self, links: List[str], skip_websites: List[str], verbose: bool = False) -> List[str]:
+        """
+        Drops empty links and links whose domain matches one of the skipped websites.
+
+        Parameters:
+            links (List[str]): Candidate links.
+            skip_websites (List[str]): List of website domains to skip.
+            verbose (bool): If True, prints the links and the skipped ones.
+
+        Returns:
+            List[str]: The links that should be fetched.
+        """
+        candidates = []
+        for link in links:
+            if not link:
+                continue
+            if verbose:
+                print(link)
+
+            domain = urlparse(link).netloc
+            if any(skip_domain in domain for skip_domain in skip_websites):
+                if verbose:
+                    print(f"Skipping link from skipped website: {link}")
+                continue
+            candidates.append(link)
+        return candidates
+
+    def fetch_pages(self, links: List[str], needed: int, verbose: bool = False) -> List[Tuple[str, str]]:
+        """
+        Fetches up to `needed` pages from the candidate links concurrently with the tool's fetcher.
+
+        Returns:
+            List[Tuple[str, str]]: (link, body text) pairs in ranking order.
+        """
+        return self.fetcher.fetch(links, needed, verbose=verbose)
+
+    async def aget_context(self, executor: Optional[Executor] = None, **kwargs) -> Tuple[str, List[str]]:
+        """
+        Async wrapper around get_context().
+
+        The search backends are blocking, so the call runs on the given executor
+        (or the event loop's default executor) without blocking the loop.
+
+        Parameters:
+            executor (Executor, optional): Executor to run the blocking search and page fetches on.
+            **kwargs: Arguments passed to get_context.
+
+        Returns:
+            Tuple[str, List[str]]: Context string and list of links.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(self.get_context, **kwargs))
+
+    async def aget_pages(self, executor: Optional[Executor] = None, **kwargs) -> List[Tuple[str, str]]:
+        """
+        Async wrapper around get_pages(), run on the given executor like aget_context().
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(self.get_pages, **kwargs))
@@ -0,0 +1,109 @@
+from functools import lru_cache
+from typing import List, Tuple
+from tools.rate_limiter import CHARS_PER_TOKEN
+
+class TokenCounter:
+    def __init__(self, model: str):
+        """
+        Counts and truncates tokens for a model, using tiktoken when it is installed and its
+        encoding can be loaded (it is downloaded on first use), and a characters-per-token
+        estimate otherwise.
+
+        Parameters:
+            model (str): The name of the model whose tokenizer should be used.
+        """
+        self.model = model
+        try:
+            import tiktoken
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            # Not installed, or the BPE file could not be downloaded (offline host, proxy)
+            if not isinstance(e, ImportError):
+                print(f"\033[33mCould not load the tiktoken encoding for {model}, estimating tokens from characters: {e}\033[0m")
+            self.encoding = None
+
+    def count(self, text: str) -> int:
+        """
+        Returns the number of tokens in the text.
+        """
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return int(len(text) / CHARS_PER_TOKEN) + 1
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Returns the longest prefix of the text that fits in max_tokens.
+        """
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            if len(tokens) <= max_tokens:
+                return text
+            return self.encoding.decode(tokens[:max_tokens])
+        return text[:int(max_tokens * CHARS_PER_TOKEN)]
+
+@lru_cache(maxsize=None)
+def get_token_counter(model: str) -> TokenCounter:
+    """
+    Returns the shared TokenCounter for a model.
+    """
+    return TokenCounter(model)
+
+def allocate_budget(lengths: List[int], max_tokens: int) -> List[int]:
+    """
+    Splits a token budget fairly across pages.
+
+    Every page gets an equal share; pages shorter than their share give the
+    unused tokens back to the longer pages.
+
+    Parameters:
+        lengths (List[int]): Token count of each page.
+        max_tokens (int): The total token budget.
+
+    Returns:
+        List[int]: Number of tokens allotted to each page, in the same order.
+    """
+    allotted = [0] * len(lengths)
+    remaining = max_tokens
+    order = sorted(range(len(lengths)), key=lambda idx: lengths[idx])
+    for position, idx in enumerate(order):
+        share = remaining // (len(order) - position)
+        allotted[idx] = min(lengths[idx], share)
+        remaining -= allotted[idx]
+    return allotted
+
+def build_context(
+    pages: List[Tuple[str, str]],
+    model: str,
+    max_tokens: int
+) -> Tuple[str, List[str]]:
+    """
+    Assembles the responder context from fetched pages within a token budget.
+
+    Parameters:
+        pages (List[Tuple[str, str]]): (link, body text) pairs in ranking order.
+        model (str): The responder model, used to count tokens.
+        max_tokens (int): Maximum number of context tokens.
+
+    Returns:
+        Tuple[str, List[str]]: The context string and the links of the pages it contains.
+    """
+    counter = get_token_counter(model)
+    lengths = [counter.count(text) for _, text in pages]
+    allotted = allocate_budget(lengths, max_tokens)
+
+    context = ""
+    links = []
+    for (link, text), length, budget in zip(pages, lengths, allotted):
+        if budget <= 0:
+            continue
+        if budget < length:
+            text = counter.truncate(text, budget)
+        context += text
+        context += "\n"
+        links.append(link)
+    return context, links
@@ -0,0 +1,263 @@
+import json
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from tools.metrics import get_metrics
+from .Index import LocalEmbedder
+from .Text import normalize_text, tokenize
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+
+def dedup_key(question: str) -> str:
+    """
+    Returns the normalized form used for exact-after-normalization matching: Persian-normalized
+    text with punctuation dropped, so "سلام؟" and "سلام ?" collide.
+    """
+    return " ".join(tokenize(question))
+
+def shingles(text: str, size: int = 4) -> List[str]:
+    """
+    Returns the character n-grams of normalized text. Character shingles are robust to the
+    spacing and affix variations of Persian (ZWNJ vs space, attached suffixes).
+    """
+    text = normalize_text(text)
+    if len(text) <= size:
+        return [text]
+    return [text[idx:idx + size] for idx in range(len(text) - size + 1)]
+
+class QuestionDeduplicator:
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle_size: int = 4,
+        embedder: Optional[LocalEmbedder] = None,
+        embedding_threshold: float = 0.92,
+        seed: int = 1
+    ):
+        """
+        Drops exact, normalized and near-duplicate questions.
+
+        Near duplicates are found with MinHash signatures over character shingles and
+        banded LSH: questions sharing a band are candidates, and a candidate is a duplicate
+        if the signatures estimate a Jaccard similarity of at least `threshold`. If an
+        embedder is given, questions that pass MinHash are also compared by cosine
+        similarity against every kept question.
+
+        Every kept question blocks its duplicates for the rest of the run, but only answered
+        questions (see mark_answered()) and those loaded from an earlier index are saved, so
+        questions that failed or were still in flight are asked again by later runs.
+
+        Parameters:
+            threshold (float): Minimum estimated Jaccard similarity of near duplicates.
+            num_perm (int): Number of MinHash permutations per signature.
+            bands (int): Number of LSH bands; num_perm must be divisible by it.
+            shingle_size (int): Characters per shingle.
+            embedder (LocalEmbedder, optional): Local embedding model for the semantic check.
+            embedding_threshold (float): Minimum cosine similarity of semantic duplicates.
+            seed (int): Seed of the MinHash permutations; an index only matches signatures built with the same seed.
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands.")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.embedder = embedder
+        self.embedding_threshold = embedding_threshold
+        self.seed = seed
+
+        generator = np.random.RandomState(seed)
+        self._a = generator.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = generator.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+        self._lock = threading.Lock()
+        self._exact = set()
+        self._normalized = set()
+        self._signatures: List[np.ndarray] = []
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._embeddings = None
+        self._embedding_count = 0
+        # Kept questions not answered yet: question -> (normalized key, signature index, embedding row)
+        self._pending: Dict[str, Tuple[str, int, Optional[int]]] = {}
+        # What save() writes: loaded and answered questions
+        self._saved_exact = set()
+        self._saved_normalized = set()
+        self._saved_signatures: List[int] = []
+        self._saved_embeddings: List[int] = []
+        self.dropped = {"exact": 0, "normalized": 0, "near": 0, "semantic": 0}
+
+    def __len__(self) -> int:
+        return len(self._normalized)
+
+    def signature(self, text: str) -> np.ndarray:
+        """
+        Returns the MinHash signature of a text as num_perm 32-bit values.
+        """
+        hashes = np.array(
+            [zlib.crc32(shingle.encode("utf-8")) for shingle in set(shingles(text, self.shingle_size))],
+            dtype=np.uint64
+        )
+        permuted = ((np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME) & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def _near_duplicate(self, signature: np.ndarray) -> bool:
+        checked = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            for idx in self._buckets[band].get(key, ()):
+                if idx in checked:
+                    continue
+                checked.add(idx)
+                if np.mean(self._signatures[idx] == signature) >= self.threshold:
+                    return True
+        return False
+
+    def _semantic_duplicate(self, embedding: np.ndarray) -> bool:
+        if not self._embedding_count:
+            return False
+        similarities = self._embeddings[:self._embedding_count] @ embedding
+        return float(similarities.max()) >= self.embedding_threshold
+
+    def _add_signature(self, signature: np.ndarray) -> int:
+        idx = len(self._signatures)
+        self._signatures.append(signature)
+        for band, key in enumerate(self._band_keys(signature)):
+            self._buckets[band].setdefault(key, []).append(idx)
+        return idx
+
+    def _add_embedding(self, embedding: np.ndarray) -> int:
+        if self._embeddings is None:
+            self._embeddings = np.zeros((1024, embedding.shape[0]), dtype=np.float32)
+        elif self._embedding_count == len(self._embeddings):
+            self._embeddings = np.concatenate([self._embeddings, np.zeros_like(self._embeddings)])
+        self._embeddings[self._embedding_count] = embedding
+        self._embedding_count += 1
+        return self._embedding_count - 1
+
+    def check(self, question: str, embedding: Optional[np.ndarray] = None) -> Optional[str]:
+        """
+        Checks a question against the index and adds it if it is new.
+
+        Parameters:
+            question (str): The question.
+            embedding (np.ndarray, optional): Its normalized embedding, for the semantic check.
+
+        Returns:
+            str or None: The kind of duplicate ("exact", "normalized", "near", "semantic"), or None if the question is new.
+        """
+        key = dedup_key(question)
+        signature = self.signature(question)
+        with self._lock:
+            if question in self._exact:
+                reason = "exact"
+            elif key in self._normalized:
+                reason = "normalized"
+            elif self._near_duplicate(signature):
+                reason = "near"
+            elif embedding is not None and self._semantic_duplicate(embedding):
+                reason = "semantic"
+            else:
+                self._exact.add(question)
+                self._normalized.add(key)
+                self._pending[question] = (
+                    key,
+                    self._add_signature(signature),
+                    self._add_embedding(embedding) if embedding is not None else None
+                )
+                return None
+            self.dropped[reason] += 1
+        get_metrics().inc("questions_deduplicated_total", reason=reason)
+        return reason
+
+    def filter(self, questions: List[str], verbose: bool = False) -> List[str]:
+        """
+        Returns the questions that are not duplicates of each other or of earlier questions,
+        adding them to the index.
+        """
+        embeddings = self.embedder.encode(questions) if self.embedder is not None and questions else None
+        kept = []
+        for idx, question in enumerate(questions):
+            reason = self.check(question, embeddings[idx] if embeddings is not None else None)
+            if reason is None:
+                kept.append(question)
+            elif verbose:
+                print(f"\033[33mSkipping {reason} duplicate question:\033[0m {question}")
+        return kept
+
+    def mark_answered(self, question: str):
+        """
+        Marks a kept question as answered, so that save() persists it.
+        """
+        with self._lock:
+            entry = self._pending.pop(question, None)
+            if entry is None:
+                return
+            key, signature_idx, embedding_row = entry
+            self._saved_exact.add(question)
+            self._saved_normalized.add(key)
+            self._saved_signatures.append(signature_idx)
+            if embedding_row is not None:
+                self._saved_embeddings.append(embedding_row)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"questions": len(self._normalized), "dropped": dict(self.dropped)}
+
+    def save(self, path: str):
+        """
+        Saves the index to a .npz file so later runs skip questions that were already answered.
+        Kept questions that were never marked answered are left out.
+        """
+        with self._lock:
+            config = {
+                "threshold": self.threshold, "num_perm": self.num_perm, "bands": self.bands,
+                "shingle_size": self.shingle_size, "embedding_threshold": self.embedding_threshold, "seed": self.seed
+            }
+            arrays = {
+                "config": np.array(json.dumps(config)),
+                "exact": np.array(sorted(self._saved_exact), dtype=object),
+                "normalized": np.array(sorted(self._saved_normalized), dtype=object),
+                "signatures": np.array(
+                    [self._signatures[idx] for idx in self._saved_signatures], dtype=np.uint32
+                ).reshape(-1, self.num_perm)
+            }
+            if self._saved_embeddings:
+                arrays["embeddings"] = self._embeddings[self._saved_embeddings]
+        with open(path, "wb") as file:
+            np.savez_compressed(file, **arrays)
+
+    @classmethod
+    def load(cls, path: str, embedder: Optional[LocalEmbedder] = None, **overrides) -> "QuestionDeduplicator":
+        """
+        Loads an index saved with save(). The signature parameters (num_perm, bands,
+        shingle_size, seed) come from the file; overrides may change the thresholds.
+
+        Stored embeddings are kept, and saved again, even without an embedder, but the
+        semantic check only runs with one.
+        """
+        with np.load(path, allow_pickle=True) as data:
+            config = json.loads(str(data["config"]))
+            config.update({key: value for key, value in overrides.items() if key in ("threshold", "embedding_threshold")})
+            deduplicator = cls(embedder=embedder, **config)
+            deduplicator._exact = set(data["exact"].tolist())
+            deduplicator._normalized = set(data["normalized"].tolist())
+            deduplicator._saved_exact = set(deduplicator._exact)
+            deduplicator._saved_normalized = set(deduplicator._normalized)
+            for signature in data["signatures"]:
+                deduplicator._saved_signatures.append(deduplicator._add_signature(signature))
+            if "embeddings" in data.files:
+                if embedder is None:
+                    print(f"\033[33m{path} has question embeddings, but no embedding model is set: "
+                          f"the semantic duplicate check is off for this run.\033[0m")
+                for embedding in data["embeddings"]:
+                    deduplicator._saved_embeddings.append(deduplicator._add_embedding(embedding))
+        return deduplicator
@@ -0,0 +1,333 @@
+import csv
+import gzip
+import importlib.util
+import io
+import json
+import os
+import textwrap
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+EXPORT_FORMATS = ['.json', '.jsonl', '.csv', '.parquet', '.xlsx', '.txt']
+COMPRESSIONS = {'.gz': 'gzip', '.zst': 'zstd'}
+# Optional packages needed by some formats and compressions, imported only when used
+DEPENDENCIES = {'.parquet': 'pyarrow', '.xlsx': 'openpyxl', 'zstd': 'zstandard'}
+
+def split_export_path(path: str) -> Tuple[str, Optional[str]]:
+    """
+    Splits an output path into its format extension and compression.
+
+    Parameters:
+        path (str): Output path, e.g. "out.jsonl", "out.csv.gz" or "out.json.zst".
+
+    Returns:
+        Tuple[str, str or None]: The format extension (".jsonl") and "gzip", "zstd" or None.
+    """
+    root, extension = os.path.splitext(path.lower())
+    compression = COMPRESSIONS.get(extension)
+    if compression is not None:
+        extension = os.path.splitext(root)[1]
+    return extension, compression
+
+def missing_dependencies(path: str) -> List[str]:
+    """
+    Returns the optional packages that writing to the given path needs but are not installed,
+    so a run can fail before its work is done rather than at export time.
+    """
+    extension, compression = split_export_path(path)
+    needed = [DEPENDENCIES[key] for key in (extension, compression) if key in DEPENDENCIES]
+    return [name for name in needed if importlib.util.find_spec(name) is None]
+
+def open_text(path: str, compression: Optional[str] = None, encoding: str = 'utf-8'):
+    """
+    Opens a text file for writing, gzip- or zstd-compressed if requested.
+    """
+    if compression is None:
+        return open(path, 'w', encoding=encoding, newline='')
+    if compression == 'gzip':
+        return gzip.open(path, 'wt', encoding=encoding, newline='')
+    if compression == 'zstd':
+        import zstandard
+        return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(open(path, 'wb')), encoding=encoding, newline='')
+    raise ValueError(f"Unsupported compression: {compression}")
+
+def read_jsonl(path: str) -> Iterator[Dict]:
+    """
+    Yields the records of a JSON Lines file one at a time.
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+class RecordWriter:
+    def __init__(self, path: str, compression: Optional[str] = None, chunk_size: int = 1000):
+        """
+        Base class of the streaming exporters. Records are buffered and written a chunk at a
+        time, so memory stays bounded by chunk_size whatever the size of the dataset.
+
+        Parameters:
+            path (str): Output path.
+            compression (str, optional): "gzip" or "zstd" for the text formats.
+            chunk_size (int): Number of records buffered before each write.
+        """
+        self.path = path
+        self.compression = compression
+        self.chunk_size = chunk_size
+        self.count = 0
+        self._buffer: List[Dict] = []
+
+    def write(self, record: Dict):
+        self._buffer.append(record)
+        self.count += 1
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def write_many(self, records: Iterable[Dict]) -> int:
+        """
+        Writes every record of an iterable and returns the total number written so far.
+        """
+        for record in records:
+            self.write(record)
+        return self.count
+
+    def flush(self):
+        if self._buffer:
+            self._write_chunk(self._buffer)
+            self._buffer = []
+
+    def _write_chunk(self, records: List[Dict]):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class TextWriter(RecordWriter):
+    encoding = 'utf-8'
+
+    def __init__(self, path: str, compression: Optional[str] = None, chunk_size: int = 1000):
+        super().__init__(path, compression, chunk_size)
+        self._file = open_text(path, compression, self.encoding)
+
+    def _write_chunk(self, records: List[Dict]):
+        self._file.write("".join(self.format(record, self.count - len(records) + idx) for idx, record in enumerate(records)))
+
+    def format(self, record: Dict, index: int) -> str:
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+class JsonlWriter(TextWriter):
+    def format(self, record: Dict, index: int) -> str:
+        return json.dumps(record, ensure_ascii=False) + "\n"
+
+class JsonWriter(TextWriter):
+    """
+    Writes a JSON array of records, indented like pandas' to_json(orient="records", indent=4).
+    """
+    def __init__(self, path: str, compression: Optional[str] = None, chunk_size: int = 1000):
+        super().__init__(path, compression, chunk_size)
+        self._file.write("[")
+
+    def format(self, record: Dict, index: int) -> str:
+        separator = "\n" if index == 0 else ",\n"
+        return separator + textwrap.indent(json.dumps(record, ensure_ascii=False, indent=4), "    ")
+
+    def close(self):
+        self.flush()
+        self._file.write("\n]" if self.count else "]")
+        self._file.close()
+
+class CsvWriter(TextWriter):
+    """
+    Writes CSV with a BOM so Excel detects UTF-8. The columns are those of the first record.
+    """
+    encoding = 'utf-8-sig'
+
+    def __init__(self, path: str, compression: Optional[str] = None, chunk_size: int = 1000):
+        super().__init__(path, compression, chunk_size)
+        self._writer = None
+
+    def _write_chunk(self, records: List[Dict]):
+        if self._writer is None:
+            self._writer = csv.DictWriter(self._file, fieldnames=list(records[0]), extrasaction='ignore')
+            self._writer.writeheader()
+        self._writer.writerows(records)
+
+class TxtWriter(TextWriter):
+    def format(self, record: Dict, index: int) -> str:
+        return (
+            f"Instruction {index + 1}:\n"
+            f"Question: {record['instruction']}\n"
+            f"Answer: {record['output']}\n"
+            f"Sources: {record['links']}\n"
+            "\n"
+        )
+
+class ParquetWriter(RecordWriter):
+    def __init__(
+        self,
+        path: str,
+        compression: Optional[str] = None,
+        chunk_size: int = 10000,
+        shard_size: Optional[int] = None
+    ):
+        """
+        Writes Parquet with pyarrow, one row group per chunk. With shard_size the output is
+        split into files of at most shard_size rows named like "out-00000.parquet".
+
+        Parameters:
+            path (str): Output path.
+            compression (str, optional): Parquet codec ("snappy", "zstd", "gzip", "none"); defaults to snappy.
+            chunk_size (int): Number of rows per row group.
+            shard_size (int, optional): Maximum number of rows per file.
+        """
+        import pyarrow
+        import pyarrow.parquet
+
+        super().__init__(path, compression or 'snappy', chunk_size)
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.shard_size = shard_size
+        self.paths: List[str] = []
+        self._schema = None
+        self._writer = None
+        self._shard_rows = 0
+
+    def _shard_path(self) -> str:
+        if self.shard_size is None:
+            return self.path
+        root, extension = os.path.splitext(self.path)
+        return f"{root}-{len(self.paths):05d}{extension}"
+
+    def _write_chunk(self, records: List[Dict]):
+        if self._schema is None:
+            self._schema = self._pa.Table.from_pylist(records).schema
+        while records:
+            if self._writer is None:
+                self.paths.append(self._shard_path())
+                self._writer = self._pq.ParquetWriter(self.paths[-1], self._schema, compression=self.compression)
+                self._shard_rows = 0
+            room = len(records) if self.shard_size is None else self.shard_size - self._shard_rows
+            part, records = records[:room], records[room:]
+            self._writer.write_table(self._pa.Table.from_pylist(part, schema=self._schema))
+            self._shard_rows += len(part)
+            if self.shard_size is not None and self._shard_rows >= self.shard_size:
+                self._writer.close()
+                self._writer = None
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+class ExcelWriter(RecordWriter):
+    """
+    Writes .xlsx with openpyxl's write-only workbook, which streams rows to disk.
+    """
+    def __init__(self, path: str, compression: Optional[str] = None, chunk_size: int = 1000):
+        from openpyxl import Workbook
+
+        super().__init__(path, None, chunk_size)
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet()
+        self._columns = None
+
+    def _write_chunk(self, records: List[Dict]):
+        if self._columns is None:
+            self._columns = list(records[0])
+            self._sheet.append(self._columns)
+        for record in records:
+            self._sheet.append([
+                value if isinstance(value, (str, int, float)) or value is None else str(value)
+                for value in (record.get(column) for column in self._columns)
+            ])
+
+    def close(self):
+        self.flush()
+        self._workbook.save(self.path)
+
+class LiveSink:
+    def __init__(self, path: str):
+        """
+        Append-only JSON Lines feed of answers while they are being generated, for watching a
+        run with tail -f. Partial lines hold the answer so far with "done": false; the last
+        line of each question has "done": true.
+
+        Parameters:
+            path (str): Path of the feed file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _write(self, question: str, text: str, done: bool):
+        line = json.dumps({"instruction": question, "output": text, "done": done, "time": time.time()}, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def partial(self, question: str, text: str):
+        self._write(question, text, False)
+
+    def done(self, question: str, text: str):
+        self._write(question, text, True)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+WRITERS = {
+    '.jsonl': JsonlWriter,
+    '.json': JsonWriter,
+    '.csv': CsvWriter,
+    '.txt': TxtWriter,
+    '.parquet': ParquetWriter,
+    '.xlsx': ExcelWriter
+}
+
+def open_writer(
+    path: str,
+    chunk_size: Optional[int] = None,
+    shard_size: Optional[int] = None,
+    parquet_compression: Optional[str] = None
+) -> RecordWriter:
+    """
+    Returns the streaming writer for an output path. The format comes from the extension and
+    text formats may end in .gz or .zst for gzip or zstd compression.
+
+    Parameters:
+        path (str): Output path.
+        chunk_size (int, optional): Number of records written at a time.
+        shard_size (int, optional): Maximum number of rows per Parquet file.
+        parquet_compression (str, optional): Parquet codec.
+
+    Returns:
+        RecordWriter: The writer; use it as a context manager or call close().
+    """
+    extension, compression = split_export_path(path)
+    if extension not in WRITERS:
+        raise ValueError(f"Unsupported output file format: {extension}")
+    if compression is not None and extension in ('.parquet', '.xlsx'):
+        raise ValueError(f"{extension} files are compressed internally; drop the {os.path.splitext(path)[1]} suffix.")
+    kwargs = {"chunk_size": chunk_size} if chunk_size else {}
+    if extension == '.parquet':
+        return ParquetWriter(path, compression=parquet_compression, shard_size=shard_size, **kwargs)
+    return WRITERS[extension](path, compression=compression, **kwargs)
+
+def export_records(records: Iterable[Dict], path: str, **kwargs) -> int:
+    """
+    Streams records to an output file and returns the number written.
+    """
+    with open_writer(path, **kwargs) as writer:
+        return writer.write_many(records)
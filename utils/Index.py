@@ -0,0 +1,168 @@
+import math
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from .Text import tokenize
+
+def chunk_text(text: str, chunk_size: int = 200, overlap: int = 40) -> List[str]:
+    """
+    Splits text into overlapping chunks of whitespace-separated words.
+
+    Parameters:
+        text (str): The text to split.
+        chunk_size (int): Number of words per chunk.
+        overlap (int): Number of words shared by consecutive chunks.
+
+    Returns:
+        List[str]: The chunks, in document order.
+    """
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, chunk_size - overlap)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + chunk_size]))
+        if start + chunk_size >= len(words):
+            break
+    return chunks
+
+class BM25Index:
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75):
+        """
+        In-memory Okapi BM25 index over a small document collection.
+
+        Parameters:
+            documents (List[str]): The documents to index.
+            k1 (float): Term frequency saturation.
+            b (float): Length normalization.
+        """
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(tokenize(document)) for document in documents]
+        self.lengths = [sum(freqs.values()) for freqs in self.term_freqs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+        document_freqs = Counter()
+        for freqs in self.term_freqs:
+            document_freqs.update(freqs.keys())
+        total = len(documents)
+        self.idf = {
+            term: math.log(1 + (total - freq + 0.5) / (freq + 0.5))
+            for term, freq in document_freqs.items()
+        }
+
+    def scores(self, query: str) -> List[float]:
+        """
+        Returns the BM25 score of every document for the query.
+        """
+        terms = set(tokenize(query))
+        scores = []
+        for freqs, length in zip(self.term_freqs, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+            for term in terms:
+                freq = freqs.get(term)
+                if freq:
+                    score += self.idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            scores.append(score)
+        return scores
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """
+        Returns the indices and scores of the k best documents for the query.
+        """
+        scores = self.scores(query)
+        ranked = sorted(range(len(scores)), key=lambda idx: scores[idx], reverse=True)
+        return [(idx, scores[idx]) for idx in ranked[:k]]
+
+class LocalEmbedder:
+    def __init__(self, model_name: str, batch_size: int = 32):
+        """
+        Sentence embedding model run locally on the CPU with sentence-transformers.
+
+        Parameters:
+            model_name (str): Name or path of a locally available sentence-transformers model.
+            batch_size (int): Number of chunks encoded per batch.
+        """
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device='cpu')
+
+    def encode(self, texts: List[str]):
+        """
+        Returns L2-normalized embeddings for the texts as a numpy array.
+        """
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+
+    def rank(self, query: str, documents: List[str]) -> List[int]:
+        """
+        Returns the document indices ordered by cosine similarity to the query.
+        """
+        embeddings = self.encode(documents)
+        query_embedding = self.encode([query])[0]
+        similarities = embeddings @ query_embedding
+        return sorted(range(len(documents)), key=lambda idx: similarities[idx], reverse=True)
+
+def select_chunks(
+    query: str,
+    pages: List[Tuple[str, str]],
+    top_k: int = 8,
+    chunk_size: int = 200,
+    overlap: int = 40,
+    embedder: Optional[LocalEmbedder] = None,
+    rrf_k: int = 60
+) -> List[Tuple[str, str]]:
+    """
+    Chunks the fetched pages and keeps only the chunks most relevant to the query.
+
+    Chunks are ranked with BM25; if an embedder is given, the BM25 and embedding rankings
+    are merged with reciprocal rank fusion.
+
+    Parameters:
+        query (str): The question.
+        pages (List[Tuple[str, str]]): (link, body text) pairs in ranking order.
+        top_k (int): Number of chunks to keep.
+        chunk_size (int): Number of words per chunk.
+        overlap (int): Number of words shared by consecutive chunks.
+        embedder (LocalEmbedder, optional): Local embedding model for hybrid ranking.
+        rrf_k (int): Reciprocal rank fusion constant.
+
+    Returns:
+        List[Tuple[str, str]]: (link, selected text) pairs for the pages that contributed chunks,
+        in page order, with each page's chunks kept in document order.
+    """
+    chunks = []  # (page index, chunk index, text)
+    for page_idx, (_, text) in enumerate(pages):
+        for chunk_idx, chunk in enumerate(chunk_text(text, chunk_size, overlap)):
+            chunks.append((page_idx, chunk_idx, chunk))
+    if not chunks:
+        return []
+
+    texts = [chunk for _, _, chunk in chunks]
+    bm25_ranking = [idx for idx, _ in BM25Index(texts).search(query, len(texts))]
+    if embedder is None:
+        selected = bm25_ranking[:top_k]
+    else:
+        fused: Dict[int, float] = {}
+        for ranking in (bm25_ranking, embedder.rank(query, texts)):
+            for rank, idx in enumerate(ranking):
+                fused[idx] = fused.get(idx, 0.0) + 1.0 / (rrf_k + rank + 1)
+        selected = sorted(fused, key=fused.get, reverse=True)[:top_k]
+
+    by_page: Dict[int, List[Tuple[int, str]]] = {}
+    for idx in selected:
+        page_idx, chunk_idx, chunk = chunks[idx]
+        by_page.setdefault(page_idx, []).append((chunk_idx, chunk))
+
+    return [
+        (pages[page_idx][0], "\n".join(chunk for _, chunk in sorted(by_page[page_idx])))
+        for page_idx in sorted(by_page)
+    ]
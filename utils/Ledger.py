@@ -0,0 +1,204 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# Stages a unit of work can fail at, in pipeline order
+LEDGER_STAGES = ['sample', 'retrieve', 'respond']
+
+class WorkLedger:
+    def __init__(self, path: str, compression_level: int = 6):
+        """
+        Durable record of a run's units of work and their intermediate results, backed by a
+        single SQLite file.
+
+        Iterations are "sampled" (with the questions the sampler returned) or "failed".
+        Questions move from "sampled" to "retrieved" (search and page fetching done, context
+        and links stored zlib-compressed) to "answered" (answer stored), or to "failed" with
+        the stage and error. A restarted run skips sampled iterations and resumes each
+        question at its stage, so no paid call is made twice; failed units are retried only
+        when asked for with retry().
+
+        Parameters:
+            path (str): Path of the SQLite database.
+            compression_level (int): zlib compression level (1-9) for the stored contexts.
+        """
+        self.path = path
+        self.compression_level = compression_level
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS iterations ("
+            "idx INTEGER PRIMARY KEY, state TEXT NOT NULL, questions TEXT, error TEXT, "
+            "attempts INTEGER NOT NULL DEFAULT 1, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS questions ("
+            "question TEXT PRIMARY KEY, iteration INTEGER, state TEXT NOT NULL, context BLOB, links TEXT, "
+            "output TEXT, failed_stage TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS questions_state ON questions (state)")
+        self._conn.commit()
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+        return cursor
+
+    def done_iterations(self) -> Set[int]:
+        """
+        Returns the iterations that were sampled or failed and should not be sampled again.
+        """
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT idx FROM iterations")}
+
+    def record_sampled(self, iteration_index: int, sampled: List[str], questions: List[str]) -> List[str]:
+        """
+        Marks an iteration sampled and adds its questions (after dedup filtering) as units of work.
+
+        Parameters:
+            iteration_index (int): Index of the iteration.
+            sampled (List[str]): All questions the sampler returned, kept as the iteration's artifact.
+            questions (List[str]): The questions to process.
+
+        Returns:
+            List[str]: The questions that were not in the ledger yet, in order.
+        """
+        now = time.time()
+        added = []
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO iterations (idx, state, questions, error, attempts, updated_at) "
+                "VALUES (?, 'sampled', ?, NULL, COALESCE((SELECT attempts FROM iterations WHERE idx = ?), 0) + 1, ?)",
+                (iteration_index, json.dumps(sampled, ensure_ascii=False), iteration_index, now)
+            )
+            for question in questions:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO questions (question, iteration, state, updated_at) VALUES (?, ?, 'sampled', ?)",
+                    (question, iteration_index, now)
+                )
+                if cursor.rowcount:
+                    added.append(question)
+            self._conn.commit()
+        return added
+
+    def record_failed_iteration(self, iteration_index: int, error: str):
+        self._execute(
+            "INSERT OR REPLACE INTO iterations (idx, state, questions, error, attempts, updated_at) "
+            "VALUES (?, 'failed', NULL, ?, COALESCE((SELECT attempts FROM iterations WHERE idx = ?), 0) + 1, ?)",
+            (iteration_index, str(error), iteration_index, time.time())
+        )
+
+    def record_retrieved(self, question: str, context: str, links: List[str]):
+        self._execute(
+            "INSERT INTO questions (question, state, context, links, updated_at) VALUES (?, 'retrieved', ?, ?, ?) "
+            "ON CONFLICT (question) DO UPDATE SET state = 'retrieved', context = excluded.context, "
+            "links = excluded.links, failed_stage = NULL, error = NULL, updated_at = excluded.updated_at",
+            (
+                question,
+                zlib.compress(context.encode('utf-8'), self.compression_level),
+                json.dumps(links, ensure_ascii=False),
+                time.time()
+            )
+        )
+
+    def record_answered(self, question: str, output: str):
+        self._execute(
+            "UPDATE questions SET state = 'answered', output = ?, failed_stage = NULL, error = NULL, "
+            "attempts = attempts + 1, updated_at = ? WHERE question = ?",
+            (output, time.time(), question)
+        )
+
+    def record_failed(self, question: str, stage: str, error: str):
+        """
+        Marks a question failed at the "retrieve" or "respond" stage.
+        """
+        self._execute(
+            "UPDATE questions SET state = 'failed', failed_stage = ?, error = ?, attempts = attempts + 1, "
+            "updated_at = ? WHERE question = ?",
+            (stage, str(error), time.time(), question)
+        )
+
+    def retry(self, stages: Iterable[str] = LEDGER_STAGES) -> int:
+        """
+        Makes the units that failed at the given stages pending again. Failed iterations are
+        sampled again; questions that failed at retrieval are searched again, and those that
+        failed at the responder keep their stored context and are only answered again.
+
+        Returns:
+            int: The number of units reset.
+        """
+        stages = list(stages)
+        reset = 0
+        with self._lock:
+            if 'sample' in stages:
+                reset += self._conn.execute("DELETE FROM iterations WHERE state = 'failed'").rowcount
+            if 'retrieve' in stages:
+                reset += self._conn.execute(
+                    "UPDATE questions SET state = 'sampled' WHERE state = 'failed' AND failed_stage = 'retrieve'"
+                ).rowcount
+            if 'respond' in stages:
+                reset += self._conn.execute(
+                    "UPDATE questions SET state = 'retrieved' WHERE state = 'failed' AND failed_stage = 'respond'"
+                ).rowcount
+            self._conn.commit()
+        return reset
+
+    def answered_questions(self) -> Set[str]:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT question FROM questions WHERE state = 'answered'")}
+
+    def pending(self) -> Iterator[Tuple[str, Optional[Tuple[str, List[str]]]]]:
+        """
+        Yields the unfinished questions of earlier runs as (question, retrieved), where
+        retrieved is the stored (context, links) of questions that only need an answer, or
+        None for questions that still need retrieval.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT question, state, context, links FROM questions WHERE state IN ('sampled', 'retrieved') ORDER BY rowid"
+            ).fetchall()
+        for question, state, context, links in rows:
+            if state == 'retrieved':
+                yield question, (zlib.decompress(context).decode('utf-8'), json.loads(links))
+            else:
+                yield question, None
+
+    def answered_records(self) -> Iterator[Dict]:
+        """
+        Yields the answered questions as instruction records, as get_response() returns them.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT question, context, links, output FROM questions WHERE state = 'answered' ORDER BY rowid"
+            ).fetchall()
+        for question, context, links, output in rows:
+            yield {
+                "context": zlib.decompress(context).decode('utf-8'),
+                "instruction": question,
+                "output": output,
+                "links": json.loads(links)
+            }
+
+    def stats(self) -> dict:
+        """
+        Returns the number of iterations and questions in each state, and the failures per stage.
+        """
+        with self._lock:
+            iterations = dict(self._conn.execute("SELECT state, COUNT(*) FROM iterations GROUP BY state").fetchall())
+            questions = dict(self._conn.execute("SELECT state, COUNT(*) FROM questions GROUP BY state").fetchall())
+            failed = dict(self._conn.execute(
+                "SELECT failed_stage, COUNT(*) FROM questions WHERE state = 'failed' GROUP BY failed_stage"
+            ).fetchall())
+        if iterations.get('failed'):
+            failed['sample'] = iterations['failed']
+        return {"iterations": iterations, "questions": questions, "failed": failed}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
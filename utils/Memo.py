@@ -0,0 +1,102 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from tools.metrics import get_metrics
+from .Text import normalize_text
+
+def content_hash(text: str) -> str:
+    """
+    Returns the sha256 hex digest of a text.
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class AnswerStore:
+    def __init__(self, path: str):
+        """
+        Durable memo of responder answers backed by a single SQLite file.
+
+        Answers are keyed on the normalized question, the responder model, and hashes of the
+        respond prompt and of the context, so an answer is reused only for the exact same
+        request. Re-runs over the same questions (with --search_cache and --page_cache_dir
+        keeping the contexts identical) then make no responder calls.
+
+        Parameters:
+            path (str): Path of the SQLite database.
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "key TEXT PRIMARY KEY, question TEXT NOT NULL, model TEXT NOT NULL, "
+            "prompt_hash TEXT NOT NULL, context_hash TEXT NOT NULL, "
+            "output TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def key(question: str, model: str, prompt: str, context: str) -> str:
+        """
+        Returns the memo key for a responder request.
+        """
+        payload = json.dumps(
+            [normalize_text(question), model, content_hash(prompt), content_hash(context)],
+            ensure_ascii=False
+        )
+        return content_hash(payload)
+
+    def get(self, question: str, model: str, prompt: str, context: str) -> Optional[str]:
+        """
+        Looks up a memoized answer.
+
+        Returns:
+            str or None: The answer, or None if the request was not answered before.
+        """
+        key = self.key(question, model, prompt, context)
+        with self._lock:
+            row = self._conn.execute("SELECT output FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        get_metrics().inc("answer_store_requests_total", result="miss" if row is None else "hit")
+        return row[0] if row is not None else None
+
+    def put(self, question: str, model: str, prompt: str, context: str, output: str):
+        """
+        Stores an answer. Empty outputs (failed requests) are not memoized.
+        """
+        if not output:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers "
+                "(key, question, model, prompt_hash, context_hash, output, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.key(question, model, prompt, context), question, model,
+                    content_hash(prompt), content_hash(context), output, time.time()
+                )
+            )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+    def stats(self) -> dict:
+        """
+        Returns the hit and miss counters.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
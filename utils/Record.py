@@ -0,0 +1,102 @@
+import sqlite3
+import threading
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Union
+
+from .Memo import content_hash
+
+CONTEXT_MODES = ['inline', 'ref', 'drop']
+
+class ContextStore:
+    def __init__(self, path: str, compression_level: int = 6):
+        """
+        Sidecar store of responder contexts, deduplicated by content hash and zlib-compressed,
+        backed by a single SQLite file.
+
+        Parameters:
+            path (str): Path of the SQLite database.
+            compression_level (int): zlib compression level (1-9).
+        """
+        self.path = path
+        self.compression_level = compression_level
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS contexts "
+            "(hash TEXT PRIMARY KEY, size INTEGER NOT NULL, data BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def put(self, context: str) -> str:
+        """
+        Stores a context once and returns its hash.
+        """
+        key = content_hash(context)
+        raw = context.encode('utf-8')
+        data = zlib.compress(raw, self.compression_level)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO contexts (hash, size, data) VALUES (?, ?, ?)",
+                (key, len(raw), data)
+            )
+            self._conn.commit()
+        return key
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the context stored under a hash, or None if it is unknown.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM contexts WHERE hash = ?", (key,)).fetchone()
+        return zlib.decompress(row[0]).decode('utf-8') if row is not None else None
+
+    def stats(self) -> dict:
+        """
+        Returns the number of stored contexts and their raw and compressed sizes in bytes.
+        """
+        with self._lock:
+            count, raw_bytes, stored_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM contexts"
+            ).fetchone()
+        return {"contexts": count, "raw_bytes": raw_bytes, "stored_bytes": stored_bytes}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+@dataclass
+class InstructionRecord:
+    """
+    Compact instruction record whose context lives out of line: referenced by hash in a
+    ContextStore, or dropped entirely (context_hash is None).
+    """
+    __slots__ = ("instruction", "output", "links", "context_hash")
+    instruction: str
+    output: str
+    links: Union[List[str], str]
+    context_hash: Optional[str]
+
+    @classmethod
+    def from_dict(cls, record: Dict, context_store: Optional[ContextStore] = None) -> "InstructionRecord":
+        """
+        Builds a compact record from a get_response() dict, moving its context to the store.
+        Without a store the context is dropped.
+        """
+        context = record.get("context")
+        context_hash = context_store.put(context) if context_store is not None and context is not None else None
+        return cls(record["instruction"], record["output"], record["links"], context_hash)
+
+    def to_dict(self, context_store: Optional[ContextStore] = None) -> Dict:
+        """
+        Returns the record as a dict for writing. The context is referenced by its hash, or
+        inlined again if a context store is given.
+        """
+        if context_store is not None and self.context_hash is not None:
+            head = {"context": context_store.get(self.context_hash)}
+        elif self.context_hash is not None:
+            head = {"context_hash": self.context_hash}
+        else:
+            head = {}
+        return {**head, "instruction": self.instruction, "output": self.output, "links": self.links}
@@ -1,5 +1,33 @@
 from tools import LLM
-from typing import List, Union, Dict
+from tools.llm import StreamResult
+from tools.metrics import get_metrics
+from typing import Callable, List, Optional, Sequence, Union, Dict
+
+def build_response_messages(query: str, context: str, prompt: str) -> List[dict]:
+    """
+    Builds the chat messages for answering a query from the given context.
+    """
+    return [
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": f"Context:\n{context}"},
+        {"role": "user", "content": f"Query:\n{query}"}
+    ]
+
+def make_response_record(
+    query: str,
+    context: str,
+    links: Union[List[str], str],
+    result: str
+) -> Dict[str, Union[str, List[str]]]:
+    """
+    Builds the output record for an answered query.
+    """
+    return {
+        "context": context,
+        "instruction": query,
+        "output": result,
+        "links": links
+    }
 
 def get_response(
     query: str,
@@ -26,11 +54,7 @@ def get_response(
         Dict[str, Union[str, List[str]]]: A dictionary containing the context, instruction, output, and links.
     """
     # Prepare the messages for the LLM
-    messages = [
-        {"role": "system", "content": prompt},
-        {"role": "user", "content": f"Context:\n{context}"},
-        {"role": "user", "content": f"Query:\n{query}"}
-    ]
+    messages = build_response_messages(query, context, prompt)
 
     if verbose:
         print("\033[36mSending request to LLM for response generation...\033[0m")
@@ -39,11 +63,12 @@ def get_response(
 
     # Generate the response using the LLM
     try:
-        completion = agent.get_client().chat.completions.create(
-            messages=messages,
-            temperature=0.1,
-            model=model
-        )
+        with get_metrics().timer("get_response"):
+            completion = agent.chat(
+                messages=messages,
+                temperature=0.1,
+                model=model
+            )
         result = completion.choices[0].message.content.strip()
         if verbose:
             print("\033[32mLLM response:\033[0m")
@@ -53,11 +78,150 @@ def get_response(
         result = ""
 
     # Prepare the output dictionary
-    response = {
-        "context": context,
-        "instruction": query,
-        "output": result,
-        "links": links
-    }
+    return make_response_record(query, context, links, result)
+
+async def aget_response(
+    query: str,
+    context: str,
+    links: Union[List[str], str],
+    agent: LLM,
+    model: str,
+    prompt: str,
+    verbose: bool = False
+) -> Dict[str, Union[str, List[str]]]:
+    """
+    Async counterpart of get_response(), using the LLM's shared async client.
+    """
+    messages = build_response_messages(query, context, prompt)
+
+    if verbose:
+        print("\033[36mSending request to LLM for response generation...\033[0m")
+        print("\033[33mQuestion:\033[0m")
+        print(f"{query}")
+
+    try:
+        with get_metrics().timer("get_response"):
+            completion = await agent.achat(
+                messages=messages,
+                temperature=0.1,
+                model=model
+            )
+        result = completion.choices[0].message.content.strip()
+        if verbose:
+            print("\033[32mLLM response:\033[0m")
+            print(f"{result}")
+    except Exception as e:
+        print(f"\033[31mError generating response: {e}\033[0m")
+        result = ""
+
+    return make_response_record(query, context, links, result)
+
+def stream_response(
+    query: str,
+    context: str,
+    links: Union[List[str], str],
+    agent: LLM,
+    model: str,
+    prompt: str,
+    verbose: bool = False,
+    max_output_chars: Optional[int] = None,
+    stop: Optional[Sequence[str]] = None,
+    on_progress: Optional[Callable[[str], None]] = None,
+    on_finish: Optional[Callable[[StreamResult], None]] = None
+) -> Dict[str, Union[str, List[str]]]:
+    """
+    Streaming counterpart of get_response(): reads the answer token by token, passing the partial
+    answer to on_progress, and stops early at max_output_chars or a stop sequence.
+
+    Parameters:
+        query (str): The user's question or instruction.
+        context (str): The context information to assist the LLM in generating a response.
+        links (List[str] or str): Source links associated with the context.
+        agent (LLM): The language model agent to use for generating the response.
+        model (str): The name of the model to use.
+        prompt (str): The system prompt to guide the LLM's behavior.
+        verbose (bool): If True, prints additional information for debugging.
+        max_output_chars (int, optional): Maximum length of the answer in characters.
+        stop (Sequence[str], optional): Stop sequences; the answer is cut before the first match.
+        on_progress (Callable[[str], None], optional): Receives the partial answer while it is generated.
+        on_finish (Callable[[StreamResult], None], optional): Receives the finished stream, e.g. to tell
+            an answer cut short by max_output_chars or a stop sequence (aborted) from a complete one.
+
+    Returns:
+        Dict[str, Union[str, List[str]]]: A dictionary containing the context, instruction, output, and links.
+    """
+    messages = build_response_messages(query, context, prompt)
+
+    if verbose:
+        print("\033[36mStreaming response from LLM...\033[0m")
+        print("\033[33mQuestion:\033[0m")
+        print(f"{query}")
+
+    try:
+        with get_metrics().timer("get_response"):
+            streamed = agent.stream_chat(
+                messages=messages,
+                temperature=0.1,
+                model=model,
+                max_chars=max_output_chars,
+                stop=stop,
+                on_progress=on_progress
+            )
+        result = streamed.text.strip()
+        if on_finish is not None:
+            on_finish(streamed)
+        if verbose:
+            print(f"\033[32mLLM response\033[0m (first token {streamed.ttft or 0:.2f}s, {streamed.tokens_per_second or 0:.1f} tok/s"
+                  f"{', stopped at ' + streamed.finish_reason if streamed.aborted else ''}):")
+            print(f"{result}")
+    except Exception as e:
+        print(f"\033[31mError generating response: {e}\033[0m")
+        result = ""
+
+    return make_response_record(query, context, links, result)
+
+async def astream_response(
+    query: str,
+    context: str,
+    links: Union[List[str], str],
+    agent: LLM,
+    model: str,
+    prompt: str,
+    verbose: bool = False,
+    max_output_chars: Optional[int] = None,
+    stop: Optional[Sequence[str]] = None,
+    on_progress: Optional[Callable[[str], None]] = None,
+    on_finish: Optional[Callable[[StreamResult], None]] = None
+) -> Dict[str, Union[str, List[str]]]:
+    """
+    Async counterpart of stream_response().
+    """
+    messages = build_response_messages(query, context, prompt)
+
+    if verbose:
+        print("\033[36mStreaming response from LLM...\033[0m")
+        print("\033[33mQuestion:\033[0m")
+        print(f"{query}")
+
+    try:
+        with get_metrics().timer("get_response"):
+            streamed = await agent.astream_chat(
+                messages=messages,
+                temperature=0.1,
+                model=model,
+                max_chars=max_output_chars,
+                stop=stop,
+                on_progress=on_progress
+            )
+        result = streamed.text.strip()
+        if on_finish is not None:
+            on_finish(streamed)
+        if verbose:
+            print(f"\033[32mLLM response\033[0m (first token {streamed.ttft or 0:.2f}s, {streamed.tokens_per_second or 0:.1f} tok/s"
+                  f"{', stopped at ' + streamed.finish_reason if streamed.aborted else ''}):")
+            print(f"{result}")
+    except Exception as e:
+        print(f"\033[31mError generating response: {e}\033[0m")
+        result = ""
 
-    return response
+    return make_response_record(query, context, links, result)
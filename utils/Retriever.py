@@ -1,5 +1,9 @@
-from typing import Tuple, List
+import asyncio
+from typing import Tuple, List, Optional
+from concurrent.futures import Executor
 from tools import Tools
+from .Context import build_context
+from .Index import LocalEmbedder, select_chunks
 
 def make_context(
     query: str,
@@ -7,7 +11,12 @@ def make_context(
     num_pages: int = 1,
     verbose: bool = False,
     skip_websites: List[str] = None,
-    used_number_of_links: int = None
+    used_number_of_links: int = None,
+    max_tokens: Optional[int] = None,
+    model: Optional[str] = None,
+    top_k: Optional[int] = None,
+    chunk_size: int = 200,
+    embedder: Optional[LocalEmbedder] = None
 ) -> Tuple[str, List[str]]:
     """
     Retrieves context and links for a given query using the provided tool.
@@ -19,14 +28,94 @@ def make_context(
         verbose (bool): If True, prints additional information. Defaults to False.
         skip_websites (List[str], optional): List of website domains to skip.
         used_number_of_links (int, optional): Desired number of successfully fetched links.
+        max_tokens (int, optional): Token budget for the context, split fairly across the fetched pages.
+            If None, the pages are concatenated in full.
+        model (str, optional): The responder model, used to count tokens when max_tokens is set.
+        top_k (int, optional): If set, the pages are chunked and only the top_k chunks most relevant
+            to the query (BM25, plus embeddings if an embedder is given) are kept.
+        chunk_size (int): Number of words per chunk when top_k is set.
+        embedder (LocalEmbedder, optional): Local embedding model for hybrid chunk ranking.
 
     Returns:
         Tuple[str, List[str]]: A tuple containing the context string and a list of links.
     """
-    return tool.get_context(
+    if max_tokens is None and top_k is None:
+        return tool.get_context(
+            query=query,
+            num_pages=num_pages,
+            verbose=verbose,
+            skip_websites=skip_websites,
+            used_number_of_links=used_number_of_links
+        )
+
+    pages = tool.get_pages(
+        query=query,
+        num_pages=num_pages,
+        verbose=verbose,
+        skip_websites=skip_websites,
+        used_number_of_links=used_number_of_links
+    )
+    return assemble_context(query, pages, max_tokens, model, top_k, chunk_size, embedder)
+
+def assemble_context(
+    query: str,
+    pages: List[Tuple[str, str]],
+    max_tokens: Optional[int] = None,
+    model: Optional[str] = None,
+    top_k: Optional[int] = None,
+    chunk_size: int = 200,
+    embedder: Optional[LocalEmbedder] = None
+) -> Tuple[str, List[str]]:
+    """
+    Turns fetched pages into the responder context: optionally keeps only the most
+    relevant chunks, then applies the token budget. Parameters are as in make_context().
+
+    Returns:
+        Tuple[str, List[str]]: The context string and the links of the pages it draws from.
+    """
+    if top_k is not None:
+        pages = select_chunks(query, pages, top_k=top_k, chunk_size=chunk_size, overlap=chunk_size // 5, embedder=embedder)
+    if max_tokens is None:
+        return "".join(f"{text}\n" for _, text in pages), [link for link, _ in pages]
+    return build_context(pages, model, max_tokens)
+
+async def amake_context(
+    query: str,
+    tool: Tools,
+    num_pages: int = 1,
+    verbose: bool = False,
+    skip_websites: List[str] = None,
+    used_number_of_links: int = None,
+    max_tokens: Optional[int] = None,
+    model: Optional[str] = None,
+    top_k: Optional[int] = None,
+    chunk_size: int = 200,
+    embedder: Optional[LocalEmbedder] = None,
+    executor: Optional[Executor] = None
+) -> Tuple[str, List[str]]:
+    """
+    Async counterpart of make_context(). The tool's blocking search, page fetches,
+    chunk ranking and token counting run on the given executor.
+    """
+    if max_tokens is None and top_k is None:
+        return await tool.aget_context(
+            executor=executor,
+            query=query,
+            num_pages=num_pages,
+            verbose=verbose,
+            skip_websites=skip_websites,
+            used_number_of_links=used_number_of_links
+        )
+
+    pages = await tool.aget_pages(
+        executor=executor,
         query=query,
         num_pages=num_pages,
         verbose=verbose,
         skip_websites=skip_websites,
         used_number_of_links=used_number_of_links
-    )
\ No newline at end of file
+    )
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor, assemble_context, query, pages, max_tokens, model, top_k, chunk_size, embedder
+    )
@@ -1,46 +1,42 @@
 from tools import LLM
-from typing import List, Union
+from tools.metrics import get_metrics
+from .Seeds import SeedSource
+from typing import List, Union, Optional
 import re
 import json
 import random
 
-def get_examples(
-    seed: Union[str, List[str]],
-    agent: LLM,
-    model: str,
-    prompt: str,
+def select_seed_questions(
+    seed: Union[str, List[str], SeedSource],
     verbose: bool = False,
-    seed_as_instructs: bool = False,
     sample_size: int = None
-) -> dict:
+) -> List[str]:
     """
-    Generate examples based on seed questions.
+    Normalizes the seed input to a list and randomly selects a subset if requested.
+    The seed list is not copied: only the selected questions are, and a SeedSource
+    reads just the selected questions from its file.
 
     Parameters:
-        seed (str or List[str]): Seed question(s) to generate examples from.
-        agent (LLM): The language model agent.
-        model (str): The name of the model to use.
-        prompt (str): The prompt to provide to the LLM.
+        seed (str, List[str] or SeedSource): Seed question(s) to select from.
         verbose (bool): If True, prints additional information.
-        seed_as_instructs (bool): If True, use seed questions as instructions without generating new ones.
         sample_size (int, optional): Number of seed questions to randomly select from the seed list.
 
     Returns:
-        dict: A dictionary containing generated questions.
+        List[str]: The selected seed questions.
     """
-    # Ensure seed is a list of questions
+    # Ensure seed is a list or a source of questions
     if isinstance(seed, str):
-        seed_questions = [seed]
-    elif isinstance(seed, list):
-        seed_questions = seed.copy()
-    else:
-        raise ValueError("Seed must be a string or a list of strings.")
+        seed = [seed]
+    elif not isinstance(seed, (list, SeedSource)):
+        raise ValueError("Seed must be a string, a list of strings or a SeedSource.")
 
     # Randomly select a subset of seed questions if sample_size is specified
-    if sample_size is not None and sample_size < len(seed_questions):
-        seed_questions = random.sample(seed_questions, sample_size)
+    if sample_size is not None and sample_size < len(seed):
+        seed_questions = seed.sample(sample_size) if isinstance(seed, SeedSource) else random.sample(seed, sample_size)
         if verbose:
             print(f"\033[33mRandomly selected {sample_size} seed questions.\033[0m")
+    else:
+        seed_questions = list(seed) if isinstance(seed, SeedSource) else seed
 
     # If verbose, print the seed questions
     if verbose:
@@ -48,38 +44,38 @@ def get_examples(
         for idx, question in enumerate(seed_questions, start=1):
             print(f"  {idx}. {question}")
 
-    # If seed_as_instructs is True, return the seed questions as instructions
-    if seed_as_instructs:
-        result = {'questions': seed_questions}
-        if verbose:
-            print("\033[33mUsing seed questions as instructions.\033[0m")
-        return result
+    return seed_questions
 
+def build_sample_messages(seed_questions: List[str], prompt: str) -> List[dict]:
+    """
+    Builds the chat messages asking the LLM to generate new questions from the seed questions.
+    """
     # Prepare the questions string for the LLM prompt
     questions_text = "\n".join(f"{i+1} - {q}" for i, q in enumerate(seed_questions))
+    return [
+        {
+            "role": "system",
+            "content": prompt,
+        },
+        {
+            "role": "user",
+            "content": questions_text,
+        }
+    ]
 
-    if verbose:
-        print("\033[36mSending request to LLM to generate new questions...\033[0m")
+def parse_sample_output(content: Optional[str], verbose: bool = False) -> dict:
+    """
+    Extracts the generated questions JSON from the LLM's response.
 
-    # Generate new questions using the LLM
-    completion = agent.get_client().chat.completions.create(
-        messages=[
-            {
-                "role": "system",
-                "content": prompt,
-            },
-            {
-                "role": "user",
-                "content": questions_text,
-            }
-        ],
-        temperature=0.2,
-        model=model,
-    )
-
-    # Extract JSON from the LLM's response
+    Parameters:
+        content (str): The raw message content returned by the LLM.
+        verbose (bool): If True, prints additional information.
+
+    Returns:
+        dict: A dictionary containing generated questions, or an empty question list on parse errors.
+    """
     try:
-        json_content = re.search(r"{[\s\S]+}", completion.choices[0].message.content)
+        json_content = re.search(r"{[\s\S]+}", content or "")
         if not json_content:
             raise ValueError("No JSON content found in LLM response.")
         result = json.loads(json_content.group(0))
@@ -91,3 +87,81 @@ def get_examples(
     except Exception as e:
         print(f"\033[31mError parsing LLM output: {e}\033[0m")
         return {'questions': []}
+
+def get_examples(
+    seed: Union[str, List[str], SeedSource],
+    agent: LLM,
+    model: str,
+    prompt: str,
+    verbose: bool = False,
+    seed_as_instructs: bool = False,
+    sample_size: int = None
+) -> dict:
+    """
+    Generate examples based on seed questions.
+
+    Parameters:
+        seed (str, List[str] or SeedSource): Seed question(s) to generate examples from.
+        agent (LLM): The language model agent.
+        model (str): The name of the model to use.
+        prompt (str): The prompt to provide to the LLM.
+        verbose (bool): If True, prints additional information.
+        seed_as_instructs (bool): If True, use seed questions as instructions without generating new ones.
+        sample_size (int, optional): Number of seed questions to randomly select from the seed list.
+
+    Returns:
+        dict: A dictionary containing generated questions.
+    """
+    seed_questions = select_seed_questions(seed, verbose=verbose, sample_size=sample_size)
+
+    # If seed_as_instructs is True, return the seed questions as instructions
+    if seed_as_instructs:
+        result = {'questions': seed_questions}
+        if verbose:
+            print("\033[33mUsing seed questions as instructions.\033[0m")
+        return result
+
+    if verbose:
+        print("\033[36mSending request to LLM to generate new questions...\033[0m")
+
+    # Generate new questions using the LLM
+    with get_metrics().timer("get_examples"):
+        completion = agent.chat(
+            messages=build_sample_messages(seed_questions, prompt),
+            temperature=0.2,
+            model=model,
+        )
+
+    return parse_sample_output(completion.choices[0].message.content, verbose=verbose)
+
+async def aget_examples(
+    seed: Union[str, List[str], SeedSource],
+    agent: LLM,
+    model: str,
+    prompt: str,
+    verbose: bool = False,
+    seed_as_instructs: bool = False,
+    sample_size: int = None
+) -> dict:
+    """
+    Async counterpart of get_examples(), using the LLM's shared async client.
+    """
+    seed_questions = select_seed_questions(seed, verbose=verbose, sample_size=sample_size)
+
+    if seed_as_instructs:
+        result = {'questions': seed_questions}
+        if verbose:
+            print("\033[33mUsing seed questions as instructions.\033[0m")
+        return result
+
+    if verbose:
+        print("\033[36mSending request to LLM to generate new questions...\033[0m")
+
+    with get_metrics().timer("get_examples"):
+        completion = await agent.achat(
+            messages=build_sample_messages(seed_questions, prompt),
+            temperature=0.2,
+            model=model,
+        )
+
+    return parse_sample_output(completion.choices[0].message.content, verbose=verbose)
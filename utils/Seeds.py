@@ -0,0 +1,319 @@
+import csv
+import io
+import json
+import math
+import mmap
+import os
+import random
+import threading
+from itertools import islice
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional, TypeVar, Union
+
+if TYPE_CHECKING:
+    import numpy as np
+
+T = TypeVar('T')
+_END = object()
+
+# Block size for scanning a seed file when building its line-offset index
+_SCAN_BLOCK = 64 * 1024 * 1024
+
+def _uniform(rng) -> float:
+    # Uniform value in the open interval (0, 1)
+    value = rng.random()
+    while value == 0.0:
+        value = rng.random()
+    return value
+
+def reservoir_sample(items: Iterable[T], k: int, rng: Optional[random.Random] = None) -> List[T]:
+    """
+    Uniformly samples k items from an iterable of unknown length in a single pass, holding
+    only the k kept items in memory. Uses Algorithm L, which draws random numbers only for
+    the O(k log(n/k)) items that enter the reservoir instead of for every item.
+    """
+    rng = rng or random
+    items = iter(items)
+    reservoir = list(islice(items, k))
+    if len(reservoir) == k and k > 0:
+        weight = math.exp(math.log(_uniform(rng)) / k)
+        while True:
+            skip = math.floor(math.log(_uniform(rng)) / math.log(1 - weight)) if weight < 1 else 0
+            item = next(islice(items, skip, skip + 1), _END)
+            if item is _END:
+                break
+            reservoir[rng.randrange(k)] = item
+            weight *= math.exp(math.log(_uniform(rng)) / k)
+    rng.shuffle(reservoir)
+    return reservoir
+
+class SeedSource:
+    """
+    Read-only collection of seed questions that can be sampled without loading it into memory.
+    Subclasses implement __len__, __getitem__ and __iter__.
+    """
+    # False for sources that can only be read sequentially
+    random_access = True
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def __getitem__(self, idx: int) -> str:
+        raise NotImplementedError
+
+    def __iter__(self) -> Iterator[str]:
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def sample(self, k: int, rng: Optional[random.Random] = None) -> List[str]:
+        """
+        Returns k seed questions drawn at random without replacement, reading only those k.
+        """
+        rng = rng or random
+        return [self[idx] for idx in rng.sample(range(len(self)), k)]
+
+class LineSeedSource(SeedSource):
+    def __init__(self, path: str, kind: Optional[str] = None, column: str = 'question', index: bool = True):
+        """
+        Seed questions in a line-based file (.txt, .jsonl or .csv), read through a memory map.
+
+        With index=True the file is scanned once to build an array of record offsets (8 bytes
+        per seed), after which random sampling reads only the selected records. With
+        index=False nothing is kept in memory and each sample is a reservoir-sampling pass
+        over the file.
+
+        Parameters:
+            path (str): Path of the seed file.
+            kind (str, optional): "txt", "jsonl" or "csv"; taken from the extension if not set.
+            column (str): Field holding the question in .jsonl and .csv files.
+            index (bool): If True, build the offset index for random access.
+        """
+        self.path = path
+        self.kind = kind or os.path.splitext(path)[1].lower().lstrip('.')
+        if self.kind not in ('txt', 'jsonl', 'csv'):
+            raise ValueError(f"Unsupported line-based seed format: {self.kind}")
+        self.column = column
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b''
+        self._column_index = None
+        self._data_start = 0
+        self._length = None
+        if self.kind == 'csv':
+            self._read_csv_header()
+        self._offsets = self._build_index() if index else None
+
+    def _read_csv_header(self):
+        end = self._map.find(b'\n')
+        end = len(self._map) if end < 0 else end + 1
+        header = next(csv.reader(io.StringIO(self._map[:end].decode('utf-8-sig'))), [])
+        if self.column not in header:
+            raise ValueError(f"Seed file {self.path} has no '{self.column}' column.")
+        self._column_index = header.index(self.column)
+        self._data_start = end
+
+    def _build_index(self) -> "np.ndarray":
+        import numpy as np
+
+        # Record starts are the byte after each newline; in CSV files a newline inside a quoted
+        # field (odd number of quotes before it) does not end the record
+        starts = [np.array([self._data_start], dtype=np.int64)]
+        quotes = 0
+        for block_start in range(self._data_start, len(self._map), _SCAN_BLOCK):
+            block = np.frombuffer(self._map[block_start:block_start + _SCAN_BLOCK], dtype=np.uint8)
+            newlines = np.flatnonzero(block == 10)
+            if self.kind == 'csv':
+                quote_positions = np.flatnonzero(block == 34)
+                before = quotes + np.searchsorted(quote_positions, newlines)
+                newlines = newlines[before % 2 == 0]
+                quotes += len(quote_positions)
+            starts.append(newlines.astype(np.int64) + block_start + 1)
+        starts = np.concatenate(starts)
+        ends = np.append(starts[1:], len(self._map))
+        # Drop empty and whitespace-only lines, as _records() does. A line whose first byte is not
+        # whitespace has content; only the others (usually few) need a full check
+        keep = ends - starts > 0
+        first_bytes = np.frombuffer(self._map, dtype=np.uint8)[starts[keep]]
+        candidates = np.flatnonzero(keep)[np.isin(first_bytes, np.frombuffer(b' \t\n\r\x0b\x0c', dtype=np.uint8))]
+        for idx in candidates:
+            keep[idx] = bool(self._map[starts[idx]:ends[idx]].strip())
+        return starts[keep]
+
+    def _parse(self, raw: bytes) -> str:
+        text = raw.decode('utf-8')
+        if self.kind == 'txt':
+            return text.strip()
+        if self.kind == 'jsonl':
+            return str(json.loads(text)[self.column])
+        row = next(csv.reader(io.StringIO(text)))
+        return row[self._column_index]
+
+    def _records(self) -> Iterator[bytes]:
+        position = self._data_start
+        size = len(self._map)
+        while position < size:
+            end = position
+            while True:
+                newline = self._map.find(b'\n', end)
+                end = size if newline < 0 else newline + 1
+                # A CSV record continues past newlines inside quoted fields
+                if self.kind != 'csv' or end == size or self._map[position:end].count(b'"') % 2 == 0:
+                    break
+            raw = self._map[position:end]
+            position = end
+            if raw.strip():
+                yield raw
+
+    def __len__(self) -> int:
+        if self._offsets is not None:
+            return len(self._offsets)
+        if self._length is None:
+            self._length = sum(1 for _ in self._records())
+        return self._length
+
+    def __getitem__(self, idx: int) -> str:
+        if self._offsets is None:
+            raise TypeError("Random access needs the offset index (index=True).")
+        start = int(self._offsets[idx])
+        end = int(self._offsets[idx + 1]) if idx + 1 < len(self._offsets) else len(self._map)
+        return self._parse(self._map[start:end])
+
+    @property
+    def random_access(self) -> bool:
+        return self._offsets is not None
+
+    def __iter__(self) -> Iterator[str]:
+        for raw in self._records():
+            yield self._parse(raw)
+
+    def sample(self, k: int, rng: Optional[random.Random] = None) -> List[str]:
+        if self._offsets is None:
+            return [self._parse(raw) for raw in reservoir_sample(self._records(), k, rng)]
+        return super().sample(k, rng)
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+class ParquetSeedSource(SeedSource):
+    def __init__(self, path: str, column: str = 'question'):
+        """
+        Seed questions in a Parquet file. Only the question column is read, and sampling
+        loads just the row groups that hold the selected rows.
+
+        Parameters:
+            path (str): Path of the seed file.
+            column (str): Column holding the questions.
+        """
+        import numpy as np
+        import pyarrow.parquet
+
+        self._np = np
+        self._lock = threading.Lock()
+        self.path = path
+        self.column = column
+        self._file = pyarrow.parquet.ParquetFile(path)
+        if column not in self._file.schema_arrow.names:
+            raise ValueError(f"Seed file {path} has no '{column}' column.")
+        sizes = [self._file.metadata.row_group(idx).num_rows for idx in range(self._file.num_row_groups)]
+        self._group_starts = np.cumsum([0] + sizes)
+
+    def __len__(self) -> int:
+        return int(self._group_starts[-1])
+
+    def _read_group(self, group: int) -> List[str]:
+        with self._lock:
+            table = self._file.read_row_group(group, columns=[self.column])
+        return [str(value) for value in table.column(0).to_pylist()]
+
+    def __getitem__(self, idx: int) -> str:
+        group = int(self._np.searchsorted(self._group_starts, idx, side='right')) - 1
+        return self._read_group(group)[idx - int(self._group_starts[group])]
+
+    def __iter__(self) -> Iterator[str]:
+        for group in range(self._file.num_row_groups):
+            yield from self._read_group(group)
+
+    def sample(self, k: int, rng: Optional[random.Random] = None) -> List[str]:
+        rng = rng or random
+        indices = rng.sample(range(len(self)), k)
+        groups = {}
+        for idx in indices:
+            groups.setdefault(int(self._np.searchsorted(self._group_starts, idx, side='right')) - 1, []).append(idx)
+        selected = {}
+        for group, members in groups.items():
+            values = self._read_group(group)
+            for idx in members:
+                selected[idx] = values[idx - int(self._group_starts[group])]
+        return [selected[idx] for idx in indices]
+
+class ShardedSeedSource(SeedSource):
+    def __init__(self, source: Union[SeedSource, List[str]], shard: int, shards: int):
+        """
+        Every shards-th seed question of a source, starting at shard. Processes given shards
+        0 to shards-1 of the same source sample disjoint sets of seed questions.
+
+        Parameters:
+            source (SeedSource or List[str]): The full seed questions.
+            shard (int): Index of this shard, from 0 to shards-1.
+            shards (int): Total number of shards.
+        """
+        if not 0 <= shard < shards:
+            raise ValueError(f"Shard index {shard} is out of range for {shards} shards.")
+        self.source = source
+        self.shard = shard
+        self.shards = shards
+
+    @property
+    def random_access(self) -> bool:
+        return isinstance(self.source, list) or self.source.random_access
+
+    def __len__(self) -> int:
+        return max(0, (len(self.source) - self.shard + self.shards - 1) // self.shards)
+
+    def __getitem__(self, idx: int) -> str:
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        return self.source[idx * self.shards + self.shard]
+
+    def __iter__(self) -> Iterator[str]:
+        return islice(iter(self.source), self.shard, None, self.shards)
+
+    def sample(self, k: int, rng: Optional[random.Random] = None) -> List[str]:
+        if not self.random_access:
+            return reservoir_sample(iter(self), k, rng)
+        return super().sample(k, rng)
+
+def open_seed_source(path: str, column: str = 'question', index: bool = True) -> Union[SeedSource, List[str]]:
+    """
+    Opens a seed file for sampling. Text, JSON Lines and CSV files are memory-mapped and
+    indexed, Parquet files are read by row group; JSON arrays and Excel files, which cannot
+    be read incrementally, are loaded into a list.
+
+    Parameters:
+        path (str): Path of the seed file.
+        column (str): Field holding the questions (ignored for .txt files).
+        index (bool): If False, line-based files are sampled by streaming instead of through an offset index.
+
+    Returns:
+        SeedSource or List[str]: The seed questions.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.txt', '.jsonl', '.csv'):
+        return LineSeedSource(path, column=column, index=index)
+    if extension == '.parquet':
+        return ParquetSeedSource(path, column=column)
+    if extension == '.json':
+        with open(path, 'r', encoding='utf-8') as file:
+            return [str(record[column]) for record in json.load(file)]
+    if extension == '.xlsx':
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        if column not in header:
+            raise ValueError(f"Seed file {path} has no '{column}' column.")
+        position = header.index(column)
+        questions = [str(row[position]) for row in rows if row[position] is not None]
+        workbook.close()
+        return questions
+    raise ValueError(f"Unsupported seed file format: {extension}")
@@ -0,0 +1,44 @@
+import re
+from typing import List
+
+# Arabic code points that have a Persian counterpart, Arabic-Indic digits, and invisible joiners
+_PERSIAN_TRANSLATION = str.maketrans({
+    'ي': 'ی',
+    'ى': 'ی',
+    'ك': 'ک',
+    'ة': 'ه',
+    'ۀ': 'ه',
+    'أ': 'ا',
+    'إ': 'ا',
+    'آ': 'ا',
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+    '۰': '0', '۱': '1', '۲': '2', '۳': '3', '۴': '4',
+    '۵': '5', '۶': '6', '۷': '7', '۸': '8', '۹': '9',
+    '\u200c': ' ',  # zero-width non-joiner
+    '\u200d': '',  # zero-width joiner
+    '\u0640': '',  # tatweel
+})
+_DIACRITICS = re.compile('[\u064b-\u0652\u0670]')
+_WORD = re.compile(r'\w+')
+_SPACES = re.compile(r'\s+')
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes Persian/Arabic text for matching: unifies ye/kaf and digits, turns ZWNJ
+    into a space, strips diacritics, lowercases and collapses whitespace.
+
+    Parameters:
+        text (str): The text to normalize.
+
+    Returns:
+        str: The normalized text.
+    """
+    text = _DIACRITICS.sub('', text.translate(_PERSIAN_TRANSLATION)).lower()
+    return _SPACES.sub(' ', text).strip()
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits normalized text into word tokens.
+    """
+    return _WORD.findall(normalize_text(text))
@@ -1,3 +1,21 @@
-from .Retriever import make_context
-from .Sampler import get_examples
-from .Responder import get_response
\ No newline at end of file
+import importlib
+
+# Imported lazily on first access so that light modules (utils.Record, utils.Export, ...)
+# can be used without loading the LLM and search tool stack
+_EXPORTS = {
+    "make_context": ".Retriever",
+    "amake_context": ".Retriever",
+    "get_examples": ".Sampler",
+    "aget_examples": ".Sampler",
+    "get_response": ".Responder",
+    "aget_response": ".Responder",
+    "stream_response": ".Responder",
+    "astream_response": ".Responder",
+}
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")